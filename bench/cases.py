@@ -0,0 +1,248 @@
+"""Casi di benchmark: parser, ranking, pipeline di ricerca e rendering XML.
+
+Ogni caso è una funzione di setup registrata con `@case`: prepara i dati
+dalle fixture (fuori dal tempo misurato) e ritorna la funzione da
+cronometrare. Il valore ritornato da quella funzione serve a calcolare il
+digest dell'output, così un'ottimizzazione che cambia i risultati viene
+segnalata nel confronto con la baseline.
+
+Tutto gira offline: le pagine del forum arrivano dalle fixture HTML e la
+sessione è sostituita da `FixtureSession`. Gli archivi di traffico
+registrato in `bench/recordings/*.jsonl.gz` (`RECORD_UPSTREAM`) aggiungono
+casi di parsing sulle pagine reali che contengono.
+"""
+
+import atexit
+import shutil
+import tempfile
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable, Dict
+
+from bs4 import BeautifulSoup
+
+from config import Config
+from store import MemoryStore
+from sites.mircrew import extract, parser
+from session.recording import read_archive
+from sites.mircrew.site import DEFAULT_SELECTORS, MircrewSite, MircrewSession
+
+FIXTURES = Path(__file__).parent / "fixtures"
+RECORDINGS = Path(__file__).parent / "recordings"
+BASE_URL = "https://mircrew-releases.org"
+
+# Query tipiche inviate da Sonarr/Radarr/Prowlarr
+QUERIES = [
+    "Oppenheimer 2023", "Dune Parte Due", "Il Gladiatore II 2024", "Ce ancora domani",
+    "The Last of Us S01E05", "Mare Fuori S04", "Il Commissario Ricciardi 2x03",
+    "Shogun Stagione 1", "House of the Dragon S02E08", "Lagente segreto", "stagione",
+]
+
+# Journal dei thanks dei siti di benchmark, rimosso all'uscita
+DATA_DIR = Path(tempfile.mkdtemp(prefix="mircrew-bench-"))
+atexit.register(shutil.rmtree, DATA_DIR, ignore_errors=True)
+
+CASES: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def case(name: str):
+    """Registra una funzione di setup come caso di benchmark `name`."""
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def fixture_titles() -> list:
+    """Titoli dei thread delle pagine di ricerca (film e serie)."""
+    titles = []
+    for name in ("search_movies.html", "search_tv.html"):
+        titles += [r["title"] for r in extract.parse_search_page(fixture(name), DEFAULT_SELECTORS)["rows"]]
+    return titles
+
+
+# --- Sessione offline ---
+
+class FixtureResponse:
+    def __init__(self, url: str, text: str, status_code: int = 200):
+        self.url = url
+        self.text = text
+        self.status_code = status_code
+
+
+class FixtureScraper:
+    """Risponde alle GET del sito con le fixture: pagina di ricerca e pagina thread."""
+
+    def __init__(self, search_page: str, thread_page: str):
+        self.search_page = search_page
+        self.thread_page = thread_page
+
+    def get(self, url, params=None, **kwargs):
+        if "/search.php" in url:
+            return FixtureResponse(url, self.search_page)
+        if "/viewtopic.php" in url:
+            return FixtureResponse(url, self.thread_page)
+        return FixtureResponse(url, "", 404)
+
+
+class FixtureSession:
+    """Quanto di MircrewSession serve a MircrewSite per cercare ed espandere thread."""
+
+    def __init__(self, scraper: FixtureScraper):
+        self.scraper = scraper
+        self.store = MemoryStore()
+
+    def ensure_logged_in(self):
+        return self.scraper
+
+
+def build_site(search_page: str, thanked=(), thread_page: str = "") -> MircrewSite:
+    """MircrewSite offline; i topic in `thanked` vengono espansi leggendo `thread_page`."""
+    config = Config(base_url=BASE_URL, data_dir=DATA_DIR,
+                    search_cache_ttl=0, thread_cache_ttl=0, thanks_import_interval=0)
+    scraper = FixtureScraper(search_page, thread_page)
+    site = MircrewSite(FixtureSession(scraper), config)
+    site.thanks_cache.update(thanked)
+    return site
+
+
+def _search_topic_ids(page: str) -> list:
+    rows = extract.parse_search_page(page, DEFAULT_SELECTORS)["rows"]
+    return [parser.get_topic_id(r["href"]) for r in rows]
+
+
+# --- Parsing HTML ---
+
+@case("extract_magnets_movie")
+def _extract_magnets_movie():
+    html = fixture("thread_movie.html")
+    soup = BeautifulSoup(html, "lxml")
+    return lambda: parser.extract_magnets_from_soup(soup, html, DEFAULT_SELECTORS["post_content"])
+
+
+@case("extract_magnets_tv")
+def _extract_magnets_tv():
+    html = fixture("thread_tv.html")
+    soup = BeautifulSoup(html, "lxml")
+    return lambda: parser.extract_magnets_from_soup(soup, html, DEFAULT_SELECTORS["post_content"])
+
+
+@case("parse_thread_page_tv")
+def _parse_thread_page_tv():
+    html = fixture("thread_tv.html")
+    return lambda: extract.parse_thread_page(html, DEFAULT_SELECTORS)
+
+
+@case("parse_thread_page_unthanked")
+def _parse_thread_page_unthanked():
+    html = fixture("thread_movie_unthanked.html")
+    return lambda: extract.parse_thread_page(html, DEFAULT_SELECTORS)
+
+
+@case("parse_search_page")
+def _parse_search_page():
+    html = fixture("search_tv.html")
+    return lambda: extract.parse_search_page(html, DEFAULT_SELECTORS)
+
+
+@case("parse_thanks_given_page")
+def _parse_thanks_given_page():
+    html = fixture("thanks_given.html")
+    return lambda: extract.parse_thanks_given_page(html)
+
+
+@case("session_page_checks")
+def _session_page_checks():
+    # Validazione passiva eseguita su ogni risposta del forum
+    session = MircrewSession.__new__(MircrewSession)
+    pages = [fixture(n) for n in ("search_tv.html", "thread_tv.html", "login.html", "search_empty.html")]
+    return lambda: [(session._check_logged_in(p), session._check_logged_out(p)) for p in pages]
+
+
+# --- Titoli e query ---
+
+def _title_case(func):
+    def setup():
+        titles = fixture_titles()
+        return lambda: [func(t) for t in titles]
+    return setup
+
+
+for _func in (parser.extract_season_from_title, parser.is_multi_season_title,
+              parser.extract_episode_count_from_title, parser.generate_show_name_from_title,
+              parser.extract_media_tags_from_title, parser.extract_languages_from_title,
+              parser.has_italian_audio):
+    case(f"title_{_func.__name__}")(_title_case(_func))
+
+
+@case("query_parsing")
+def _query_parsing():
+    return lambda: [(parser.normalize_search_query(q), parser.extract_season_from_query(q),
+                     parser.extract_episode_from_query(q), parser.extract_year_from_query(q))
+                    for q in QUERIES]
+
+
+@case("relevance_ranking")
+def _relevance_ranking():
+    titles = fixture_titles()
+    queries = [(parser.normalize_search_query(q), q) for q in QUERIES]
+
+    def rank():
+        return [sorted(titles, key=lambda t: parser.compute_relevance_score(t, normalized, query), reverse=True)[:5]
+                for normalized, query in queries]
+    return rank
+
+
+# --- Pipeline di ricerca (MircrewSite._do_search) ---
+
+def _search_case(page_name: str, season=None, episode=None, expand: bool = False):
+    def setup():
+        page = fixture(page_name)
+        thanked = _search_topic_ids(page)[::4] if expand else ()
+        site = build_site(page, thanked, fixture("thread_tv.html" if "tv" in page_name else "thread_movie.html"))
+        scraper = site.session.ensure_logged_in()
+        return lambda: [asdict(r) for r in site._do_search(scraper, "bench", None, season, episode)]
+    return setup
+
+
+case("do_search_movies")(_search_case("search_movies.html"))
+case("do_search_tv")(_search_case("search_tv.html"))
+case("do_search_tv_episode")(_search_case("search_tv.html", season=2, episode=3))
+case("do_search_tv_expand")(_search_case("search_tv.html", expand=True))
+
+
+# --- Rendering ---
+
+@case("to_xml_item")
+def _to_xml_item():
+    page = fixture("search_tv.html")
+    site = build_site(page, _search_topic_ids(page)[::4], fixture("thread_tv.html"))
+    results = site._do_search(site.session.ensure_logged_in(), "bench", None, None, None)
+    download_url = "http://localhost:9696/mircrew/download"
+    return lambda: [r.to_xml_item(download_url) for r in results]
+
+
+# --- Pagine da traffico registrato ---
+
+def recorded_pages(archive: Path, path_part: str) -> list:
+    """Pagine HTML 200 dell'archivio il cui URL contiene `path_part`."""
+    return [e["body"] for e in read_archive(archive)
+            if e.get("type") == "exchange" and e.get("status") == 200
+            and path_part in e["url"] and e.get("body")]
+
+
+def _recorded_case(archive: Path, path_part: str, parse):
+    def setup():
+        pages = recorded_pages(archive, path_part)
+        return lambda: [parse(p, DEFAULT_SELECTORS) for p in pages]
+    return setup
+
+
+for _archive in sorted(RECORDINGS.glob("*.jsonl.gz")):
+    _name = _archive.name[:-len(".jsonl.gz")]
+    case(f"recorded_{_name}_search")(_recorded_case(_archive, "/search.php", extract.parse_search_page))
+    case(f"recorded_{_name}_thread")(_recorded_case(_archive, "/viewtopic.php", extract.parse_thread_page))
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""Finto MIRCrew (phpBB) e finto Byparr/FlareSolverr per test di carico in locale.
+
+Le pagine sono costruite dalle fixture di `bench/fixtures`:
+- search.php filtra le righe delle pagine di ricerca per keywords (terms=all/any);
+- viewtopic.php nasconde i magnet finché il topic non è stato ringraziato;
+- ucp.php gestisce il login (cookie phpBB `_u`/`_k`/`_sid`).
+
+Come Cloudflare, il sito risponde 403 con la pagina "Just a moment..." se
+manca un `cf_clearance` valido, o a caso con probabilità `challenge_rate`.
+I token emessi dal solver finto contengono la scadenza, quindi i due
+server possono girare anche in processi separati.
+
+Latenza, errori (502), challenge e flood control phpBB sono configurabili.
+Contatori delle richieste servite su `/_fake/stats` di entrambi i server.
+
+Uso standalone (per un proxy avviato a parte, es. in Docker):
+
+    python bench/fakes.py --site-port 8080 --solver-port 8191 --latency 0.15
+    MIRCREW_URL=http://127.0.0.1:8080 FLARESOLVERR_URL=http://127.0.0.1:8191 python src/main.py
+"""
+
+import argparse
+import html
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+
+FIXTURES = Path(__file__).parent / "fixtures"
+USER_ID = "101"
+COOKIE_PREFIX = "phpbb3_mircrew"
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36"
+
+CHALLENGE_PAGE = """<!DOCTYPE html><html lang="en-US"><head><title>Just a moment...</title>
+<meta http-equiv="Content-Type" content="text/html; charset=UTF-8"></head>
+<body><div class="main-wrapper" role="main"><div class="main-content">
+<h1 class="zone-name-title h1">mircrew-releases.org</h1>
+<h2 class="h2" id="challenge-running">Checking if the site connection is secure</h2>
+<noscript><div id="challenge-error-title">Enable JavaScript and cookies to continue</div></noscript>
+</div></div><script src="/cdn-cgi/challenge-platform/h/g/orchestrate/chl_page/v1"></script></body></html>"""
+
+FLOOD_PAGE = """<!DOCTYPE html><html><body><div id="message" class="panel"><div class="inner">
+<h2 class="message-title">Informazione</h2>
+<p>Non puoi usare la ricerca adesso. Attendi 5 secondi e riprova.</p>
+</div></div><a href="./ucp.php?mode=logout">Esci</a></body></html>"""
+
+
+@dataclass
+class FakeOptions:
+    """Comportamento dei server finti (tempi in secondi, rate in 0..1)."""
+
+    latency: float = 0.1
+    jitter: float = 0.05
+    error_rate: float = 0.0
+    challenge_rate: float = 0.0
+    flood_rate: float = 0.0
+    require_clearance: bool = True
+    clearance_ttl: int = 1800
+    session_ttl: int = 3600
+    solve_latency: float = 2.0
+    solve_error_rate: float = 0.0
+
+
+def _delay(base: float, jitter: float):
+    if base or jitter:
+        time.sleep(max(0.0, random.gauss(base, jitter)))
+
+
+class FixtureCorpus:
+    """Righe di ricerca e modelli di pagina ricavati dalle fixture."""
+
+    ROW_RE = re.compile(r'<li class="row bg\d">.*?</li>(?=\s*(?:<li class="row|</ul>))', re.S)
+    TITLE_RE = re.compile(r'class="topictitle">([^<]*)</a>')
+    TOPIC_RE = re.compile(r'viewtopic\.php\?t=(\d+)')
+
+    def __init__(self, fixtures: Path = FIXTURES):
+        def read(name):
+            return (fixtures / name).read_text(encoding="utf-8")
+
+        self.rows: List[dict] = []
+        for name, kind in (("search_movies.html", "movie"), ("search_tv.html", "tv")):
+            for block in self.ROW_RE.findall(read(name)):
+                self.rows.append({
+                    "html": block,
+                    "title": html.unescape(self.TITLE_RE.search(block).group(1)),
+                    "topic_id": self.TOPIC_RE.search(block).group(1),
+                    "kind": kind,
+                })
+        self.kinds = {r["topic_id"]: r["kind"] for r in self.rows}
+
+        search = read("search_empty.html")
+        self.search_head, self.search_tail = search.split('<ul class="topiclist topics">', 1)
+        self.search_head += '<ul class="topiclist topics">\n'
+        self.threads = {
+            "movie": (read("thread_movie.html"), "180001", "540003"),
+            "tv": (read("thread_tv.html"), "170001", "510003"),
+            "unthanked": (read("thread_movie_unthanked.html"), "180038", "540114"),
+        }
+        self.login = read("login.html")
+
+    def search(self, keywords: str, terms: str) -> str:
+        if re.fullmatch(r"\s*(19|20)\d{2}\s*", keywords):
+            # Query RSS del proxy (solo l'anno corrente): ultimi topic
+            return self.search_head + "\n".join(r["html"] for r in self.rows[:50]) + self.search_tail
+        words = [w.lower() for w in keywords.split() if len(w) >= 3]
+        match = all if terms == "all" else any
+        rows = [r["html"] for r in self.rows if words and match(w in r["title"].lower() for w in words)]
+        return self.search_head + "\n".join(rows[:50]) + self.search_tail
+
+    def thread(self, topic_id: str, thanked: bool) -> str:
+        kind = "unthanked" if not thanked else self.kinds.get(topic_id, "movie")
+        page, fixture_topic, fixture_post = self.threads[kind]
+        return page.replace(fixture_post, str(int(topic_id) * 3)).replace(fixture_topic, topic_id)
+
+
+# --- Finto MIRCrew ---
+
+def create_fake_site(options: FakeOptions, corpus: Optional[FixtureCorpus] = None) -> Flask:
+    """App Flask che imita MIRCrew dietro Cloudflare."""
+    corpus = corpus or FixtureCorpus()
+    app = Flask("fake_mircrew")
+    stats: Counter = Counter()
+    sessions: Dict[str, float] = {}  # sid -> scadenza
+    thanked = set()
+    lock = threading.Lock()
+
+    def count(key: str):
+        with lock:
+            stats[key] += 1
+
+    def clearance_ok() -> bool:
+        token = request.cookies.get("cf_clearance", "")
+        m = re.fullmatch(r"fake-(\d+)-\w+", token)
+        return bool(m) and int(m.group(1)) > time.time()
+
+    def logged_in() -> bool:
+        sid = request.cookies.get(f"{COOKIE_PREFIX}_sid", "")
+        with lock:
+            expires = sessions.get(sid)
+        return request.cookies.get(f"{COOKIE_PREFIX}_u") == USER_ID and bool(expires) and expires > time.time()
+
+    @app.before_request
+    def edge():
+        if request.path.startswith("/_fake/"):
+            return None
+        count(f"path:{request.path}")
+        _delay(options.latency, options.jitter)
+        if (options.require_clearance and not clearance_ok()) or random.random() < options.challenge_rate:
+            count("challenges")
+            return Response(CHALLENGE_PAGE, 403, {"Server": "cloudflare", "cf-mitigated": "challenge"})
+        if random.random() < options.error_rate:
+            count("errors")
+            return Response("<html><body>502 Bad Gateway</body></html>", 502, {"Server": "cloudflare"})
+        return None
+
+    @app.route("/")
+    @app.route("/index.php")
+    def index():
+        return corpus.login if not logged_in() else corpus.search(" ", "all")
+
+    @app.route("/ucp.php", methods=["GET", "POST"])
+    def ucp():
+        mode = request.args.get("mode")
+        if mode == "login" and request.method == "POST":
+            if not request.form.get("username") or not request.form.get("password"):
+                count("login_failed")
+                return corpus.login
+            count("logins")
+            sid = f"{random.getrandbits(128):032x}"
+            with lock:
+                sessions[sid] = time.time() + options.session_ttl
+            resp = Response(corpus.search(" ", "all"))
+            resp.set_cookie(f"{COOKIE_PREFIX}_u", USER_ID)
+            resp.set_cookie(f"{COOKIE_PREFIX}_k", f"{random.getrandbits(64):016x}")
+            resp.set_cookie(f"{COOKIE_PREFIX}_sid", sid)
+            return resp
+        if mode == "logout":
+            resp = Response(corpus.login)
+            resp.set_cookie(f"{COOKIE_PREFIX}_u", "1")
+            return resp
+        return corpus.login
+
+    @app.route("/search.php")
+    def search():
+        if not logged_in():
+            return corpus.login
+        if random.random() < options.flood_rate:
+            count("floods")
+            return FLOOD_PAGE
+        count("searches")
+        return corpus.search(request.args.get("keywords", ""), request.args.get("terms", "all"))
+
+    @app.route("/viewtopic.php")
+    def viewtopic():
+        if not logged_in():
+            return corpus.login
+        topic_id = request.args.get("t", "")
+        if not topic_id.isdigit():
+            return Response("Topic not found", 404)
+        if request.args.get("thanks"):
+            count("thanks")
+            with lock:
+                thanked.add(topic_id)
+        with lock:
+            is_thanked = topic_id in thanked
+        return corpus.thread(topic_id, is_thanked)
+
+    @app.route("/app.php/thankslist/givens/<user_id>/true")
+    def thanks_given(user_id):
+        if not logged_in():
+            return corpus.login
+        with lock:
+            topics = sorted(thanked, reverse=True)
+        links = "\n".join(f'<li><a href="./viewtopic.php?t={t}">topic {t}</a></li>' for t in topics)
+        return (f'<html><body><a href="./ucp.php?mode=logout">Esci</a>'
+                f'<ul class="topiclist topics">{links}</ul></body></html>')
+
+    @app.route("/_fake/stats")
+    def fake_stats():
+        with lock:
+            return jsonify({"requests": dict(stats), "sessions": len(sessions), "thanked": len(thanked)})
+
+    return app
+
+
+# --- Finto Byparr/FlareSolverr ---
+
+def create_fake_solver(options: FakeOptions) -> Flask:
+    """App Flask con l'API /v1 di FlareSolverr (request.get/post, sessions.*)."""
+    app = Flask("fake_solver")
+    stats: Counter = Counter()
+    lock = threading.Lock()
+    started = time.time()
+
+    def count(key: str):
+        with lock:
+            stats[key] += 1
+
+    @app.route("/v1", methods=["POST"])
+    def v1():
+        payload = request.get_json(force=True, silent=True) or {}
+        cmd = payload.get("cmd", "")
+        count(f"cmd:{cmd}")
+        if cmd in ("sessions.create", "sessions.destroy"):
+            return jsonify({"status": "ok", "message": "", "session": payload.get("session")})
+        if cmd == "sessions.list":
+            return jsonify({"status": "ok", "sessions": []})
+        if cmd not in ("request.get", "request.post"):
+            return jsonify({"status": "error", "message": f"Request parameter 'cmd' = '{cmd}' is invalid."}), 500
+
+        t0 = time.time()
+        _delay(options.solve_latency, options.solve_latency / 4)
+        if random.random() < options.solve_error_rate:
+            count("solve_errors")
+            return jsonify({"status": "error", "message": "Error: Error solving the challenge. Timeout after "
+                            f"{payload.get('maxTimeout', 60000) / 1000} seconds."}), 500
+
+        count("solves")
+        url = payload.get("url", "")
+        expires = int(time.time()) + options.clearance_ttl
+        cookie = {"name": "cf_clearance", "value": f"fake-{expires}-{random.getrandbits(32):08x}",
+                  "domain": urlparse(url).hostname or "", "path": "/", "expires": expires,
+                  "httpOnly": True, "secure": False}
+        solution = {"url": url, "status": 200, "headers": {}, "cookies": [cookie], "userAgent": USER_AGENT}
+        if not payload.get("returnOnlyCookies"):
+            # Pagina intera: la richiede al sito col cookie appena emesso
+            try:
+                method = "POST" if cmd == "request.post" else "GET"
+                r = requests.request(method, url, data=payload.get("postData"), timeout=30,
+                                     cookies={"cf_clearance": cookie["value"]},
+                                     headers={"User-Agent": USER_AGENT,
+                                              "Content-Type": "application/x-www-form-urlencoded"})
+                solution.update(status=r.status_code, response=r.text, url=r.url)
+            except requests.RequestException as e:
+                return jsonify({"status": "error", "message": f"Error: {e}"}), 500
+        return jsonify({"status": "ok", "message": "Challenge solved!", "solution": solution,
+                        "startTimestamp": int(t0 * 1000), "endTimestamp": int(time.time() * 1000),
+                        "version": "3.3.21-fake"})
+
+    @app.route("/")
+    def root():
+        return jsonify({"msg": "FlareSolverr is ready!", "version": "3.3.21-fake", "userAgent": USER_AGENT,
+                        "uptime": round(time.time() - started)})
+
+    @app.route("/health")
+    def health():
+        return jsonify({"status": "ok"})
+
+    @app.route("/_fake/stats")
+    def fake_stats():
+        with lock:
+            return jsonify({"requests": dict(stats)})
+
+    return app
+
+
+class BackgroundServer:
+    """Server WSGI multi-thread in un thread daemon (porta 0 = scelta dal sistema)."""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0):
+        # Una riga di log per richiesta falserebbe le misure sotto carico
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        self.server = make_server(host, port, app, threaded=True)
+        self.url = f"http://{host}:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f"serve-{app.name}", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def add_fake_arguments(parser: argparse.ArgumentParser):
+    """Opzioni comuni ai server finti (usate anche da loadgen)."""
+    group = parser.add_argument_group("fake site and solver")
+    group.add_argument("--latency", type=float, default=0.1, help="fake forum mean latency (s)")
+    group.add_argument("--jitter", type=float, default=0.05, help="fake forum latency std deviation (s)")
+    group.add_argument("--error-rate", type=float, default=0.0, help="fraction of forum requests answered 502")
+    group.add_argument("--challenge-rate", type=float, default=0.0,
+                       help="fraction of forum requests answered with a CF challenge even with clearance")
+    group.add_argument("--flood-rate", type=float, default=0.0, help="fraction of searches hitting flood control")
+    group.add_argument("--no-clearance", action="store_true", help="do not require cf_clearance")
+    group.add_argument("--clearance-ttl", type=int, default=1800, help="cf_clearance lifetime (s)")
+    group.add_argument("--session-ttl", type=int, default=3600, help="forum login session lifetime (s)")
+    group.add_argument("--solve-latency", type=float, default=2.0, help="fake solver mean solve time (s)")
+    group.add_argument("--solve-error-rate", type=float, default=0.0, help="fraction of solves that fail")
+
+
+def options_from_args(args) -> FakeOptions:
+    return FakeOptions(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        challenge_rate=args.challenge_rate, flood_rate=args.flood_rate,
+        require_clearance=not args.no_clearance, clearance_ttl=args.clearance_ttl,
+        session_ttl=args.session_ttl, solve_latency=args.solve_latency,
+        solve_error_rate=args.solve_error_rate,
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Fake MIRCrew forum and FlareSolverr for local load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--site-port", type=int, default=8080)
+    parser.add_argument("--solver-port", type=int, default=8191)
+    add_fake_arguments(parser)
+    args = parser.parse_args(argv)
+
+    options = options_from_args(args)
+    site = BackgroundServer(create_fake_site(options), args.host, args.site_port)
+    solver = BackgroundServer(create_fake_solver(options), args.host, args.solver_port)
+    print(f"Fake MIRCrew: {site.url}  (MIRCREW_URL)", file=sys.stderr)
+    print(f"Fake solver:  {solver.url}  (FLARESOLVERR_URL)", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""Generatore di carico: mix di query Prowlarr/Sonarr/Radarr contro il proxy Torznab.
+
+Di default avvia tutto in processo: finto MIRCrew e finto solver
+(`bench/fakes.py`), poi un TorznabServer col sito mircrew puntato su di
+essi, servito dal server threaded di Flask o via ASGI. Con `--target` il
+carico va invece a un proxy già avviato (es. `SERVER_MODE=prefork` o il
+container), a cui vanno passati gli URL dei server finti.
+
+    python bench/loadgen.py --mix sonarr --concurrency 16 --duration 30
+    python bench/loadgen.py --server asgi --latency 0.3 --challenge-rate 0.02 --json -
+    python bench/loadgen.py --target http://127.0.0.1:9696 --api-key KEY --mix mixed
+    python bench/loadgen.py --record /tmp/run.jsonl.gz --requests 200
+    python bench/loadgen.py --replay /tmp/run.jsonl.gz --replay-speed 0
+
+Con `--record` il traffico del proxy verso forum e solver finti viene
+registrato; con `--replay` il proxy risponde da un archivio registrato
+(anche in produzione con `RECORD_UPSTREAM`) senza server finti: per
+riprodurre una registrazione di loadgen vanno usati gli stessi `--mix`,
+`--seed` e `--requests`.
+
+Riporta throughput, percentili di latenza per tipo di richiesta, status
+HTTP e quante richieste, challenge e solve hanno raggiunto il sito finto.
+"""
+
+import argparse
+import json
+import logging
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "bench"))
+
+from fakes import (BackgroundServer, FixtureCorpus, add_fake_arguments,  # noqa: E402
+                   create_fake_site, create_fake_solver, options_from_args)
+from tools.accesslog_report import percentiles  # noqa: E402
+
+SITE_NAME = "mircrew"
+API_KEY = "loadgen"
+
+# Tipi di richiesta per client, con peso relativo
+MIXES: Dict[str, List[Tuple[str, float]]] = {
+    "prowlarr": [("caps", 0.1), ("rss", 0.2), ("search", 0.7)],
+    "sonarr": [("tv_rss", 0.1), ("tv_episode", 0.6), ("tv_season", 0.3)],
+    "radarr": [("movie_rss", 0.15), ("movie", 0.85)],
+    "mixed": [("caps", 0.05), ("rss", 0.1), ("search", 0.2), ("tv_episode", 0.3),
+              ("tv_season", 0.15), ("movie", 0.2)],
+}
+
+
+class QueryMix:
+    """Genera richieste Torznab; i titoli seguono una distribuzione di Zipf (cache realistiche)."""
+
+    def __init__(self, mix: str, zipf: float = 1.1, seed: Optional[int] = None):
+        corpus = FixtureCorpus()
+        self.rng = random.Random(seed)
+        self.kinds, self.kind_weights = zip(*MIXES[mix])
+        movies = {re.split(r"\s*\(\d{4}\)", r["title"])[0] for r in corpus.rows if r["kind"] == "movie"}
+        shows = {re.split(r"\s*-\s*Stagion", r["title"])[0] for r in corpus.rows if r["kind"] == "tv"}
+        self.movies, self.movie_weights = self._zipf(sorted(movies), zipf)
+        self.shows, self.show_weights = self._zipf(sorted(shows), zipf)
+
+    def _zipf(self, names: List[str], s: float):
+        self.rng.shuffle(names)
+        return names, [1 / (rank ** s) for rank in range(1, len(names) + 1)]
+
+    def next(self) -> Tuple[str, dict]:
+        kind = self.rng.choices(self.kinds, self.kind_weights)[0]
+        rng = self.rng
+        if kind == "caps":
+            return kind, {"t": "caps"}
+        if kind == "rss":
+            return kind, {"t": "search"}
+        if kind == "tv_rss":
+            return kind, {"t": "tvsearch", "cat": "5000,5070"}
+        if kind == "movie_rss":
+            return kind, {"t": "movie", "cat": "2000"}
+        if kind == "search":
+            pool, weights = (self.movies, self.movie_weights) if rng.random() < 0.5 else (self.shows, self.show_weights)
+            return kind, {"t": "search", "q": rng.choices(pool, weights)[0]}
+        if kind == "movie":
+            params = {"t": "movie", "q": rng.choices(self.movies, self.movie_weights)[0], "cat": "2000"}
+            if rng.random() < 0.5:
+                params["q"] += f" {rng.randint(2019, 2024)}"
+            return kind, params
+        show = rng.choices(self.shows, self.show_weights)[0]
+        params = {"t": "tvsearch", "q": show, "cat": "5000,5070", "season": str(rng.randint(1, 6))}
+        if kind == "tv_episode":
+            params["ep"] = str(rng.randint(1, 12))
+        return kind, params
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.results: Dict[str, List[int]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, seconds: float, status: Optional[int], error: Optional[str] = None,
+               results: Optional[int] = None):
+        with self._lock:
+            self.latencies[kind].append(seconds * 1000)
+            self.statuses[str(status) if status else "error"] += 1
+            if error:
+                self.errors[error] += 1
+            if results is not None:
+                self.results[kind].append(results)
+
+
+ENCLOSURE_RE = re.compile(r'<enclosure url="([^"]+)"')
+
+
+def worker(base_url: str, api_key: str, mix: QueryMix, stats: LoadStats, deadline: float,
+           remaining: List[int], grab_rate: float, lock: threading.Lock, timeout: float):
+    http = requests.Session()
+    while time.monotonic() < deadline:
+        with lock:
+            if remaining[0] == 0:
+                return
+            remaining[0] -= 1
+            kind, params = mix.next()
+            grab = mix.rng.random() < grab_rate
+            pick = mix.rng.random()
+        started = time.perf_counter()
+        try:
+            r = http.get(f"{base_url}/{SITE_NAME}/api", params={**params, "apikey": api_key}, timeout=timeout)
+            links = ENCLOSURE_RE.findall(r.text) if r.status_code == 200 else []
+            stats.record(kind, time.perf_counter() - started, r.status_code,
+                         results=None if kind == "caps" else len(links))
+        except requests.RequestException as e:
+            stats.record(kind, time.perf_counter() - started, None, type(e).__name__)
+            continue
+
+        if grab and links:
+            # Il client "scarica" un risultato: download con thanks sul forum
+            url = links[int(pick * len(links))].replace("&amp;", "&")
+            started = time.perf_counter()
+            try:
+                r = http.get(url, allow_redirects=False, timeout=timeout)
+                stats.record("download", time.perf_counter() - started, r.status_code)
+            except requests.RequestException as e:
+                stats.record("download", time.perf_counter() - started, None, type(e).__name__)
+
+
+def _start_asgi(server, port: int) -> str:
+    import uvicorn
+    from torznab.asgi import create_asgi_app
+
+    uv = uvicorn.Server(uvicorn.Config(create_asgi_app(server), host="127.0.0.1", port=port,
+                                       log_level="warning", access_log=False))
+    uv.install_signal_handlers = lambda: None  # gira in un thread secondario
+    threading.Thread(target=uv.run, name="loadgen-asgi", daemon=True).start()
+    while not uv.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def start_proxy(args, site_url: str, solver_url: str) -> str:
+    """TorznabServer in processo col sito mircrew puntato sui server finti."""
+    from config import Config
+    from sites.mircrew.site import create_site
+    from torznab.server import TorznabServer
+
+    config = Config(
+        base_url=site_url, username="bench", password="bench", api_key=API_KEY,
+        data_dir=Path(tempfile.mkdtemp(prefix="mircrew-loadgen-")),
+        cf_bypass_url=solver_url, search_cache_ttl=args.search_cache_ttl,
+        thread_cache_ttl=args.thread_cache_ttl, thanks_import_interval=0,
+        http_pool_size=max(20, args.concurrency),
+        pace_rate=args.pacer_rate, pace_max_rate=args.pacer_rate,
+    )
+    site = create_site(config)
+    server = TorznabServer(api_key=API_KEY)
+    server.register_site(SITE_NAME, site)
+    if args.server == "asgi":
+        return _start_asgi(server, args.port or 18096)
+    return BackgroundServer(server.app, port=args.port).url
+
+
+def fake_stats(url: Optional[str]) -> dict:
+    if not url:
+        return {}
+    try:
+        return requests.get(f"{url}/_fake/stats", timeout=5).json()["requests"]
+    except (requests.RequestException, ValueError, KeyError):
+        return {}
+
+
+def build_report(stats: LoadStats, elapsed: float, site_before: dict, site_after: dict,
+                 solver_before: dict, solver_after: dict) -> dict:
+    total = sum(len(v) for v in stats.latencies.values())
+    api_requests = sum(len(v) for k, v in stats.latencies.items() if k != "download")
+    site = {k: site_after.get(k, 0) - site_before.get(k, 0) for k in site_after}
+    upstream = sum(v for k, v in site.items() if k.startswith("path:"))
+    return {
+        "requests": total,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {kind: percentiles(values) for kind, values in sorted(stats.latencies.items())},
+        "avg_results": {kind: round(sum(v) / len(v), 1) for kind, v in sorted(stats.results.items()) if v},
+        "statuses": dict(stats.statuses),
+        "errors": dict(stats.errors),
+        "upstream": {
+            "requests": upstream,
+            "per_api_request": round(upstream / api_requests, 2) if api_requests else None,
+            "site": site,
+            "solver": {k: solver_after.get(k, 0) - solver_before.get(k, 0) for k in solver_after},
+        },
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{report['requests']} requests in {report['elapsed_s']}s: "
+             f"{report['throughput_rps']} req/s",
+             "", f"{'kind':<12} {'count':>6} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)"]
+    for kind, p in report["latency_ms"].items():
+        lines.append(f"{kind:<12} {p['count']:>6} " + " ".join(
+            f"{p[k]:>8.1f}" if p[k] is not None else f"{'-':>8}" for k in ("p50", "p90", "p95", "p99", "max")))
+    lines.append("")
+    lines.append(f"Status: {report['statuses']}")
+    if report["errors"]:
+        lines.append(f"Client errors: {report['errors']}")
+    if report["avg_results"]:
+        lines.append(f"Avg results: {report['avg_results']}")
+    upstream = report["upstream"]
+    if upstream["site"]:
+        lines.append(f"Upstream: {upstream['requests']} forum requests "
+                     f"({upstream['per_api_request']} per API request)")
+        lines.append(f"  site:   {upstream['site']}")
+        lines.append(f"  solver: {upstream['solver']}")
+    if "replay" in report:
+        lines.append(f"Replay: {report['replay']}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay Prowlarr/Sonarr/Radarr query mixes against the Torznab proxy")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="test duration (s)")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many API requests (0 = no limit)")
+    parser.add_argument("--grab-rate", type=float, default=0.05,
+                        help="fraction of searches followed by a download of one result")
+    parser.add_argument("--timeout", type=float, default=120, help="client timeout per request (s)")
+    parser.add_argument("--zipf", type=float, default=1.1, help="skew of title popularity (0 = uniform)")
+    parser.add_argument("--seed", type=int, help="random seed for the query mix")
+    parser.add_argument("--json", metavar="PATH", help="write the report as JSON ('-' for stdout)")
+    parser.add_argument("--log-level", default="WARNING", help="proxy log level")
+
+    proxy = parser.add_argument_group("proxy under test")
+    proxy.add_argument("--target", help="URL of an already running proxy (skips the in-process one)")
+    proxy.add_argument("--api-key", default=API_KEY, help="API key of --target")
+    proxy.add_argument("--server", choices=["threaded", "asgi"], default="threaded")
+    proxy.add_argument("--port", type=int, default=0, help="port of the in-process proxy (0 = any)")
+    proxy.add_argument("--search-cache-ttl", type=int, default=900)
+    proxy.add_argument("--thread-cache-ttl", type=int, default=3600)
+    proxy.add_argument("--pacer-rate", type=float, default=0,
+                       help="cap the upstream pacer at this rate (req/s); 0 = adaptive, uncapped until a flood")
+    proxy.add_argument("--site-url", help="use this fake forum instead of starting one")
+    proxy.add_argument("--solver-url", help="use this fake solver instead of starting one")
+    proxy.add_argument("--record", metavar="PATH", help="record the proxy's upstream traffic to this archive")
+    proxy.add_argument("--replay", metavar="PATH", action="append",
+                       help="serve upstream traffic from this archive instead of fake servers (repeatable)")
+    proxy.add_argument("--replay-speed", type=float, default=1.0,
+                       help="replay timing: 1 = as recorded, 10 = ten times faster, 0 = no delays")
+    add_fake_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(),
+                        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+
+    options = options_from_args(args)
+    site_url = args.site_url
+    solver_url = args.solver_url
+    if args.replay and not args.target:
+        # Stessi URL della registrazione: le richieste devono combaciare con l'archivio
+        from session.recording import enable_replay
+        replay = enable_replay(args.replay, args.replay_speed)
+        recorded = next(iter(replay.archive.sessions.values()), {})
+        site_url = site_url or recorded.get("base_url")
+        solver_url = solver_url or recorded.get("solver_url")
+        if not site_url:
+            print("No recorded session in the replay archive; pass --site-url", file=sys.stderr)
+            return 2
+        base_url = start_proxy(args, site_url, solver_url)
+        api_key = API_KEY
+    elif not args.target:
+        if args.record:
+            from session.recording import enable_recording
+            enable_recording(Path(args.record))
+        site_url = site_url or BackgroundServer(create_fake_site(options)).url
+        solver_url = solver_url or BackgroundServer(create_fake_solver(options)).url
+        base_url = start_proxy(args, site_url, solver_url)
+        api_key = API_KEY
+    else:
+        base_url, api_key = args.target.rstrip("/"), args.api_key
+    print(f"Proxy {base_url}, forum {site_url or '?'}, solver {solver_url or '?'}", file=sys.stderr)
+
+    if args.replay:
+        site_url = solver_url = None  # nessun server finto da interrogare
+    site_before, solver_before = fake_stats(site_url), fake_stats(solver_url)
+    mix = QueryMix(args.mix, args.zipf, args.seed)
+    stats = LoadStats()
+    remaining = [args.requests or -1]
+    lock = threading.Lock()
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = [threading.Thread(target=worker, name=f"client-{i}", daemon=True,
+                                args=(base_url, api_key, mix, stats, deadline, remaining,
+                                      args.grab_rate, lock, args.timeout))
+               for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    report = build_report(stats, elapsed, site_before, fake_stats(site_url),
+                          solver_before, fake_stats(solver_url))
+    report["config"] = {k: v for k, v in vars(args).items() if k != "json"}
+    if args.replay and not args.target:
+        report["replay"] = replay.archive.stats()
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+        if args.json:
+            Path(args.json).write_text(json.dumps(report, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Benchmark offline di parser e pipeline di ricerca, con confronto su baseline.
+
+Uso (dalla radice del repository):
+
+    python bench/run.py                              # esegue tutti i casi
+    python bench/run.py -k title_ -k do_search       # solo i casi che contengono questi nomi
+    python bench/run.py --save bench/baseline.json   # salva i risultati come baseline
+    python bench/run.py --compare bench/baseline.json
+
+Per ogni caso misura il tempo per chiamata (minimo, mediana, massimo su
+più ripetizioni) e un digest dell'output. Nel confronto un caso più lento
+della soglia, o con output diverso dalla baseline, fa uscire con codice 1.
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "bench"))
+
+from cases import CASES  # noqa: E402
+
+FORMAT_VERSION = 1
+
+
+def digest(value) -> str:
+    """Impronta stabile dell'output di un caso."""
+    data = json.dumps(value, sort_keys=True, default=repr, ensure_ascii=False)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+
+def _time_loops(func: Callable, loops: int) -> float:
+    started = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return time.perf_counter() - started
+
+
+def measure(func: Callable, repeat: int, min_time: float) -> dict:
+    """Come timeit: calibra il numero di chiamate per ripetizione, poi ripete."""
+    loops = 1
+    while True:
+        elapsed = _time_loops(func, loops)
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        per_call = [_time_loops(func, loops) / loops for _ in range(repeat)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        "loops": loops,
+        "repeat": repeat,
+        "min_us": round(min(per_call) * 1e6, 3),
+        "median_us": round(statistics.median(per_call) * 1e6, 3),
+        "max_us": round(max(per_call) * 1e6, 3),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(names: List[str], repeat: int, min_time: float, verbose: bool = True) -> dict:
+    results = {}
+    for name in names:
+        func = CASES[name]()
+        output = func()  # anche warm-up (import lazy, cache di re)
+        stats = measure(func, repeat, min_time)
+        stats["digest"] = digest(output)
+        results[name] = stats
+        if verbose:
+            print(f"  {name:<40} {stats['median_us']:>12.1f} us  (min {stats['min_us']:.1f}, "
+                  f"{stats['loops']} loops x {repeat})", file=sys.stderr)
+    return {
+        "format": FORMAT_VERSION,
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "cases": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> Dict[str, list]:
+    """Rapporto mediana corrente / baseline per caso; regressioni e output cambiati."""
+    report = {"rows": [], "slower": [], "changed": [], "missing": []}
+    for name, stats in current["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            report["missing"].append(name)
+            continue
+        ratio = stats["median_us"] / base["median_us"] if base["median_us"] else float("inf")
+        status = "same"
+        if ratio > 1 + threshold:
+            status = "slower"
+            report["slower"].append(name)
+        elif ratio < 1 - threshold:
+            status = "faster"
+        if stats["digest"] != base["digest"]:
+            status += ", OUTPUT CHANGED"
+            report["changed"].append(name)
+        report["rows"].append((name, base["median_us"], stats["median_us"], ratio, status))
+    return report
+
+
+def print_comparison(report: dict, baseline: dict):
+    meta = baseline.get("meta", {})
+    print(f"Baseline: commit {meta.get('commit')}, {meta.get('created')}, "
+          f"Python {meta.get('python')} on {meta.get('machine')}")
+    print(f"{'case':<40} {'baseline us':>12} {'current us':>12} {'ratio':>7}  status")
+    for name, base_us, cur_us, ratio, status in report["rows"]:
+        print(f"{name:<40} {base_us:>12.1f} {cur_us:>12.1f} {ratio:>7.2f}  {status}")
+    if report["missing"]:
+        print(f"Not in baseline: {', '.join(report['missing'])}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the MIRCrew parser and search pipeline")
+    parser.add_argument("-k", dest="filters", action="append", default=[],
+                        help="only cases whose name contains this string (repeatable)")
+    parser.add_argument("--list", action="store_true", help="list the available cases")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions per case")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="minimum seconds per repetition (sets the loop count)")
+    parser.add_argument("--json", metavar="PATH", help="write the results as JSON ('-' for stdout)")
+    parser.add_argument("--save", metavar="PATH", help="write the results as the new baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative slowdown reported as a regression (default 0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    names = [n for n in CASES if not args.filters or any(f in n for f in args.filters)]
+    if args.list:
+        print("\n".join(names))
+        return 0
+    if not names:
+        print("No matching cases", file=sys.stderr)
+        return 2
+
+    print(f"Running {len(names)} cases", file=sys.stderr)
+    current = run(names, args.repeat, args.min_time)
+
+    for path in (args.json, args.save):
+        if path == "-":
+            print(json.dumps(current, indent=2))
+        elif path:
+            Path(path).write_text(json.dumps(current, indent=2) + "\n")
+            print(f"Results written to {path}", file=sys.stderr)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        report = compare(current, baseline, args.threshold)
+        print_comparison(report, baseline)
+        if report["slower"] or report["changed"]:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
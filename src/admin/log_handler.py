@@ -57,4 +57,5 @@ class AdminLogHandler(logging.Handler):
 
 # Singleton globale
 log_handler = AdminLogHandler()
-log_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+log_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(request_tag)s%(message)s",
+                                           defaults={"request_tag": ""}))
@@ -3,12 +3,16 @@
 import json
 import logging
 import re
+import threading
 import time
 from importlib import import_module
 from pathlib import Path
 
 from flask import Blueprint, jsonify, request, Response, render_template
 
+from torznab import profiling
+from torznab.perf import perf
+
 from .log_handler import log_handler
 
 logger = logging.getLogger("admin")
@@ -493,6 +497,18 @@ def api_toggle_site(name):
         return jsonify({"enabled": False, "active": False})
 
 
+@admin_bp.route("/admin/api/sites/<name>/import-thanks", methods=["POST"])
+def api_import_thanks(name):
+    """Avvia in background l'import dei thanks dati dal profilo del forum."""
+    site = _server.sites.get(name)
+    if site is None:
+        return jsonify({"error": "Site not active"}), 404
+    if not hasattr(site, "import_thanks_history"):
+        return jsonify({"error": "Site does not support thanks import"}), 400
+    threading.Thread(target=site.import_thanks_history, name=f"thanks-import-{name}", daemon=True).start()
+    return jsonify({"started": True}), 202
+
+
 def _activate_site(name: str) -> str | None:
     """Attiva un sito. Ritorna None se ok, messaggio errore altrimenti."""
     site_cfg = _config_store.get_site(name)
@@ -517,6 +533,24 @@ def _activate_site(name: str) -> str | None:
 
 # === LOGS SSE ===
 
+@admin_bp.route("/admin/api/perf")
+def api_perf_sse():
+    """Server-Sent Events con le statistiche di performance dei siti ogni 2 secondi."""
+    def generate():
+        while True:
+            yield f"data: {json.dumps(perf.snapshot(_server.sites))}\n\n"
+            time.sleep(2)
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 @admin_bp.route("/admin/api/logs")
 def api_logs_sse():
     """Server-Sent Events stream per log in tempo reale."""
@@ -547,3 +581,119 @@ def api_logs_sse():
             "X-Accel-Buffering": "no",
         },
     )
+
+
+# === DIAGNOSTICA (profiler, memoria) ===
+# Costose e rivelano dettagli interni: richiedono l'API key anche se il pannello non ha login.
+# Riguardano solo il processo che serve la richiesta (in prefork, un worker).
+
+def _require_api_key():
+    key = request.headers.get("X-Api-Key") or request.args.get("apikey")
+    if _server.api_key and key != _server.api_key:
+        return jsonify({"error": "Invalid API key"}), 401
+    return None
+
+
+def _int_arg(name: str, default: int) -> int:
+    try:
+        return int(request.args.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+@admin_bp.route("/admin/api/debug/profile")
+def api_debug_profile():
+    """Campiona gli stack di tutti i thread per `seconds` secondi (stack collassati per flamegraph)."""
+    denied = _require_api_key()
+    if denied:
+        return denied
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        interval = float(request.args.get("interval", 0.01))
+    except ValueError:
+        return jsonify({"error": "seconds and interval must be numbers"}), 400
+    try:
+        profile = profiling.sample_stacks(
+            seconds, interval,
+            include_idle=request.args.get("idle", "false").lower() in ("1", "true", "yes"),
+            thread_filter=request.args.get("thread") or None,
+        )
+    except profiling.ProfilerBusy as e:
+        return jsonify({"error": str(e)}), 409
+
+    if request.args.get("format") == "json":
+        top = _int_arg("top", 30)
+        return jsonify({
+            "seconds": profile["seconds"],
+            "interval": profile["interval"],
+            "samples": profile["samples"],
+            "top_self": profile["leaves"].most_common(top),
+            "stacks": dict(profile["stacks"].most_common()),
+        })
+    return Response(profiling.collapsed(profile["stacks"]), mimetype="text/plain",
+                    headers={"X-Profile-Samples": str(profile["samples"])})
+
+
+@admin_bp.route("/admin/api/debug/memory")
+def api_debug_memory_status():
+    denied = _require_api_key()
+    return denied or jsonify(profiling.memory.status())
+
+
+@admin_bp.route("/admin/api/debug/memory/start", methods=["POST"])
+def api_debug_memory_start():
+    """Avvia tracemalloc (`frames` = profondità dei traceback registrati)."""
+    denied = _require_api_key()
+    return denied or jsonify(profiling.memory.start(_int_arg("frames", 25)))
+
+
+@admin_bp.route("/admin/api/debug/memory/stop", methods=["POST"])
+def api_debug_memory_stop():
+    denied = _require_api_key()
+    return denied or jsonify(profiling.memory.stop())
+
+
+@admin_bp.route("/admin/api/debug/memory/snapshot", methods=["POST"])
+def api_debug_memory_snapshot():
+    """Nuovo snapshot tracemalloc e sue allocazioni principali."""
+    denied = _require_api_key()
+    if denied:
+        return denied
+    group = request.args.get("group", "lineno")
+    if group not in profiling.MemoryProfiler.GROUPS:
+        return jsonify({"error": f"group must be one of {', '.join(profiling.MemoryProfiler.GROUPS)}"}), 400
+    try:
+        snapshot_id = profiling.memory.take_snapshot()
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify(profiling.memory.top(snapshot_id, group, _int_arg("top", 30)))
+
+
+@admin_bp.route("/admin/api/debug/memory/diff")
+def api_debug_memory_diff():
+    """Differenza fra due snapshot (`base` e `id`, default l'ultimo)."""
+    denied = _require_api_key()
+    if denied:
+        return denied
+    group = request.args.get("group", "lineno")
+    if group not in profiling.MemoryProfiler.GROUPS:
+        return jsonify({"error": f"group must be one of {', '.join(profiling.MemoryProfiler.GROUPS)}"}), 400
+    snapshots = [s["id"] for s in profiling.memory.status()["snapshots"]]
+    if len(snapshots) < 2 and "base" not in request.args:
+        return jsonify({"error": "Take at least two snapshots first"}), 409
+    base_id = _int_arg("base", snapshots[-2] if len(snapshots) >= 2 else 0)
+    snapshot_id = _int_arg("id", snapshots[-1] if snapshots else 0)
+    try:
+        return jsonify(profiling.memory.diff(base_id, snapshot_id, group, _int_arg("top", 30)))
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 404
+
+
+@admin_bp.route("/admin/api/debug/objects")
+def api_debug_objects():
+    """Alberi BeautifulSoup vivi e chi li trattiene, tipi più numerosi, cache per sito."""
+    denied = _require_api_key()
+    if denied:
+        return denied
+    collect = request.args.get("collect", "true").lower() in ("1", "true", "yes")
+    return jsonify(profiling.live_objects(_server.sites, collect=collect, top_types=_int_arg("top", 25)))
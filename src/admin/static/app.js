@@ -9,6 +9,7 @@ const app = createApp({
             { id: 'dashboard', label: 'Dashboard', icon: '<svg width="18" height="18" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M4 6a2 2 0 012-2h2a2 2 0 012 2v2a2 2 0 01-2 2H6a2 2 0 01-2-2V6zm10 0a2 2 0 012-2h2a2 2 0 012 2v2a2 2 0 01-2 2h-2a2 2 0 01-2-2V6zM4 16a2 2 0 012-2h2a2 2 0 012 2v2a2 2 0 01-2 2H6a2 2 0 01-2-2v-2zm10 0a2 2 0 012-2h2a2 2 0 012 2v2a2 2 0 01-2 2h-2a2 2 0 01-2-2v-2z"/></svg>' },
             { id: 'sites', label: 'Sites', icon: '<svg width="18" height="18" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M21 12a9 9 0 01-9 9m9-9a9 9 0 00-9-9m9 9H3m9 9a9 9 0 01-9-9m9 9c1.657 0 3-4.03 3-9s-1.343-9-3-9m0 18c-1.657 0-3-4.03-3-9s1.343-9 3-9m-9 9a9 9 0 019-9"/></svg>' },
             { id: 'config', label: 'Configuration', icon: '<svg width="18" height="18" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M10.325 4.317c.426-1.756 2.924-1.756 3.35 0a1.724 1.724 0 002.573 1.066c1.543-.94 3.31.826 2.37 2.37a1.724 1.724 0 001.066 2.573c1.756.426 1.756 2.924 0 3.35a1.724 1.724 0 00-1.066 2.573c.94 1.543-.826 3.31-2.37 2.37a1.724 1.724 0 00-2.573 1.066c-.426 1.756-2.924 1.756-3.35 0a1.724 1.724 0 00-2.573-1.066c-1.543.94-3.31-.826-2.37-2.37a1.724 1.724 0 00-1.066-2.573c-1.756-.426-1.756-2.924 0-3.35a1.724 1.724 0 001.066-2.573c-.94-1.543.826-3.31 2.37-2.37.996.608 2.296.07 2.572-1.065z"/><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M15 12a3 3 0 11-6 0 3 3 0 016 0z"/></svg>' },
+            { id: 'performance', label: 'Performance', icon: '<svg width="18" height="18" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 19v-6a2 2 0 00-2-2H5a2 2 0 00-2 2v6a2 2 0 002 2h2a2 2 0 002-2zm0 0V9a2 2 0 012-2h2a2 2 0 012 2v10m-6 0a2 2 0 002 2h2a2 2 0 002-2m0 0V5a2 2 0 012-2h2a2 2 0 012 2v14a2 2 0 01-2 2h-2a2 2 0 01-2-2z"/></svg>' },
             { id: 'logs', label: 'Logs', icon: '<svg width="18" height="18" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 12h6m-6 4h6m2 5H7a2 2 0 01-2-2V5a2 2 0 012-2h5.586a1 1 0 01.707.293l5.414 5.414a1 1 0 01.293.707V19a2 2 0 01-2 2z"/></svg>' },
         ];
 
@@ -61,6 +62,10 @@ const app = createApp({
         const logContainer = ref(null);
         let eventSource = null;
 
+        // === Performance ===
+        const perf = ref({ sites: {}, window_seconds: 300 });
+        let perfSource = null;
+
         // === Plugin Modal ===
         const pluginModal = reactive({ open: false });
         const pluginForm = reactive({ id: '', name: '', description: '' });
@@ -95,11 +100,29 @@ const app = createApp({
             return `${m}m`;
         }
 
+        function formatMs(ms) {
+            if (ms === null || ms === undefined) return '-';
+            return ms >= 1000 ? `${(ms / 1000).toFixed(1)}s` : `${Math.round(ms)}ms`;
+        }
+
+        function formatRatio(ratio) {
+            return ratio === null || ratio === undefined ? '-' : `${Math.round(ratio * 100)}%`;
+        }
+
+        function latencyBadge(ms) {
+            if (ms === null || ms === undefined) return 'badge-muted';
+            if (ms >= 10000) return 'badge-destructive';
+            if (ms >= 3000) return 'badge-warning';
+            return 'badge-success';
+        }
+
         // === Tab switching ===
         function switchTab(tabId) {
             currentTab.value = tabId;
             if (tabId === 'sites') fetchSites();
             if (tabId === 'config') fetchConfig();
+            if (tabId === 'performance') connectPerfStream();
+            else disconnectPerfStream();
         }
 
         // === API calls ===
@@ -507,6 +530,30 @@ const app = createApp({
             };
         }
 
+        // === Performance Stream (attivo solo con il tab aperto) ===
+        function connectPerfStream() {
+            if (perfSource) perfSource.close();
+            perfSource = new EventSource('/admin/api/perf');
+            perfSource.onmessage = (e) => {
+                try {
+                    perf.value = JSON.parse(e.data);
+                } catch (err) { console.error('Perf parse error:', err); }
+            };
+            perfSource.onerror = () => {
+                disconnectPerfStream();
+                setTimeout(() => {
+                    if (currentTab.value === 'performance') connectPerfStream();
+                }, 5000);
+            };
+        }
+
+        function disconnectPerfStream() {
+            if (perfSource) {
+                perfSource.close();
+                perfSource = null;
+            }
+        }
+
         // === Lifecycle ===
         let statusInterval;
 
@@ -524,6 +571,7 @@ const app = createApp({
 
         onUnmounted(() => {
             if (eventSource) eventSource.close();
+            disconnectPerfStream();
             clearInterval(statusInterval);
         });
 
@@ -549,12 +597,14 @@ const app = createApp({
             loadPluginFile, savePluginFile,
             // Config
             configForm, configSaved, saveConfig,
+            // Performance
+            perf,
             // Logs
             logs, logFilter, logPaused, logContainer, filteredLogs,
             // Toasts
             toasts,
             // Helpers
-            formatUptime,
+            formatUptime, formatMs, formatRatio, latencyBadge,
         };
     }
 });
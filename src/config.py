@@ -23,13 +23,75 @@ class Config:
     # Server
     host: str = "0.0.0.0"
     port: int = 9696
+    server_mode: str = "threaded"  # threaded | asgi | prefork
+    workers: int = field(default_factory=lambda: os.cpu_count() or 1)
 
     # Storage
     data_dir: Path = field(default_factory=lambda: Path("/app/data"))
 
-    # Cloudflare Bypass Proxy (Byparr/FlareSolverr)
+    # Stato condiviso (cookie, login, thanks, cache): memory | sqlite | redis
+    state_backend: str = "memory"
+    state_url: str = ""
+
+    # Cloudflare Bypass Proxy (Byparr/FlareSolverr), uno o più URL separati da virgola
     cf_bypass_url: str = "http://localhost:8191"
     cf_bypass_timeout: int = 60000
+    cf_bypass_hedge_after: float = 15.0
+    cf_bypass_cookies_only: bool = True
+
+    # Trasporto HTTP verso i siti
+    http_pool_size: int = 20
+    http2: bool = False
+
+    # Parsing HTML in processi separati (0 = sempre inline)
+    parse_workers: int = 0
+    parse_inline_max_kb: int = 64
+
+    # Refresh proattivo in background di cookie CF e sessione
+    background_refresh: bool = True
+
+    # Cache condivise (secondi, 0 = disabilitata)
+    search_cache_ttl: int = 900
+    thread_cache_ttl: int = 3600
+    # Copia dei risultati servita quando il forum non è raggiungibile
+    stale_cache_ttl: int = 86400
+
+    # Circuit breaker su forum e solver: errori consecutivi prima dell'apertura,
+    # secondi prima del primo tentativo di prova
+    breaker_threshold: int = 5
+    breaker_reset: float = 30.0
+
+    # Pacing anti-flood verso il forum (req/s): rate iniziale (0 = nessun limite
+    # finché il forum non segnala flood) e tetto massimo (0 = nessun tetto)
+    pace_rate: float = 0.0
+    pace_max_rate: float = 0.0
+
+    # Import periodico dei thanks dati dal profilo del forum (secondi, 0 = disabilitato)
+    thanks_import_interval: int = 86400
+
+    # Tracing per richiesta: tracce conservate e soglia (ms) per le richieste lente
+    trace_ring_size: int = 200
+    trace_slow_ms: int = 5000
+
+    # Access log JSON in data_dir (dimensione massima per file in MB e file ruotati tenuti)
+    access_log: bool = True
+    access_log_max_mb: int = 10
+    access_log_backups: int = 5
+
+    # Warm-up dei siti all'avvio (sessione, CF, login) e ricerche frequenti da pre-caricare
+    warmup: bool = True
+    warmup_preload: int = 0
+
+    # Snapshot delle cache in memoria in data_dir (solo backend memory): al riavvio
+    # si riparte a cache calde. Scritto ogni CACHE_SNAPSHOT_INTERVAL secondi e allo shutdown
+    cache_snapshot: bool = True
+    cache_snapshot_interval: int = 600
+
+    # Registrazione del traffico upstream in data_dir/recordings, oppure replay
+    # da un archivio (REPLAY_SPEED: 1 = tempi originali, 0 = senza attese)
+    record_upstream: bool = False
+    replay_upstream: str = ""
+    replay_speed: float = 1.0
 
     # Logging
     log_level: str = "INFO"
@@ -60,16 +122,48 @@ class Config:
             api_key=os.getenv("MIRCREW_API_KEY", "mircrew-api-key"),
             host=os.getenv("PROXY_HOST", "0.0.0.0"),
             port=int(os.getenv("PROXY_PORT", "9696")),
+            server_mode=os.getenv("SERVER_MODE", "threaded").lower(),
+            workers=int(os.getenv("WORKERS", str(os.cpu_count() or 1))),
             data_dir=Path(os.getenv("DATA_DIR", "/app/data")),
+            state_backend=os.getenv("STATE_BACKEND", "memory").lower(),
+            state_url=os.getenv("STATE_URL", ""),
             cf_bypass_url=os.getenv("FLARESOLVERR_URL", "http://localhost:8191"),
             cf_bypass_timeout=int(os.getenv("FLARESOLVERR_TIMEOUT", "60000")),
+            cf_bypass_hedge_after=float(os.getenv("FLARESOLVERR_HEDGE_AFTER", "15")),
+            cf_bypass_cookies_only=os.getenv("FLARESOLVERR_COOKIES_ONLY", "true").lower() in ("1", "true", "yes"),
+            http_pool_size=int(os.getenv("HTTP_POOL_SIZE", "20")),
+            http2=os.getenv("HTTP2", "false").lower() in ("1", "true", "yes"),
+            parse_workers=int(os.getenv("PARSE_WORKERS", "0")),
+            parse_inline_max_kb=int(os.getenv("PARSE_INLINE_MAX_KB", "64")),
+            background_refresh=os.getenv("BACKGROUND_REFRESH", "true").lower() in ("1", "true", "yes"),
+            search_cache_ttl=int(os.getenv("SEARCH_CACHE_TTL", "900")),
+            thread_cache_ttl=int(os.getenv("THREAD_CACHE_TTL", "3600")),
+            stale_cache_ttl=int(os.getenv("STALE_CACHE_TTL", "86400")),
+            breaker_threshold=int(os.getenv("BREAKER_THRESHOLD", "5")),
+            breaker_reset=float(os.getenv("BREAKER_RESET", "30")),
+            pace_rate=float(os.getenv("PACE_RATE", "0")),
+            pace_max_rate=float(os.getenv("PACE_MAX_RATE", "0")),
+            thanks_import_interval=int(os.getenv("THANKS_IMPORT_INTERVAL", "86400")),
+            trace_ring_size=int(os.getenv("TRACE_RING_SIZE", "200")),
+            trace_slow_ms=int(os.getenv("TRACE_SLOW_MS", "5000")),
+            access_log=os.getenv("ACCESS_LOG", "true").lower() in ("1", "true", "yes"),
+            access_log_max_mb=int(os.getenv("ACCESS_LOG_MAX_MB", "10")),
+            access_log_backups=int(os.getenv("ACCESS_LOG_BACKUPS", "5")),
+            warmup=os.getenv("WARMUP", "true").lower() in ("1", "true", "yes"),
+            warmup_preload=int(os.getenv("WARMUP_PRELOAD", "0")),
+            cache_snapshot=os.getenv("CACHE_SNAPSHOT", "true").lower() in ("1", "true", "yes"),
+            cache_snapshot_interval=int(os.getenv("CACHE_SNAPSHOT_INTERVAL", "600")),
+            record_upstream=os.getenv("RECORD_UPSTREAM", "false").lower() in ("1", "true", "yes"),
+            replay_upstream=os.getenv("REPLAY_UPSTREAM", ""),
+            replay_speed=float(os.getenv("REPLAY_SPEED", "1")),
             log_level=os.getenv("LOG_LEVEL", "INFO"),
         )
 
     def setup_logging(self):
         """Configura il logging globale."""
         level = logging.DEBUG if self.log_level == "DEBUG" else logging.INFO
-        logging.basicConfig(
-            level=level,
-            format="%(asctime)s - %(levelname)s - %(message)s",
-        )
+        # request_tag ("[<request id>] ") è valorizzato dal tracing delle richieste
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(request_tag)s%(message)s",
+                                               defaults={"request_tag": ""}))
+        logging.basicConfig(level=level, handlers=[handler])
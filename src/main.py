@@ -2,15 +2,30 @@
 """Entrypoint per il Torznab Proxy multi-sito con admin panel."""
 
 import json
+import os
+import sys
+import signal
 import logging
+import time
+from dataclasses import fields
 from importlib import import_module
 from pathlib import Path
 
 from config import Config
 from torznab.server import TorznabServer
+from torznab.models import TorznabResult
+from torznab.metrics import enable_shared_metrics
+from torznab import tracing
+from torznab.accesslog import enable_access_log
+from torznab.parsepool import ParsePool, set_parse_pool
+from torznab.profiling import register_idle_thread
+from session.recording import enable_recording, enable_replay
 from admin.config_store import ConfigStore
 from admin.log_handler import log_handler
 from admin.routes import admin_bp, init_admin
+from store import MemoryStore, SqliteStore, create_store, get_store, set_store
+from store.persist import FLUSH_THREAD_NAME
+from store.snapshot import enable_cache_snapshot
 
 
 def discover_plugins() -> dict:
@@ -31,15 +46,23 @@ def discover_plugins() -> dict:
     return plugins
 
 
-def main():
-    config = Config.from_env()
-    config.setup_logging()
-    config.data_dir.mkdir(parents=True, exist_ok=True)
+def setup_upstream_traffic(config: Config):
+    """Registrazione o replay del traffico upstream; va fatto prima di creare le sessioni."""
+    if config.replay_upstream:
+        enable_replay([p.strip() for p in config.replay_upstream.split(",") if p.strip()],
+                      config.replay_speed)
+    elif config.record_upstream:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        enable_recording(config.data_dir / "recordings" / f"upstream-{stamp}-{os.getpid()}.jsonl.gz")
 
-    # Installa log handler per admin panel
-    root_logger = logging.getLogger()
-    root_logger.addHandler(log_handler)
 
+def cache_schema_tag() -> str:
+    """Firma della forma dei risultati in cache: se cambia, lo snapshot va scartato."""
+    return "TorznabResult:" + ",".join(f.name for f in fields(TorznabResult))
+
+
+def build_server(config: Config) -> TorznabServer:
+    """Crea il TorznabServer con admin panel e siti abilitati."""
     logger = logging.getLogger("main")
 
     # Scopri plugin disponibili
@@ -53,6 +76,9 @@ def main():
     config_store = ConfigStore(config.data_dir / "config.json", config)
 
     server = TorznabServer(api_key=config_store.get_raw().get("api_key", config.api_key))
+    server.warmup.configure(config.warmup, config.warmup_preload, config.data_dir)
+    tracing.configure(config.trace_ring_size, config.trace_slow_ms)
+    register_idle_thread(FLUSH_THREAD_NAME)
 
     # Registra admin panel
     init_admin(server, config_store, site_registry, plugins)
@@ -87,11 +113,80 @@ def main():
     if not server.sites:
         logger.warning("No sites loaded! Use the admin panel at /admin to add sites.")
 
+    return server
+
+
+def main():
+    config = Config.from_env()
+    config.setup_logging()
+    config.data_dir.mkdir(parents=True, exist_ok=True)
+
+    # Installa log handler per admin panel
+    root_logger = logging.getLogger()
+    root_logger.addHandler(log_handler)
+
+    logger = logging.getLogger("main")
+
+    # docker stop invia SIGTERM: uscita ordinata, così atexit scrive cookie e journal pendenti
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     logger.info(f"=== Torznab Proxy v7.1.0 starting on {config.host}:{config.port} ===")
     logger.info(f"Admin panel: http://{config.host}:{config.port}/admin")
-    logger.info(f"Active sites: {list(server.sites.keys())}")
     logger.info(f"CF Bypass Proxy: {config.cf_bypass_url}")
 
+    store = create_store(config)
+    set_store(store)
+    logger.info(f"State backend: {config.state_backend}")
+
+    # Pool creato in modo lazy: in prefork ogni worker avvia il proprio
+    set_parse_pool(ParsePool(config.parse_workers, config.parse_inline_max_kb * 1024))
+
+    if config.server_mode == "prefork":
+        if hasattr(os, "fork"):
+            from torznab.prefork import PreforkServer
+            # Cookie, login, thanks e cache devono essere condivisi fra i worker
+            if isinstance(store, MemoryStore):
+                logger.info("Prefork mode: using SQLite state backend instead of memory")
+                set_store(SqliteStore(config.data_dir / "state.db"))
+
+            def build_worker_app():
+                # /metrics di ogni worker riporta la somma di tutti i worker
+                enable_shared_metrics(get_store())
+                if config.access_log:
+                    # Un file per worker: nessuna rotazione concorrente sullo stesso file
+                    enable_access_log(config.data_dir, config.access_log_max_mb,
+                                      config.access_log_backups, per_process=True)
+                setup_upstream_traffic(config)
+                return build_server(config).app
+
+            PreforkServer(config.host, config.port, config.workers, build_worker_app).serve_forever()
+            return
+        logger.error("SERVER_MODE=prefork requires fork(), falling back to threaded server")
+
+    if config.access_log:
+        enable_access_log(config.data_dir, config.access_log_max_mb, config.access_log_backups)
+    setup_upstream_traffic(config)
+    # SQLite e Redis sono già persistenti: lo snapshot serve solo al backend in memoria
+    if config.cache_snapshot and isinstance(store, MemoryStore):
+        enable_cache_snapshot(store, config.data_dir, cache_schema_tag(),
+                              config.cache_snapshot_interval)
+
+    server = build_server(config)
+    logger.info(f"Active sites: {list(server.sites.keys())}")
+
+    if config.server_mode == "asgi":
+        try:
+            import uvicorn
+        except ImportError:
+            logger.error("SERVER_MODE=asgi requires uvicorn (pip install uvicorn), "
+                         "falling back to threaded server")
+        else:
+            from torznab.asgi import create_asgi_app
+            logger.info("Serving via ASGI (uvicorn)")
+            uvicorn.run(create_asgi_app(server, log_handler), host=config.host,
+                        port=config.port, log_level=config.log_level.lower())
+            return
+
     server.app.run(host=config.host, port=config.port, debug=False, threaded=True)
 
 
@@ -1,12 +1,26 @@
 """Sessione HTTP base con persistenza cookie e login generico."""
 
 import json
+import re
 import time
 import logging
+import threading
 from pathlib import Path
+from typing import Optional
 
 import requests
 
+from .breaker import CircuitBreaker, CircuitOpenError
+from .pacing import RequestPacer
+from .state import RefreshState
+from .refresher import SessionRefresher
+from .transport import build_http_session, get_traffic
+from store import get_store
+from store.persist import DebouncedWriter
+from torznab.metrics import count_bytes, count_error
+from torznab.perf import perf
+from torznab import tracing
+
 logger = logging.getLogger("session")
 
 
@@ -18,15 +32,30 @@ class BaseSession:
     - _check_logged_in(html: str) -> bool
     """
 
+    # Intervallo oltre il quale la sessione va riverificata
+    SESSION_CHECK_INTERVAL = 3600
+
+    # Cookie che identificano la sessione di login (per il refresh proattivo)
+    session_cookie_pattern: Optional[re.Pattern] = None
+
+    # Se True la sessione si valida dalle pagine già scaricate (vedi _send)
+    # invece di sondare periodicamente la homepage
+    passive_validation = False
+
     def __init__(self, base_url: str, username: str, password: str,
-                 cookies_file: Path, cookie_ttl: int = 43200):
+                 cookies_file: Path, cookie_ttl: int = 43200,
+                 pool_size: int = 20, http2: bool = False, store=None,
+                 breaker_threshold: int = 5, breaker_reset: float = 30.0,
+                 pace_rate: float = 0.0, pace_max_rate: float = 0.0):
         self.base_url = base_url
         self.username = username
         self.password = password
         self.cookies_file = cookies_file
         self.cookie_ttl = cookie_ttl
 
-        self.http = requests.Session()
+        # Sessione condivisa fra i thread Flask: pool di connessioni keep-alive
+        # e cookie jar thread-safe (cookie e user-agent CF restano unici)
+        self.http = build_http_session(pool_size=pool_size, http2=http2)
         self.http.headers.update({
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
             "Accept-Language": "it-IT,it;q=0.9,en-US;q=0.8,en;q=0.7",
@@ -34,24 +63,211 @@ class BaseSession:
         self.user_agent = None
         self.session_valid = False
         self.last_login = 0
+        self.pacer = RequestPacer(rate=pace_rate, max_rate=pace_max_rate)
+        # Forum irraggiungibile o in errore: fallisci subito invece di attendere i timeout
+        self.upstream_breaker = CircuitBreaker("upstream", breaker_threshold, breaker_reset)
+        self.login_state = RefreshState("login")
+        self.last_activity = 0.0
+        self.refresher = SessionRefresher(self)
+        self._local = threading.local()
 
+        # Stato condiviso fra worker/processi (cookie, ultimo login, lock)
+        self.store = store or get_store()
+        self.store_key = f"session:{cookies_file.stem}"
+        self._shared_synced_at = 0.0
+        self._cookie_data = None
+        self._cookie_writer = DebouncedWriter(cookies_file, lambda: self._cookie_data)
+
+        # In registrazione si annotano i cookie di partenza, in replay si ripristinano
+        traffic = get_traffic()
+        if traffic is not None:
+            traffic.session_starting(self)
         self._load_cookies()
+        if traffic is not None:
+            traffic.session_started(self)
 
     def get(self, url, **kwargs):
         """GET request."""
         kwargs.setdefault("timeout", 30)
-        return self.http.get(url, **kwargs)
+        return self._direct("GET", url, **kwargs)
 
     def post(self, url, data=None, **kwargs):
         """POST request."""
         kwargs.setdefault("timeout", 30)
-        return self.http.post(url, data=data, **kwargs)
+        return self._direct("POST", url, data=data, **kwargs)
+
+    # --- Circuit breaker upstream ---
+
+    # Errori del forum o dell'edge Cloudflare verso il forum (521-524: origin down)
+    UPSTREAM_FAILURE_STATUSES = {500, 502, 504, 520, 521, 522, 523, 524}
+
+    def _direct(self, method, url, **kwargs):
+        """Richiesta diretta al sito, protetta dal circuit breaker upstream.
+
+        Solleva CircuitOpenError senza toccare la rete se il circuito è aperto.
+        """
+        try:
+            self.upstream_breaker.before_call()
+        except CircuitOpenError:
+            count_error("circuit_open")
+            raise
+        perf.upstream_request()
+        tracing.increment("upstream_requests")
+        try:
+            r = self.http.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self.upstream_breaker.record_failure()
+            count_error(type(e).__name__)
+            raise
+        count_bytes(len(r.content))
+        tracing.increment("upstream_bytes", len(r.content))
+        if r.status_code in self.UPSTREAM_FAILURE_STATUSES:
+            self.upstream_breaker.record_failure()
+            count_error(f"http_{r.status_code}")
+        else:
+            self.upstream_breaker.record_success()
+        return r
+
+    # --- Pacing anti-flood ---
+
+    MAX_FLOOD_RETRIES = 3
+
+    def _paced(self, send, url, **kwargs):
+        """Esegue una richiesta rispettando il pacer, con retry su flood."""
+        r = None
+        for _ in range(self.MAX_FLOOD_RETRIES + 1):
+            self.pacer.acquire()
+            started = time.monotonic()
+            r = send(url, **kwargs)
+            if not self._is_flood_response(r):
+                self.pacer.on_success(time.monotonic() - started)
+                return r
+            self.pacer.on_flood(self._retry_after(r))
+        logger.error(f"Still flood-limited after {self.MAX_FLOOD_RETRIES} retries: {url[:60]}")
+        return r
+
+    def _send(self, send, url, **kwargs):
+        """Richiesta con pacing e validazione passiva della sessione.
+
+        Ogni pagina ricevuta conferma (o smentisce) il login: se arriva una
+        pagina da utente non loggato si rifà il login e si ripete la richiesta.
+        """
+        started = time.monotonic()
+        r = self._paced(send, url, **kwargs)
+        if not self.passive_validation or getattr(self._local, "in_login", False):
+            return r
+
+        state = self._observe_login_state(r)
+        if state is False:
+            logger.warning(f"Logged-out page for {url[:60]}, logging in again...")
+            self.session_valid = False
+            if self._login_flight(self._relogin, since=started):
+                r = self._paced(send, url, **kwargs)
+                self._observe_login_state(r)
+        return r
+
+    def _observe_login_state(self, response) -> Optional[bool]:
+        """Aggiorna lo stato di login dalla risposta. None se non determinabile."""
+        if response.status_code != 200:
+            return None
+        html = getattr(response, "text", "") or ""
+        if self._check_logged_in(html):
+            self.last_login = time.time()
+            if not self.session_valid:
+                self.session_valid = True
+                self.login_state.mark_valid()
+            return True
+        if self._check_logged_out(html):
+            return False
+        return None
+
+    def _is_flood_response(self, response) -> bool:
+        """Verifica se l'upstream ha rifiutato la richiesta per flood."""
+        return response.status_code == 429
+
+    @staticmethod
+    def _retry_after(response):
+        headers = getattr(response, "headers", None) or {}
+        try:
+            return float(headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return None
 
     def ensure_logged_in(self) -> "BaseSession":
-        """Verifica la sessione, fa login se necessario."""
-        if self.session_valid and (time.time() - self.last_login) < 3600:
+        """Verifica la sessione, fa login se necessario.
+
+        Verifica e login sono single-flight: con più richieste concorrenti
+        un solo thread esegue il controllo, gli altri ne attendono l'esito.
+        """
+        self.last_activity = time.monotonic()
+        if self._session_fresh():
             return self
 
+        since = time.monotonic()
+        self._sync_shared_state()
+        if not self._session_fresh():
+            self._login_flight(self._validate_or_login, since=since)
+        return self
+
+    def _login_flight(self, login, since: float) -> bool:
+        """Login single-flight fra i thread e, tramite lo store, fra i processi."""
+        return self.login_state.run(
+            lambda: self._run_shared("login", login, since, self.login_state.wait_timeout),
+            since=since,
+        )
+
+    def _run_shared(self, what: str, refresh, since: Optional[float], timeout: float) -> bool:
+        """Esegue `refresh` sotto il lock condiviso `what`.
+
+        Se nel frattempo un altro processo ha già completato lo stesso refresh
+        (`{what}_at` nello store successivo a `since`), si riusa il suo
+        risultato. Cookie più recenti da soli non bastano: un altro worker li
+        salva anche dopo una normale richiesta, con la sessione già scaduta.
+        """
+        since_wall = time.time() - (time.monotonic() - since) if since is not None else time.time()
+        try:
+            with self.store.lock(f"{self.store_key}:{what}", timeout=timeout):
+                done_at = self.store.get(f"{self.store_key}:{what}_at", 0)
+                self._sync_shared_state()
+                if done_at >= since_wall:
+                    logger.info(f"{what} refreshed by another worker, reusing it")
+                    return True
+                ok = refresh()
+                if ok:
+                    stamp = time.time()
+                    self.store.set(f"{self.store_key}:{what}_at", stamp)
+                    if what == "login":
+                        self.last_login = max(self.last_login, stamp)
+                return ok
+        except TimeoutError as e:
+            logger.warning(f"Shared {what} refresh: {e}")
+            return False
+
+    def _session_fresh(self) -> bool:
+        """True se la sessione può essere usata senza riverificarla."""
+        if not self.session_valid:
+            return False
+        if self.passive_validation:
+            return True
+        return (time.time() - self.last_login) < self.SESSION_CHECK_INTERVAL
+
+    def _relogin(self) -> bool:
+        """Login diretto (sessione già nota come scaduta)."""
+        self._local.in_login = True
+        try:
+            return self._do_login()
+        finally:
+            self._local.in_login = False
+
+    def _validate_or_login(self) -> bool:
+        """Controlla la sessione corrente e, se scaduta, rifà il login."""
+        self._local.in_login = True
+        try:
+            return self._probe_or_login()
+        finally:
+            self._local.in_login = False
+
+    def _probe_or_login(self) -> bool:
         try:
             r = self.get(self.base_url)
             html = r.text if hasattr(r, "text") else str(r)
@@ -59,12 +275,51 @@ class BaseSession:
                 logger.info("Session still valid")
                 self.session_valid = True
                 self.last_login = time.time()
-                return self
+                return True
         except Exception as e:
             logger.error(f"Session check failed: {e}")
 
-        self._do_login()
-        return self
+        self.session_valid = False
+        return self._do_login()
+
+    def close(self):
+        """Rilascia le risorse della sessione (chiamato all'unregister del sito)."""
+        self.refresher.stop()
+        self._cookie_writer.close()
+        self.http.close()
+
+    # --- Refresh proattivo ---
+
+    def start_background_refresh(self):
+        """Avvia il rinnovo in background di cookie e sessione."""
+        self.refresher.start()
+
+    def cookie_expiry(self, pattern) -> Optional[float]:
+        """Scadenza (epoch) più vicina fra i cookie il cui nome matcha `pattern`."""
+        expiries = [c.expires for c in self.http.cookies
+                    if c.expires and re.search(pattern, c.name)]
+        return min(expiries) if expiries else None
+
+    def refresh_due(self, lead: float) -> bool:
+        """True se qualcosa scade entro `lead` secondi e va rinnovato."""
+        return self._login_refresh_due(lead)
+
+    def _login_refresh_due(self, lead: float) -> bool:
+        if not self.session_valid:
+            return False
+        if time.time() - self.last_login > self.SESSION_CHECK_INTERVAL - lead:
+            return True
+        if self.session_cookie_pattern is not None:
+            expiry = self.cookie_expiry(self.session_cookie_pattern)
+            if expiry is not None and expiry - time.time() < lead:
+                return True
+        return False
+
+    def refresh_ahead(self, lead: float):
+        """Riverifica (o rifà) il login prima che la sessione scada."""
+        if self._login_refresh_due(lead):
+            logger.info("Refreshing login session ahead of expiry")
+            self._login_flight(self._validate_or_login, since=time.monotonic())
 
     def _do_login(self) -> bool:
         """Esegue il login. Da sovrascrivere nelle sottoclassi."""
@@ -74,37 +329,92 @@ class BaseSession:
         """Verifica se siamo loggati. Da sovrascrivere nelle sottoclassi."""
         raise NotImplementedError
 
+    def _check_logged_out(self, html: str) -> bool:
+        """Verifica se la pagina è servita a un utente non loggato.
+
+        Usata dalla validazione passiva; di default non riconosce nulla.
+        """
+        return False
+
     # --- Cookie persistence ---
 
+    def _cookie_snapshot(self) -> dict:
+        """Cookie e user-agent correnti nel formato di salvataggio."""
+        cookies = {}
+        for c in self.http.cookies:
+            cookies[c.name] = {"value": c.value, "domain": c.domain, "path": c.path,
+                               "expires": c.expires}
+        return {
+            "cookies": cookies,
+            "user_agent": self.user_agent,
+            "time": time.time(),
+        }
+
     def _save_cookies(self):
         try:
-            cookies = {}
-            for c in self.http.cookies:
-                cookies[c.name] = {"value": c.value, "domain": c.domain, "path": c.path}
-            save_data = {
-                "cookies": cookies,
-                "user_agent": self.user_agent,
-                "time": time.time(),
-            }
-            with open(self.cookies_file, "w") as f:
-                json.dump(save_data, f)
+            save_data = self._cookie_snapshot()
+            self.store.set(f"{self.store_key}:cookies", save_data)
+            self._shared_synced_at = save_data["time"]
+            # Scrittura su disco differita e atomica (thread di flush)
+            self._cookie_data = save_data
+            self._cookie_writer.mark_dirty()
         except Exception as e:
             logger.warning(f"Save cookies error: {e}")
 
+    def _apply_cookie_data(self, data: dict) -> int:
+        """Applica cookie e user-agent salvati. Ritorna il numero di cookie caricati.
+
+        I cookie con scadenza esplicita restano validi fino a quella scadenza;
+        quelli di sessione (senza scadenza) seguono il TTL dei dati salvati.
+        """
+        now = time.time()
+        fresh = now - data.get("time", 0) < self.cookie_ttl
+        loaded = 0
+        for name, c in data.get("cookies", {}).items():
+            expires = c.get("expires")
+            if expires and expires <= now:
+                continue
+            if not expires and not fresh:
+                continue
+            self.http.cookies.set(name, c["value"], domain=c.get("domain", ""),
+                                  path=c.get("path", "/"), expires=expires)
+            loaded += 1
+        if loaded:
+            ua = data.get("user_agent")
+            if ua:
+                self.user_agent = ua
+                self.http.headers["User-Agent"] = ua
+        return loaded
+
     def _load_cookies(self):
+        """Carica i cookie salvati (store condiviso se più recente, altrimenti file)."""
         try:
-            if self.cookies_file.exists():
+            data = self.store.get(f"{self.store_key}:cookies")
+            if data is None and self.cookies_file.exists():
                 with open(self.cookies_file) as f:
                     data = json.load(f)
-                if time.time() - data.get("time", 0) < self.cookie_ttl:
-                    for name, c in data.get("cookies", {}).items():
-                        self.http.cookies.set(name, c["value"], domain=c.get("domain", ""))
-                    ua = data.get("user_agent")
-                    if ua:
-                        self.user_agent = ua
-                        self.http.headers["User-Agent"] = ua
-                    logger.info(f"Loaded {len(data.get('cookies', {}))} saved cookies")
+            if data:
+                loaded = self._apply_cookie_data(data)
+                self._shared_synced_at = data.get("time", 0)
+                if loaded:
+                    logger.info(f"Loaded {loaded} saved cookies")
                     return True
         except Exception:
             pass
         return False
+
+    def _sync_shared_state(self) -> bool:
+        """Importa cookie e login aggiornati da altri processi. True se c'era qualcosa di nuovo."""
+        changed = False
+        data = self.store.get(f"{self.store_key}:cookies")
+        if data and data.get("time", 0) > self._shared_synced_at:
+            self._apply_cookie_data(data)
+            self._shared_synced_at = data["time"]
+            changed = True
+        login_at = self.store.get(f"{self.store_key}:login_at", 0)
+        if login_at > self.last_login:
+            self.session_valid = True
+            self.last_login = login_at
+            self.login_state.mark_valid()
+            changed = True
+        return changed
@@ -0,0 +1,102 @@
+"""Circuit breaker per dipendenze esterne (solver CF, forum upstream)."""
+
+import time
+import logging
+import threading
+
+logger = logging.getLogger("session.breaker")
+
+
+class CircuitOpenError(Exception):
+    """La dipendenza è considerata non disponibile: richiesta non eseguita."""
+
+
+class CircuitBreaker:
+    """closed → open → half_open → closed/open.
+
+    Dopo `failure_threshold` errori consecutivi il circuito si apre e le
+    chiamate falliscono subito. Trascorso `reset_timeout` una sola chiamata
+    di prova passa (half-open): se riesce il circuito si richiude, altrimenti
+    si riapre con un timeout raddoppiato (fino a `max_reset_timeout`).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, max_reset_timeout: float = 300.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.current_timeout = reset_timeout
+        self.rejected = 0
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """True se le chiamate verrebbero rifiutate ora (senza consumare la prova)."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            return time.monotonic() - self.opened_at < self.current_timeout
+
+    def allow(self) -> bool:
+        """Chiede il permesso per una chiamata; in half-open passa solo la prova."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # Anche una prova rimasta senza esito viene ripetuta dopo il timeout
+            if time.monotonic() - self.opened_at >= self.current_timeout:
+                logger.info(f"Circuit '{self.name}' half-open, probing")
+                self.state = self.HALF_OPEN
+                self.opened_at = time.monotonic()
+                return True
+            self.rejected += 1
+            return False
+
+    def before_call(self):
+        """Come allow(), ma solleva CircuitOpenError se la chiamata non è permessa."""
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.current_timeout = self.reset_timeout
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.current_timeout = min(self.current_timeout * 2, self.max_reset_timeout)
+                self._open()
+            elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        logger.warning(f"Circuit '{self.name}' open after {self.failures} failures, "
+                       f"retrying in {int(self.current_timeout)}s")
+
+    def stats(self) -> dict:
+        with self._lock:
+            retry_in = 0.0
+            if self.state != self.CLOSED:
+                retry_in = max(0.0, self.current_timeout - (time.monotonic() - self.opened_at))
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "retry_in": round(retry_in, 1),
+            }
@@ -2,15 +2,32 @@
 
 import time
 import logging
+import threading
 from pathlib import Path
+from urllib.parse import urlencode
 
 import requests
 
 from .base import BaseSession
+from .breaker import CircuitBreaker
+from .solver_pool import SolverEndpoint, SolverPool
+from .state import RefreshState
+from .transport import build_http_session
+from torznab.metrics import count_error, observe_stage
+from torznab import tracing
 
 logger = logging.getLogger("session.byparr")
 
 
+def is_cf_blocked(response) -> bool:
+    """Check if response is a Cloudflare block."""
+    if response.status_code == 403:
+        return True
+    if response.status_code == 503 and "cloudflare" in response.text.lower():
+        return True
+    return False
+
+
 class _ByparrResponse:
     """Minimal response wrapper for Byparr solution data."""
 
@@ -24,15 +41,121 @@ class ByparrSession(BaseSession):
     """Estende BaseSession con bypass Cloudflare via Byparr/FlareSolverr."""
 
     def __init__(self, base_url: str, username: str, password: str,
-                 cookies_file: Path, flaresolverr_url: str,
-                 flaresolverr_timeout: int = 60000, **kwargs):
-        self.flaresolverr_url = flaresolverr_url
+                 cookies_file: Path, flaresolverr_url, flaresolverr_timeout: int = 60000,
+                 hedge_after: float = 15.0, cookies_only: bool = True, **kwargs):
+        # Uno o più solver (lista o stringa separata da virgole)
+        self.solver_pool = SolverPool(flaresolverr_url, hedge_after=hedge_after)
+        self.flaresolverr_url = ",".join(e.url for e in self.solver_pool.endpoints)
         self.flaresolverr_timeout = flaresolverr_timeout
+        # Solve CF chiedendo solo cookie e user-agent: le pagine passano dal client diretto
+        self.cookies_only = cookies_only
+        self.solve_stats = {"solves": 0, "full_page_fallbacks": 0}
+        # GET a pagina intera in corso, per URL: le richieste concorrenti ne attendono l'esito
+        self._fallbacks = {}
+        self._fallbacks_lock = threading.Lock()
+        # Tutti i solver giù: niente attese di connessione/timeout a ogni richiesta
+        self.solver_breaker = CircuitBreaker("solver", kwargs.get("breaker_threshold", 5),
+                                             kwargs.get("breaker_reset", 30.0))
         self.cf_valid = False
+        self.cf_state = RefreshState("cf", wait_timeout=flaresolverr_timeout / 1000 + 60)
+        # Sessione browser persistente su ogni solver (FlareSolverr sessions.*)
+        self.solver_session_name = f"torznab-{cookies_file.stem}"
+        # Connessioni keep-alive verso i solver (niente handshake per ogni solve)
+        self.solver_http = build_http_session(pool_size=kwargs.get("pool_size", 20))
         super().__init__(base_url, username, password, cookies_file, **kwargs)
 
-    def _byparr_request(self, url, method="GET", post_data=None):
-        """Send request through Byparr/FlareSolverr to solve CF challenges."""
+    # --- Sessioni persistenti del solver ---
+
+    def _solver_command(self, endpoint: SolverEndpoint, payload: dict, timeout: int):
+        """Invia un comando a /v1 di `endpoint` e ritorna il JSON decodificato (o None)."""
+        r = self.solver_http.post(
+            f"{endpoint.url}/v1",
+            json=payload,
+            timeout=timeout,
+        )
+        try:
+            return r.json()
+        except (ValueError, requests.exceptions.JSONDecodeError):
+            logger.error(f"Byparr {endpoint.url} non-JSON response (HTTP {r.status_code}): "
+                         f"{r.text[:500]!r}")
+            return None
+
+    def _ensure_solver_session(self, endpoint: SolverEndpoint):
+        """Crea (una volta) la sessione browser nominata su `endpoint`.
+
+        Ritorna l'id sessione, oppure None se il backend non supporta le
+        sessioni: in quel caso si resta in modalità stateless.
+        """
+        if endpoint.session_id or not endpoint.sessions_supported:
+            return endpoint.session_id
+
+        try:
+            data = self._solver_command(
+                endpoint, {"cmd": "sessions.create", "session": self.solver_session_name}, timeout=30,
+            )
+        except requests.RequestException as e:
+            logger.warning(f"Byparr {endpoint.url} sessions.create failed: {e}")
+            return None
+
+        if data and data.get("status") == "ok":
+            endpoint.session_id = data.get("session") or self.solver_session_name
+            logger.info(f"Byparr browser session ready on {endpoint.url}: {endpoint.session_id}")
+        else:
+            message = (data or {}).get("message", "unknown")
+            logger.info(f"Byparr {endpoint.url} sessions not supported ({message}), "
+                        f"using stateless requests")
+            endpoint.sessions_supported = False
+        return endpoint.session_id
+
+    def _destroy_solver_session(self, endpoint: SolverEndpoint):
+        """Chiude la sessione browser su `endpoint`, se presente."""
+        session_id, endpoint.session_id = endpoint.session_id, None
+        if not session_id:
+            return
+        try:
+            self._solver_command(endpoint, {"cmd": "sessions.destroy", "session": session_id},
+                                 timeout=30)
+            logger.info(f"Byparr browser session destroyed on {endpoint.url}: {session_id}")
+        except requests.RequestException as e:
+            logger.warning(f"Byparr {endpoint.url} sessions.destroy failed: {e}")
+
+    def close(self):
+        for endpoint in self.solver_pool.endpoints:
+            self._destroy_solver_session(endpoint)
+        self.solver_pool.close()
+        self.solver_http.close()
+        super().close()
+
+    def _solver_attempt(self, endpoint: SolverEndpoint, payload: dict, timeout: int,
+                        retry_session: bool = True):
+        """Esegue `payload` su un solver, ricreando una volta la sessione se inutilizzabile."""
+        payload = dict(payload)
+        session_id = self._ensure_solver_session(endpoint)
+        if session_id:
+            payload["session"] = session_id
+
+        try:
+            data = self._solver_command(endpoint, payload, timeout)
+        except requests.ConnectionError:
+            logger.error(f"Cannot connect to Byparr at {endpoint.url} - is it running?")
+            return None
+
+        if data and data.get("status") != "ok":
+            message = data.get("message", "unknown")
+            if session_id and retry_session and "session" in message.lower():
+                # Sessione scaduta o browser crashato: ricreala e riprova
+                logger.warning(f"Byparr session {session_id} on {endpoint.url} unusable "
+                               f"({message}), recreating...")
+                self._destroy_solver_session(endpoint)
+                return self._solver_attempt(endpoint, payload, timeout, retry_session=False)
+        return data
+
+    def _byparr_request(self, url, method="GET", post_data=None, cookies_only=False):
+        """Send request through Byparr/FlareSolverr to solve CF challenges.
+
+        With cookies_only the solver returns cookies and user-agent without
+        the page HTML (FlareSolverr `returnOnlyCookies`).
+        """
         timeout_sec = max(1, self.flaresolverr_timeout // 1000)
         payload = {
             "cmd": f"request.{method.lower()}",
@@ -42,23 +165,28 @@ class ByparrSession(BaseSession):
         }
         if post_data:
             payload["postData"] = post_data
+        if cookies_only:
+            payload["returnOnlyCookies"] = True
+
+        if not self.solver_breaker.allow():
+            logger.warning(f"Byparr circuit open, skipping solve for {url[:60]}")
+            return None
 
+        data = None
+        started = time.perf_counter()
+        tracing.increment("cf_solves")
         try:
             logger.info(f"Byparr {method}: {url[:80]}...")
-            r = requests.post(
-                f"{self.flaresolverr_url}/v1",
-                json=payload,
-                timeout=timeout_sec + 30,
+            data = self.solver_pool.call(
+                lambda endpoint: self._solver_attempt(endpoint, payload, timeout_sec + 30),
+                is_ok=lambda d: bool(d) and d.get("status") == "ok",
             )
-
-            try:
-                data = r.json()
-            except (ValueError, requests.exceptions.JSONDecodeError):
-                logger.error(f"Byparr non-JSON response (HTTP {r.status_code}): {r.text[:500]!r}")
+            if data is None:
+                logger.error(f"No Byparr endpoint could handle {url[:60]} ({self.flaresolverr_url})")
                 return None
 
             if data.get("status") != "ok":
-                logger.error(f"Byparr error (HTTP {r.status_code}): {data.get('message', 'unknown')}")
+                logger.error(f"Byparr error: {data.get('message', 'unknown')}")
                 return None
 
             solution = data.get("solution", {})
@@ -66,10 +194,12 @@ class ByparrSession(BaseSession):
             # Extract and apply cookies from Byparr's browser session
             byparr_cookies = solution.get("cookies", [])
             for c in byparr_cookies:
+                expires = c.get("expires") or c.get("expiry")
                 self.http.cookies.set(
                     c["name"], c["value"],
                     domain=c.get("domain", ""),
                     path=c.get("path", "/"),
+                    expires=int(expires) if expires and expires > 0 else None,
                 )
 
             # Use same user-agent as Byparr's browser
@@ -84,42 +214,82 @@ class ByparrSession(BaseSession):
             logger.info(f"Byparr done: status={solution.get('status')}, cookies={len(byparr_cookies)}")
             return solution
 
-        except requests.ConnectionError:
-            logger.error(f"Cannot connect to Byparr at {self.flaresolverr_url} - is it running?")
-            return None
         except Exception as e:
             logger.error(f"Byparr request failed for {url[:60]}: {e}")
             return None
+        finally:
+            observe_stage("cf_solve", time.perf_counter() - started, url=url[:120], method=method)
+            if data and data.get("status") == "ok":
+                self.solver_breaker.record_success()
+            else:
+                self.solver_breaker.record_failure()
+                count_error("cf_solve_failed")
+
+    def _solve_cf(self, since=None) -> bool:
+        """Solve Cloudflare challenge via Byparr (single-flight across threads)."""
+        return self.cf_state.run(
+            lambda: self._run_shared("cf", self._do_solve_cf, since, self.cf_state.wait_timeout),
+            since=since,
+        )
 
-    def _solve_cf(self):
+    def _do_solve_cf(self) -> bool:
         """Solve Cloudflare challenge via Byparr and store cookies."""
         logger.info("Solving Cloudflare challenge via Byparr...")
-        solution = self._byparr_request(self.base_url)
+        self.solve_stats["solves"] += 1
+        solution = self._byparr_request(self.base_url, cookies_only=self.cookies_only)
         if solution and solution.get("status") == 200:
             logger.info("CF challenge solved, cookies acquired")
             return True
         logger.error("Failed to solve CF challenge")
+        self.cf_valid = False
         return False
 
+    def _full_page_fallback(self, url, method="GET", post_data=None):
+        """Pagina intera dal solver, quando il solve è riuscito ma i cookie non bastano.
+
+        Passa dal circuit breaker del solver (in `_byparr_request`); le GET
+        concorrenti sullo stesso URL condividono un solo render.
+        """
+        if method != "GET":
+            self.solve_stats["full_page_fallbacks"] += 1
+            return self._byparr_request(url, method, post_data=post_data)
+
+        with self._fallbacks_lock:
+            flight = self._fallbacks.get(url)
+            leader = flight is None
+            if leader:
+                flight = self._fallbacks[url] = {"done": threading.Event(), "solution": None}
+        if not leader:
+            flight["done"].wait(self.cf_state.wait_timeout)
+            return flight["solution"]
+        try:
+            self.solve_stats["full_page_fallbacks"] += 1
+            flight["solution"] = self._byparr_request(url, "GET")
+            return flight["solution"]
+        finally:
+            with self._fallbacks_lock:
+                self._fallbacks.pop(url, None)
+            flight["done"].set()
+
     def _is_cf_blocked(self, response) -> bool:
         """Check if response is a Cloudflare block."""
-        if response.status_code == 403:
-            return True
-        if response.status_code == 503 and "cloudflare" in response.text.lower():
-            return True
-        return False
+        return is_cf_blocked(response)
 
     def get(self, url, **kwargs):
         """GET with automatic CF bypass retry."""
         kwargs.setdefault("timeout", 30)
         try:
-            r = self.http.get(url, **kwargs)
+            started = time.monotonic()
+            r = self._direct("GET", url, **kwargs)
             if self._is_cf_blocked(r):
-                logger.warning(f"CF blocked GET {url[:60]}, solving via Byparr...")
-                solution = self._byparr_request(url, "GET")
-                if solution:
-                    return _ByparrResponse(solution)
-                r = self.http.get(url, **kwargs)
+                logger.warning(f"CF blocked GET {url[:60]}, refreshing CF cookies...")
+                if self._solve_cf(since=started):
+                    r = self._direct("GET", url, **kwargs)
+                    if self._is_cf_blocked(r):
+                        logger.warning(f"Still CF blocked GET {url[:60]}, fetching via Byparr...")
+                        solution = self._full_page_fallback(r.url or url, "GET")
+                        if solution:
+                            return _ByparrResponse(solution)
             return r
         except Exception as e:
             logger.error(f"GET {url[:60]} failed: {e}")
@@ -129,11 +299,18 @@ class ByparrSession(BaseSession):
         """POST with automatic CF bypass retry."""
         kwargs.setdefault("timeout", 30)
         try:
-            r = self.http.post(url, data=data, **kwargs)
+            started = time.monotonic()
+            r = self._direct("POST", url, data=data, **kwargs)
             if self._is_cf_blocked(r):
                 logger.warning(f"CF blocked POST {url[:60]}, refreshing CF cookies...")
-                if self._solve_cf():
-                    r = self.http.post(url, data=data, **kwargs)
+                if self._solve_cf(since=started):
+                    r = self._direct("POST", url, data=data, **kwargs)
+                    if self._is_cf_blocked(r):
+                        logger.warning(f"Still CF blocked POST {url[:60]}, sending via Byparr...")
+                        post_data = urlencode(data) if isinstance(data, dict) else data
+                        solution = self._full_page_fallback(r.url or url, "POST", post_data)
+                        if solution:
+                            return _ByparrResponse(solution)
             return r
         except Exception as e:
             logger.error(f"POST {url[:60]} failed: {e}")
@@ -141,16 +318,39 @@ class ByparrSession(BaseSession):
 
     def ensure_logged_in(self) -> "ByparrSession":
         """Verifica la sessione, con solve CF se necessario."""
-        if self.session_valid and (time.time() - self.last_login) < 3600:
+        self.last_activity = time.monotonic()
+        if self._session_fresh():
             return self
 
         if not self.cf_valid:
-            self._solve_cf()
+            self._solve_cf(since=time.monotonic())
 
         return super().ensure_logged_in()
 
+    def refresh_due(self, lead: float) -> bool:
+        expiry = self.cookie_expiry(r"^cf_clearance$")
+        if expiry is not None and expiry - time.time() < lead:
+            return True
+        return super().refresh_due(lead)
+
+    def refresh_ahead(self, lead: float):
+        """Rinnova cf_clearance prima della scadenza, poi la sessione di login."""
+        expiry = self.cookie_expiry(r"^cf_clearance$")
+        if expiry is not None and expiry - time.time() < lead:
+            logger.info(f"cf_clearance expires in {int(expiry - time.time())}s, solving ahead of time")
+            self._solve_cf(since=time.monotonic())
+        super().refresh_ahead(lead)
+
+    def _sync_shared_state(self) -> bool:
+        changed = super()._sync_shared_state()
+        if changed and self.store.get(f"{self.store_key}:cf_at"):
+            self.cf_valid = True
+            self.cf_state.mark_valid()
+        return changed
+
     def _load_cookies(self):
         result = super()._load_cookies()
         if result:
             self.cf_valid = True
+            self.cf_state.mark_valid()
         return result
@@ -0,0 +1,147 @@
+"""Pacing adattivo anti-flood: token bucket con backoff esponenziale."""
+
+import time
+import random
+import logging
+import threading
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger("session.pacing")
+
+
+class RequestPacer:
+    """Token bucket adattivo per le richieste verso un singolo sito.
+
+    Senza un rate iniziale il pacer non limita nulla finché l'upstream non
+    segnala flood (429, 503, box phpBB): allora il limite parte dalla metà
+    del rate osservato. Il rate cresce lentamente finché l'upstream
+    risponde normalmente (additive increase) e viene dimezzato a ogni flood
+    (multiplicative decrease); senza tetto, superato il rate a cui era
+    scattato il flood, il limite viene tolto. Ogni flood consecutivo apre
+    anche una finestra di backoff esponenziale durante la quale nessuna
+    richiesta parte.
+    """
+
+    # Richieste recenti su cui stimare il rate osservato al primo flood
+    RATE_WINDOW = 50
+
+    def __init__(self, rate: float = 0.0, max_rate: float = 0.0, burst: int = 3,
+                 min_rate: float = 0.2, increase_step: float = 0.05,
+                 backoff_base: float = 2.0, max_backoff: float = 60.0):
+        # rate 0 = nessun limite; max_rate 0 = nessun tetto
+        if max_rate and (not rate or rate > max_rate):
+            rate = max_rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._backoff_until = 0.0
+        self._consecutive_floods = 0
+        self._flood_rate = 0.0
+        self._recent = deque(maxlen=self.RATE_WINDOW)
+        self._lock = threading.Lock()
+
+        # Statistiche esposte in health_info()
+        self.requests = 0
+        self.floods = 0
+        self.waited_seconds = 0.0
+        self.last_latency: Optional[float] = None
+
+    @property
+    def limited(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+        self._last_refill = now
+
+    def _observed_rate(self, now: float) -> float:
+        if len(self._recent) < 2 or now <= self._recent[0]:
+            return 0.0
+        return len(self._recent) / (now - self._recent[0])
+
+    def acquire(self):
+        """Blocca finché non è disponibile un token (e il backoff è scaduto)."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._backoff_until - now
+                if wait <= 0:
+                    if not self.limited:
+                        self._recent.append(now)
+                        self.requests += 1
+                        return
+                    self._refill(now)
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        self._recent.append(now)
+                        self.requests += 1
+                        return
+                    wait = (1.0 - self._tokens) / self.rate
+                self.waited_seconds += wait
+            time.sleep(wait)
+
+    def on_success(self, latency: Optional[float] = None):
+        """Risposta normale: aumenta gradualmente il rate (o toglie il limite)."""
+        with self._lock:
+            self._consecutive_floods = 0
+            if latency is not None:
+                self.last_latency = latency
+            if not self.limited:
+                return
+            self.rate += self.increase_step
+            if self.max_rate:
+                self.rate = min(self.max_rate, self.rate)
+            elif self._flood_rate and self.rate >= self._flood_rate:
+                self.rate = 0.0
+                logger.info(f"No flood at {self._flood_rate:.2f} req/s, pacing disabled again")
+
+    def on_flood(self, retry_after: Optional[float] = None) -> float:
+        """Flood rilevato: dimezza il rate e applica backoff esponenziale.
+
+        Ritorna il numero di secondi di backoff applicati.
+        """
+        with self._lock:
+            self.floods += 1
+            self._consecutive_floods += 1
+            now = time.monotonic()
+            if not self.limited:
+                self._flood_rate = max(self.min_rate * 2, self._observed_rate(now))
+                self.rate = self._flood_rate
+                self._last_refill = now
+            else:
+                self._flood_rate = min(self._flood_rate or self.rate, self.rate)
+            self.rate = max(self.min_rate, self.rate / 2)
+            delay = min(self.max_backoff,
+                        self.backoff_base ** self._consecutive_floods)
+            delay *= random.uniform(0.8, 1.2)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_backoff))
+            self._backoff_until = max(self._backoff_until, now + delay)
+            # Svuota il bucket: niente burst subito dopo il backoff
+            self._tokens = 0.0
+        logger.warning(f"Flood control detected, backing off {delay:.1f}s "
+                       f"(rate now {self.rate:.2f} req/s)")
+        return delay
+
+    def stats(self) -> dict:
+        """Snapshot dello stato corrente per health_info()."""
+        with self._lock:
+            backoff_left = max(0.0, self._backoff_until - time.monotonic())
+            return {
+                "rate_per_sec": round(self.rate, 3) if self.limited else None,
+                "max_rate": self.max_rate or None,
+                "backoff_remaining": round(backoff_left, 1),
+                "requests": self.requests,
+                "floods": self.floods,
+                "waited_seconds": round(self.waited_seconds, 1),
+                "last_latency": round(self.last_latency, 3) if self.last_latency is not None else None,
+            }
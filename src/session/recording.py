@@ -0,0 +1,349 @@
+"""Registrazione e replay del traffico upstream (forum e solver).
+
+In registrazione ogni scambio HTTP delle sessioni (URL, corpo della
+richiesta, status, header, corpo della risposta, tempo) finisce in un
+archivio JSON lines compresso (`.jsonl.gz`), insieme ai cookie con cui è
+partita ciascuna sessione. In replay le stesse sessioni ricevono le
+risposte dall'archivio invece che dalla rete, in ordine e con i tempi
+originali (o accelerati): una sessione catturata in produzione diventa
+così un benchmark riproducibile (`bench/loadgen.py --replay`) e una fonte
+di fixture (`python -m tools.upstream_archive`).
+
+Le password nei corpi delle richieste sono mascherate e gli header delle
+richieste non vengono salvati; i Set-Cookie delle risposte sì, perché
+servono al replay: l'archivio va trattato come il file dei cookie.
+"""
+
+import atexit
+import base64
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+from store.persist import register_flush, unregister_flush
+
+from .transport import build_response, get_traffic, set_traffic
+
+logger = logging.getLogger("session.recording")
+
+FORMAT_VERSION = 1
+
+# Campi sensibili nei corpi delle richieste (form di login, postData del solver)
+_SECRET_RE = re.compile(r"((?:password|passwd)=)[^&\"\s]*", re.IGNORECASE)
+
+# Parametri che cambiano a ogni sessione e non identificano la risorsa
+VOLATILE_PARAMS = {"sid", "creation_time", "form_token"}
+
+
+def redact(text: str) -> str:
+    return _SECRET_RE.sub(r"\1***", text)
+
+
+def _body_text(body) -> Optional[str]:
+    if body is None:
+        return None
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    return redact(body)
+
+
+def normalize_url(url: str) -> str:
+    """URL senza parametri volatili e con la query ordinata."""
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k not in VOLATILE_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def exchange_key(method: str, url: str, body: Optional[str]) -> Tuple[str, str, str]:
+    """Chiave di abbinamento richiesta/risposta in replay.
+
+    Per i comandi JSON del solver contano anche `cmd` e `url` (tutti vanno
+    a /v1); i form, con token diversi a ogni sessione, contano solo per URL.
+    """
+    extra = ""
+    if body and body.lstrip().startswith("{"):
+        try:
+            payload = json.loads(body)
+            extra = f"{payload.get('cmd', '')} {normalize_url(payload.get('url') or '')}"
+        except (ValueError, AttributeError):
+            pass
+    return method.upper(), normalize_url(url), extra
+
+
+# --- Registrazione ---
+
+class TrafficRecorder:
+    """Scrive scambi HTTP e stati iniziali delle sessioni in un archivio gzip."""
+
+    # Secondi fra due sync del file compresso (leggibile anche se il processo muore)
+    FLUSH_INTERVAL = 5.0
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(self.path, "ab")
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._seq = 0
+        self._dirty = False
+        self._last_flush = 0.0
+        self.exchanges = 0
+        self._write({"type": "meta", "version": FORMAT_VERSION, "pid": os.getpid(),
+                     "created": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+        register_flush(self)
+        logger.info(f"Recording upstream traffic to {self.path}")
+
+    def _write(self, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line.encode("utf-8"))
+            self._dirty = True
+
+    def wrap_adapter(self, adapter: BaseAdapter) -> BaseAdapter:
+        return RecordingAdapter(adapter, self)
+
+    def session_starting(self, session):
+        pass
+
+    def session_started(self, session):
+        """Annota cookie e stato di login con cui parte la sessione."""
+        now = time.time()
+        entry = {"type": "session", "key": session.store_key, "base_url": session.base_url,
+                 "solver_url": getattr(session, "flaresolverr_url", None),
+                 "state": session._cookie_snapshot()}
+        for what in ("login", "cf"):
+            done_at = session.store.get(f"{session.store_key}:{what}_at", 0)
+            if done_at:
+                entry[f"{what}_age"] = round(now - done_at, 3)
+        self._write(entry)
+
+    def record(self, request, response: Optional[requests.Response], elapsed: float,
+               error: Optional[BaseException] = None):
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        entry = {
+            "type": "exchange",
+            "seq": seq,
+            "t": round(time.monotonic() - self._started - elapsed, 4),
+            "method": request.method,
+            "url": request.url,
+            "request_body": _body_text(request.body),
+            "elapsed": round(elapsed, 4),
+        }
+        if error is not None:
+            entry["error"] = type(error).__name__
+        else:
+            entry["status"] = response.status_code
+            entry["reason"] = response.reason
+            # Header originali, con i Set-Cookie ripetuti (Response.headers li fonde)
+            msg = getattr(getattr(response.raw, "_original_response", None), "msg", None)
+            entry["headers"] = list((msg or response.headers).items())
+            content = response.content
+            try:
+                entry["body"] = content.decode("utf-8")
+            except UnicodeDecodeError:
+                entry["body_b64"] = base64.b64encode(content).decode("ascii")
+        self._write(entry)
+        self.exchanges += 1
+
+    def due(self, now: float) -> bool:
+        return self._dirty and now - self._last_flush >= self.FLUSH_INTERVAL
+
+    def flush(self):
+        with self._lock:
+            if self._file is None or not self._dirty:
+                return
+            self._file.flush(zlib.Z_SYNC_FLUSH)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        unregister_flush(self)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        logger.info(f"Recorded {self.exchanges} upstream exchanges to {self.path}")
+
+
+class RecordingAdapter(BaseAdapter):
+    """Inoltra all'adapter reale e registra ogni scambio."""
+
+    def __init__(self, inner: BaseAdapter, recorder: TrafficRecorder):
+        super().__init__()
+        self.inner = inner
+        self.recorder = recorder
+
+    def send(self, request, **kwargs):
+        started = time.monotonic()
+        try:
+            response = self.inner.send(request, **kwargs)
+            response.content  # il corpo fa parte del tempo e dell'archivio
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self.recorder.record(request, None, time.monotonic() - started, error=e)
+            raise
+        self.recorder.record(request, response, time.monotonic() - started)
+        return response
+
+    def close(self):
+        self.inner.close()
+
+
+# --- Replay ---
+
+def read_archive(path: Path) -> Iterator[dict]:
+    """Voci di un archivio; tollera la coda troncata di un processo interrotto."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        return
+        except (EOFError, zlib.error, OSError):
+            return
+
+
+class ReplayArchive:
+    """Risposte registrate indicizzate per chiave, consumate in ordine."""
+
+    def __init__(self, paths):
+        self.sessions: Dict[str, dict] = {}
+        self._queues: Dict[Tuple[str, str, str], List[dict]] = {}
+        self._lock = threading.Lock()
+        self.exchanges = 0
+        self.hits = 0
+        self.misses = 0
+        for path in ([paths] if isinstance(paths, (str, Path)) else paths):
+            for entry in read_archive(Path(path)):
+                if entry.get("type") == "session":
+                    self.sessions.setdefault(entry["key"], entry)
+                elif entry.get("type") == "exchange":
+                    key = exchange_key(entry["method"], entry["url"], entry.get("request_body"))
+                    self._queues.setdefault(key, []).append(entry)
+                    self.exchanges += 1
+
+    def take(self, method: str, url: str, body: Optional[str]) -> Optional[dict]:
+        """Prossima risposta per la richiesta; l'ultima si ripete a coda esaurita."""
+        key = exchange_key(method, url, body)
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return queue.pop(0) if len(queue) > 1 else queue[0]
+
+    def stats(self) -> dict:
+        return {"exchanges": self.exchanges, "hits": self.hits, "misses": self.misses}
+
+
+class TrafficReplay:
+    """Serve le sessioni dall'archivio: nessuna richiesta raggiunge la rete."""
+
+    def __init__(self, archive: ReplayArchive, speed: float = 1.0):
+        self.archive = archive
+        # 1 = tempi originali, 10 = dieci volte più veloce, 0 = senza attese
+        self.speed = speed
+
+    def wrap_adapter(self, adapter: BaseAdapter) -> BaseAdapter:
+        return ReplayAdapter(self)
+
+    def session_starting(self, session):
+        """Riporta nello store i cookie registrati, traslati nel tempo presente."""
+        entry = self.archive.sessions.get(session.store_key)
+        if not entry:
+            return
+        now = time.time()
+        state = dict(entry["state"])
+        shift = now - state.get("time", now)
+        state["cookies"] = {name: {**c, "expires": c["expires"] + shift if c.get("expires") else c.get("expires")}
+                            for name, c in state.get("cookies", {}).items()}
+        state["time"] = now
+        session.store.set(f"{session.store_key}:cookies", state)
+        for what in ("login", "cf"):
+            if f"{what}_age" in entry:
+                session.store.set(f"{session.store_key}:{what}_at", now - entry[f"{what}_age"])
+
+    def session_started(self, session):
+        pass
+
+    def close(self):
+        logger.info(f"Replay finished: {self.archive.stats()}")
+
+
+class ReplayAdapter(BaseAdapter):
+    """Adapter requests che risponde con gli scambi dell'archivio."""
+
+    def __init__(self, replay: TrafficReplay):
+        super().__init__()
+        self.replay = replay
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        entry = self.replay.archive.take(request.method, request.url, _body_text(request.body))
+        if entry is None:
+            logger.warning(f"Replay miss: {request.method} {request.url[:100]}")
+            return build_response(request, 404, "Not Recorded", [("X-Replay-Miss", "1")], b"", self)
+
+        if self.replay.speed > 0:
+            time.sleep(entry.get("elapsed", 0) / self.replay.speed)
+        error = entry.get("error")
+        if error:
+            exc = requests.Timeout if "Timeout" in error else requests.ConnectionError
+            raise exc(f"replayed {error}", request=request)
+        if "body_b64" in entry:
+            content = base64.b64decode(entry["body_b64"])
+        else:
+            content = (entry.get("body") or "").encode("utf-8")
+        return build_response(request, entry["status"], entry.get("reason") or "",
+                              entry.get("headers", []), content, self)
+
+    def close(self):
+        pass
+
+
+# --- Attivazione ---
+
+def enable_recording(path: Path) -> TrafficRecorder:
+    """Registra il traffico di tutte le sessioni create da qui in poi."""
+    recorder = TrafficRecorder(path)
+    atexit.register(recorder.close)
+    set_traffic(recorder)
+    return recorder
+
+
+def enable_replay(paths, speed: float = 1.0) -> TrafficReplay:
+    """Serve le sessioni create da qui in poi dagli archivi in `paths`."""
+    archive = ReplayArchive(paths)
+    logger.info(f"Replaying {archive.exchanges} upstream exchanges "
+                f"({len(archive.sessions)} sessions) at speed {speed:g}")
+    replay = TrafficReplay(archive, speed)
+    atexit.register(replay.close)
+    set_traffic(replay)
+    return replay
+
+
+def disable_traffic():
+    """Chiude registrazione o replay attivi (le sessioni già create restano agganciate)."""
+    traffic = get_traffic()
+    if traffic is not None:
+        traffic.close()
+    set_traffic(None)
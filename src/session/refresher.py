@@ -0,0 +1,60 @@
+"""Refresh proattivo in background di clearance CF e sessione di login."""
+
+import time
+import random
+import logging
+import threading
+
+logger = logging.getLogger("session.refresher")
+
+
+class SessionRefresher:
+    """Thread daemon che rinnova cookie CF e sessione prima della scadenza.
+
+    Ogni `interval` secondi chiede alla sessione di rinnovare ciò che scade
+    entro `lead` secondi (più un jitter casuale, così più siti o repliche non
+    si sincronizzano). Il refresh parte solo quando la sessione è inattiva da
+    almeno `idle_grace` secondi, a meno che la scadenza non sia imminente.
+    """
+
+    def __init__(self, session, interval: float = 60.0, lead: float = 600.0,
+                 jitter: float = 120.0, idle_grace: float = 5.0):
+        self.session = session
+        self.interval = interval
+        self.lead = lead
+        self.jitter = jitter
+        self.idle_grace = idle_grace
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-refresher", daemon=True)
+        self._thread.start()
+        logger.info(f"Background session refresh started for {self.session.base_url}")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval * random.uniform(0.8, 1.2)):
+            try:
+                lead = self.lead + random.uniform(0, self.jitter)
+                if not self.session.refresh_due(lead):
+                    continue
+                self._wait_idle(min(lead / 2, 60.0))
+                if not self._stop.is_set():
+                    self.session.refresh_ahead(lead)
+            except Exception as e:
+                logger.warning(f"Background refresh failed: {e}")
+
+    def _wait_idle(self, max_wait: float):
+        """Attende una pausa nel traffico utente, al massimo `max_wait` secondi."""
+        deadline = time.monotonic() + max_wait
+        while time.monotonic() < deadline and not self._stop.is_set():
+            idle_for = time.monotonic() - self.session.last_activity
+            if idle_for >= self.idle_grace:
+                return
+            self._stop.wait(self.idle_grace - idle_for)
@@ -0,0 +1,175 @@
+"""Pool di endpoint Byparr/FlareSolverr con routing pesato sulla salute e hedging."""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, List, Optional, Sequence, Union
+
+logger = logging.getLogger("session.solver_pool")
+
+
+def parse_solver_urls(urls: Union[str, Sequence[str]]) -> List[str]:
+    """Lista di endpoint da stringa separata da virgole o sequenza."""
+    if isinstance(urls, str):
+        urls = urls.split(",")
+    return [u.strip().rstrip("/") for u in urls if u and u.strip()]
+
+
+class SolverEndpoint:
+    """Statistiche di un singolo solver: latenza ed errori come medie mobili."""
+
+    ALPHA = 0.3
+    COOLDOWN_BASE = 5.0
+    COOLDOWN_MAX = 300.0
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency = None          # EWMA secondi, None = mai usato
+        self.error_rate = 0.0        # EWMA 0..1
+        self.inflight = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        # Stato della sessione browser persistente su questo solver
+        self.session_id = None
+        self.sessions_supported = True
+
+    def score(self, default_latency: float) -> float:
+        """Costo stimato di una nuova richiesta (più basso = migliore)."""
+        latency = self.latency if self.latency is not None else default_latency
+        return latency * (1 + self.inflight) * (1 + 4 * self.error_rate)
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "latency": round(self.latency, 2) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "cooldown": max(0, round(self.cooldown_until - time.monotonic(), 1)),
+        }
+
+
+class SolverPool:
+    """Sceglie l'endpoint più sano e, oltre `hedge_after`, ne interroga un secondo.
+
+    Un endpoint che fallisce entra in cooldown esponenziale e viene
+    provato solo dopo gli altri; il primo risultato valido vince, le
+    richieste perdenti completano in background aggiornando le statistiche.
+    """
+
+    def __init__(self, urls: Union[str, Sequence[str]], hedge_after: float = 15.0):
+        urls = parse_solver_urls(urls)
+        if not urls:
+            raise ValueError("At least one solver endpoint is required")
+        self.endpoints = [SolverEndpoint(u) for u in urls]
+        self.hedge_after = hedge_after
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(2, 2 * len(urls)),
+                                            thread_name_prefix="solver")
+        self.hedges = 0
+
+    def ranked(self) -> List[SolverEndpoint]:
+        """Endpoint in ordine di preferenza (quelli in cooldown per ultimi)."""
+        now = time.monotonic()
+        with self._lock:
+            known = [e.latency for e in self.endpoints if e.latency is not None]
+            default = min(known) if known else 1.0
+            return sorted(self.endpoints,
+                          key=lambda e: (e.cooldown_until > now, e.score(default)))
+
+    def begin(self, endpoint: SolverEndpoint):
+        with self._lock:
+            endpoint.inflight += 1
+            endpoint.requests += 1
+
+    def record(self, endpoint: SolverEndpoint, ok: bool, latency: float):
+        """Aggiorna le statistiche di `endpoint` al termine di una richiesta."""
+        with self._lock:
+            endpoint.inflight = max(0, endpoint.inflight - 1)
+            a = SolverEndpoint.ALPHA
+            endpoint.error_rate = (1 - a) * endpoint.error_rate + a * (0.0 if ok else 1.0)
+            if ok:
+                endpoint.latency = latency if endpoint.latency is None else (
+                    (1 - a) * endpoint.latency + a * latency)
+                endpoint.consecutive_failures = 0
+                endpoint.cooldown_until = 0.0
+            else:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                cooldown = min(SolverEndpoint.COOLDOWN_MAX,
+                               SolverEndpoint.COOLDOWN_BASE * 2 ** (endpoint.consecutive_failures - 1))
+                endpoint.cooldown_until = time.monotonic() + cooldown
+
+    def _timed(self, fn, endpoint, is_ok):
+        self.begin(endpoint)
+        started = time.monotonic()
+        ok = False
+        try:
+            result = fn(endpoint)
+            ok = is_ok(result)
+            return result
+        finally:
+            self.record(endpoint, ok, time.monotonic() - started)
+
+    def call(self, fn: Callable[[SolverEndpoint], object],
+             is_ok: Callable[[object], bool] = bool) -> Optional[object]:
+        """Esegue `fn(endpoint)` sull'endpoint migliore, con failover e hedging.
+
+        Ritorna il primo risultato per cui `is_ok` è vero; se tutti
+        falliscono, l'ultimo risultato non valido (o None).
+        """
+        candidates = self.ranked()
+        if len(candidates) == 1:
+            try:
+                return self._timed(fn, candidates[0], is_ok)
+            except Exception as e:
+                logger.error(f"Solver {candidates[0].url} failed: {e}")
+                return None
+
+        pending = {}
+        last = None
+
+        def launch():
+            endpoint = candidates.pop(0)
+            pending[self._executor.submit(self._timed, fn, endpoint, is_ok)] = endpoint
+
+        launch()
+        while pending:
+            timeout = self.hedge_after if candidates else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Il solver scelto è lento: interroga anche il successivo
+                with self._lock:
+                    self.hedges += 1
+                logger.info(f"Solver slow after {self.hedge_after}s, hedging to {candidates[0].url}")
+                launch()
+                continue
+            for future in done:
+                endpoint = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Solver {endpoint.url} failed: {e}")
+                    result = None
+                if is_ok(result):
+                    return result
+                last = result if result is not None else last
+                if candidates:
+                    logger.warning(f"Solver {endpoint.url} failed, trying {candidates[0].url}")
+                    launch()
+        return last
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hedge_after": self.hedge_after,
+                "hedges": self.hedges,
+                "endpoints": [e.stats() for e in self.endpoints],
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,79 @@
+"""Macchina a stati sincronizzata per refresh single-flight (solve CF, login)."""
+
+import time
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger("session.state")
+
+
+class RefreshState:
+    """Stato condiviso fra i thread: valid → refreshing → valid/failed.
+
+    Un solo thread alla volta esegue il refresh; gli altri attendono il suo
+    esito con un timeout limitato invece di lanciarne uno proprio.
+    """
+
+    VALID = "valid"
+    REFRESHING = "refreshing"
+    FAILED = "failed"
+
+    def __init__(self, name: str, wait_timeout: float = 120.0):
+        self.name = name
+        self.wait_timeout = wait_timeout
+        self.state = self.FAILED
+        self.last_success = 0.0  # time.monotonic() dell'ultimo refresh riuscito
+        self.waiting = 0  # thread in attesa dell'esito del refresh in corso
+        self._cond = threading.Condition()
+
+    def run(self, refresh: Callable[[], bool], since: Optional[float] = None) -> bool:
+        """Esegue `refresh` in modalità single-flight.
+
+        `since` è l'istante (monotonic) in cui il chiamante ha rilevato il
+        problema: se nel frattempo un altro thread ha già completato un
+        refresh, si riusa quel risultato senza ripeterlo.
+        """
+        with self._cond:
+            if since is not None and self.state == self.VALID and self.last_success >= since:
+                return True
+
+            if self.state == self.REFRESHING:
+                deadline = time.monotonic() + self.wait_timeout
+                self.waiting += 1
+                try:
+                    while self.state == self.REFRESHING:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            logger.warning(f"Timed out waiting for {self.name} refresh")
+                            return False
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                return self.state == self.VALID
+
+            self.state = self.REFRESHING
+
+        ok = False
+        try:
+            ok = bool(refresh())
+        finally:
+            with self._cond:
+                self.state = self.VALID if ok else self.FAILED
+                if ok:
+                    self.last_success = time.monotonic()
+                self._cond.notify_all()
+        return ok
+
+    def mark_valid(self):
+        """Segna lo stato come valido senza eseguire un refresh (es. cookie caricati)."""
+        with self._cond:
+            if self.state != self.REFRESHING:
+                self.state = self.VALID
+                self.last_success = time.monotonic()
+
+    def invalidate(self):
+        """Segna lo stato come non valido: il prossimo run() eseguirà il refresh."""
+        with self._cond:
+            if self.state != self.REFRESHING:
+                self.state = self.FAILED
@@ -0,0 +1,206 @@
+"""Trasporto HTTP condiviso: pool di connessioni, cookie thread-safe, HTTP/2 opzionale."""
+
+import logging
+import os
+import ssl
+import threading
+from http.client import HTTPMessage
+from types import SimpleNamespace
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.cookies import RequestsCookieJar, extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, select_proxy
+
+try:
+    import httpx
+except ImportError:  # HTTP/2 è opzionale
+    httpx = None
+
+logger = logging.getLogger("session.transport")
+
+
+class LockedCookieJar(RequestsCookieJar):
+    """Cookie jar condivisibile fra thread.
+
+    CookieJar protegge già le scritture con `_cookies_lock`; qui si rendono
+    atomiche anche le letture (iterazione, lookup per nome) rispetto agli
+    aggiornamenti concorrenti che arrivano da Byparr e dalle risposte.
+    """
+
+    def __iter__(self):
+        with self._cookies_lock:
+            cookies = list(super().__iter__())
+        return iter(cookies)
+
+    def set(self, name, value, **kwargs):
+        with self._cookies_lock:
+            return super().set(name, value, **kwargs)
+
+    def get(self, name, default=None, domain=None, path=None):
+        with self._cookies_lock:
+            return super().get(name, default, domain, path)
+
+    def copy(self):
+        new_jar = LockedCookieJar()
+        new_jar.set_policy(self.get_policy())
+        for cookie in self:
+            new_jar.set_cookie(cookie)
+        return new_jar
+
+
+def build_response(request, status: int, reason: str, header_items, content: bytes,
+                   connection=None) -> requests.Response:
+    """Costruisce una requests.Response completa (cookie inclusi) da dati già letti."""
+    header_items = list(header_items)
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason
+    response.headers = CaseInsensitiveDict(header_items)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = request.url
+    response.request = request
+    response.connection = connection
+    response._content = content
+    response._content_consumed = True
+
+    # requests estrae i Set-Cookie da raw._original_response.msg
+    msg = HTTPMessage()
+    for key, value in header_items:
+        msg.add_header(key, value)
+    response.raw = SimpleNamespace(_original_response=SimpleNamespace(msg=msg))
+    extract_cookies_to_jar(response.cookies, request, response.raw)
+    return response
+
+
+class Http2Adapter(BaseAdapter):
+    """Adapter requests che inoltra le richieste a un client httpx HTTP/2.
+
+    Tutte le richieste verso lo stesso host condividono una connessione
+    multiplexata; la gestione di cookie e redirect resta a requests.Session.
+    In httpx TLS e proxy sono impostazioni del client, quindi si tiene un
+    client per ogni combinazione di verify/cert/proxy richiesta dalla sessione.
+    """
+
+    # Applicato quando il chiamante non passa un timeout: requests lo
+    # interpreterebbe come "nessun timeout", qui resterebbe appeso per sempre
+    DEFAULT_TIMEOUT = 30.0
+
+    def __init__(self, pool_size: int = 20):
+        super().__init__()
+        self.pool_size = pool_size
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _client(self, verify, cert, proxy) -> "httpx.Client":
+        if isinstance(cert, list):
+            cert = tuple(cert)
+        key = (verify, cert, proxy)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = httpx.Client(
+                    http2=True,
+                    follow_redirects=False,
+                    verify=_ssl_context(verify, cert),
+                    proxy=proxy,
+                    trust_env=False,
+                    limits=httpx.Limits(max_connections=self.pool_size,
+                                        max_keepalive_connections=self.pool_size),
+                )
+                self._clients[key] = client
+            return client
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if timeout is None:
+            timeout = httpx.Timeout(self.DEFAULT_TIMEOUT)
+        elif isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        elif not isinstance(timeout, httpx.Timeout):
+            timeout = httpx.Timeout(timeout)
+        try:
+            client = self._client(verify, cert, select_proxy(request.url, proxies or {}))
+            resp = client.request(
+                request.method, request.url,
+                headers=dict(request.headers),
+                content=request.body,
+                timeout=timeout,
+            )
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(e, request=request)
+        except httpx.ProxyError as e:
+            raise requests.exceptions.ProxyError(e, request=request)
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+        except OSError as e:
+            # CA bundle o certificato client illeggibili
+            raise requests.exceptions.SSLError(e, request=request)
+
+        return build_response(request, resp.status_code, resp.reason_phrase,
+                              resp.headers.multi_items(), resp.content, self)
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
+
+
+def _ssl_context(verify, cert) -> ssl.SSLContext:
+    """Contesto TLS equivalente ai parametri `verify`/`cert` di requests."""
+    if verify is False:
+        ctx = ssl.create_default_context()
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+    elif isinstance(verify, str):
+        if os.path.isdir(verify):
+            ctx = ssl.create_default_context(capath=verify)
+        else:
+            ctx = ssl.create_default_context(cafile=verify)
+    else:
+        ctx = ssl.create_default_context(cafile=requests.certs.where())
+    if cert:
+        if isinstance(cert, tuple):
+            ctx.load_cert_chain(cert[0], cert[1])
+        else:
+            ctx.load_cert_chain(cert)
+    return ctx
+
+
+# Registrazione o replay del traffico upstream (vedi session/recording.py)
+_traffic = None
+
+
+def set_traffic(traffic):
+    """Imposta la modalità di registrazione/replay applicata alle nuove sessioni HTTP."""
+    global _traffic
+    _traffic = traffic
+
+
+def get_traffic():
+    return _traffic
+
+
+def build_http_session(pool_size: int = 20, http2: bool = False) -> requests.Session:
+    """Crea una requests.Session con pool dimensionato e cookie jar thread-safe."""
+    http = requests.Session()
+    http.cookies = LockedCookieJar()
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    http.mount("http://", adapter)
+    http.mount("https://", adapter)
+
+    if http2:
+        try:
+            if httpx is None:
+                raise ImportError("httpx")
+            http.mount("https://", Http2Adapter(pool_size))
+            logger.info("HTTP/2 enabled for upstream requests")
+        except ImportError:
+            logger.warning("HTTP/2 requested but httpx[http2] is not installed, using HTTP/1.1")
+
+    if _traffic is not None:
+        for prefix, inner in list(http.adapters.items()):
+            http.mount(prefix, _traffic.wrap_adapter(inner))
+    return http
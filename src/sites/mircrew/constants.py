@@ -1,5 +1,7 @@
 """Costanti specifiche per MIRCrew: mapping categorie e forum ID."""
 
+import re
+
 # Forum ID → Torznab Category ID
 CATEGORY_MAP = {
     25: 2000, 26: 2000,  # Movies
@@ -31,3 +33,15 @@ CAPABILITIES_XML = '''<?xml version="1.0" encoding="UTF-8"?>
 <category id="7000" name="Books"/>
 </categories>
 </caps>'''
+
+
+# Messaggi anti-flood phpBB (inglese e italiano), mostrati nel box "message"
+FLOOD_MESSAGE_RE = re.compile(
+    r"cannot use search at this time"
+    r"|cannot (?:perform|make) another \w+ so soon"
+    r"|please wait \d+ seconds?"
+    r"|non puoi (?:usare|utilizzare) la ricerca"
+    r"|non puoi (?:effettuare|fare|inviare) un.altr[ao] \w+ così presto"
+    r"|attendi \d+ second[io]",
+    re.IGNORECASE,
+)
@@ -0,0 +1,99 @@
+"""Estrazione dalle pagine HTML del forum in record compatti.
+
+Funzioni pure (HTML in ingresso, dict/list serializzabili in uscita), così
+possono girare sia inline sia in un processo del ParsePool senza dover
+trasferire oggetti BeautifulSoup fra processi.
+"""
+
+import re
+from typing import Any, Dict
+
+from bs4 import BeautifulSoup
+
+from . import parser
+
+_PROBE_SELECTORS = ["a.topictitle", "ol.search-results li", "div.search.post"]
+
+
+def parse_search_page(html: str, selectors: Dict[str, str], debug: bool = False) -> Dict[str, Any]:
+    """Righe della pagina risultati: titolo, link topic, link forum, data."""
+    soup = BeautifulSoup(html, "lxml")
+    rows = []
+    for row in soup.select(selectors["search_result_row"]):
+        link = row.select_one(selectors["topic_title_link"])
+        if not link:
+            continue
+        cat_link = row.select_one(selectors["forum_link"])
+        time_el = row.select_one(selectors["pub_date"])
+        rows.append({
+            "title": link.get_text(strip=True),
+            "href": link.get("href", ""),
+            "forum_href": cat_link.get("href", "") if cat_link else "",
+            "datetime": time_el.get("datetime") if time_el else None,
+        })
+
+    page = {"rows": rows}
+    if debug:
+        # Info diagnostiche per capire mismatch dei selettori
+        body = soup.find("body")
+        page["preview"] = body.get_text(separator=" ", strip=True)[:500] if body else ""
+        page["probes"] = {probe: len(soup.select(probe)) for probe in _PROBE_SELECTORS}
+    return page
+
+
+def parse_thread_page(html: str, selectors: Dict[str, str]) -> Dict[str, Any]:
+    """Magnets del primo post e link Thanks del thread."""
+    soup = BeautifulSoup(html, "lxml")
+    page = {
+        "magnets": parser.extract_magnets_from_soup(soup, html, selectors.get("post_content")),
+        "first_post_id": None,
+        "thanks_link": None,
+    }
+
+    first_post = soup.select_one(selectors["first_post"])
+    quote_link = first_post.select_one(selectors["quote_link"]) if first_post else None
+    first_post_id = parser.get_post_id(quote_link.get("href", "")) if quote_link else None
+    if not first_post_id:
+        return page
+    page["first_post_id"] = first_post_id
+
+    for a in soup.find_all("a", href=lambda x: x and "thanks=" in str(x)):
+        href = a.get("href", "")
+        if f"p={first_post_id}" in href or f"thanks={first_post_id}" in href:
+            page["thanks_link"] = href
+            break
+    return page
+
+
+REPLY_PREFIX_RE = re.compile(r"^\s*Re:", re.IGNORECASE)
+
+
+def parse_thanks_given_page(html: str) -> Dict[str, Any]:
+    """Topic ringraziati in una pagina della lista "thanks given" e link alla successiva.
+
+    Ogni riga è un post ringraziato: contano solo i primi post dei topic
+    (quelli con i magnet). Le risposte ("Re: ...") sono escluse, perché il
+    thanks a una risposta non sblocca il primo post.
+    """
+    soup = BeautifulSoup(html, "lxml")
+    topic_ids = []
+    seen = set()
+    replies = 0
+    for row in soup.select("ul.topiclist li"):
+        links = row.find_all("a", href=lambda x: x and "viewtopic.php" in str(x))
+        if not links:
+            continue
+        if REPLY_PREFIX_RE.match(links[0].get_text()):
+            replies += 1
+            continue
+        topic_id = next((t for t in (parser.get_topic_id(a.get("href", "")) for a in links) if t), None)
+        if topic_id and topic_id not in seen:
+            seen.add(topic_id)
+            topic_ids.append(topic_id)
+
+    next_link = soup.select_one("li.arrow.next a, a[rel=next]")
+    return {
+        "topic_ids": topic_ids,
+        "replies": replies,
+        "next": next_link.get("href") if next_link else None,
+    }
@@ -4,22 +4,31 @@ import json
 import re
 import time
 import logging
+import threading
+from dataclasses import asdict
 from datetime import datetime
 from typing import Optional, List, Dict, Any
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 
 from bs4 import BeautifulSoup
 
 from config import Config
 from session import ByparrSession
-from torznab.server import BaseSite
+from store.persist import AppendJournal
+from torznab.metrics import timed
+from torznab import tracing
+from torznab.tracing import span
+from torznab.perf import perf
+from torznab.parsepool import get_parse_pool
+from torznab.server import BaseSite, SiteUnavailableError
 from torznab.models import TorznabResult
 
 from .constants import CATEGORY_MAP as DEFAULT_CATEGORY_MAP
 from .constants import FORUM_IDS as DEFAULT_FORUM_IDS
 from .constants import TV_FORUM_IDS as DEFAULT_TV_FORUM_IDS
 from .constants import CAPABILITIES_XML as DEFAULT_CAPABILITIES_XML
-from . import parser
+from .constants import FLOOD_MESSAGE_RE
+from . import parser, extract
 
 logger = logging.getLogger("mircrew")
 
@@ -35,6 +44,10 @@ DEFAULT_SELECTORS = {
     "magnet_link": "a[href^='magnet:']",
 }
 
+# Lista dei thanks dati dall'utente (estensione phpBB "Thanks for posts"),
+# {user_id} viene sostituito con l'id dell'account loggato
+DEFAULT_THANKS_HISTORY_URL = "/app.php/thankslist/givens/{user_id}/true"
+
 # Default search params – minimal set matching the manual forum search
 # (only sf + sr; extra params like sc/sk/sd/st/ch/t/submit caused phpBB
 #  to return 0 results even though the manual search found matches)
@@ -47,9 +60,35 @@ DEFAULT_SEARCH_PARAMS = {
 class MircrewSession(ByparrSession):
     """Sessione MIRCrew con login phpBB specifico."""
 
+    # Cookie di sessione phpBB: <prefisso>_u, <prefisso>_k, <prefisso>_sid
+    session_cookie_pattern = re.compile(r"_(?:u|k|sid)$")
+
+    # Ogni pagina phpBB contiene il link di logout quando siamo loggati
+    passive_validation = True
+
+    def get(self, url, **kwargs):
+        """GET con pacing anti-flood e validazione passiva della sessione."""
+        return self._send(super().get, url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        """POST con pacing anti-flood e validazione passiva della sessione."""
+        return self._send(super().post, url, data=data, **kwargs)
+
+    def _is_flood_response(self, response) -> bool:
+        if response.status_code == 429:
+            return True
+        text = getattr(response, "text", "") or ""
+        if response.status_code == 503 and "cloudflare" not in text.lower():
+            return True
+        # phpBB risponde 200 con il box "message" quando scatta il flood control
+        return 'id="message"' in text and bool(FLOOD_MESSAGE_RE.search(text))
+
     def _check_logged_in(self, html: str) -> bool:
         return "mode=logout" in html
 
+    def _check_logged_out(self, html: str) -> bool:
+        return "mode=login" in html and "mode=logout" not in html
+
     def _do_login(self) -> bool:
         logger.info("=== LOGIN START ===")
         try:
@@ -82,7 +121,6 @@ class MircrewSession(ByparrSession):
                 "sid": sid, "login": "Login",
             }
 
-            time.sleep(0.5)
             r = self.post(
                 f"{self.base_url}/ucp.php?mode=login&sid={sid}",
                 data=login_data,
@@ -107,12 +145,30 @@ class MircrewSession(ByparrSession):
 class MircrewSite(BaseSite):
     """Implementazione MIRCrew del sito Torznab."""
 
+    THANKS_IMPORT_START_DELAY = 60
+
     def __init__(self, session: MircrewSession, config: Config):
         self.session = session
         self.config = config
-        self.thanks_cache: set = set()
+        # Stato condiviso con la sessione (thanks, cache) e relativo namespace
+        self.store = session.store
+        self.parse_pool = get_parse_pool()
+        self.store_ns = f"mircrew:{urlparse(config.base_url).netloc}"
+        self.search_cache_ttl = config.search_cache_ttl
+        self.stale_cache_ttl = config.stale_cache_ttl
+        self.thread_cache_ttl = config.thread_cache_ttl
+        # Topic id interi: array ordinato in processo, insieme dello store se condiviso
+        self.thanks_cache = self.store.id_set(f"{self.store_ns}:thanks")
         self.thanks_cache_file = config.data_dir / "thanks_cache.json"
+        # Nuovi thanks in coda al journal, compattato periodicamente in thanks_cache.json
+        self.thanks_journal = AppendJournal(config.data_dir / "thanks_cache.journal",
+                                            self.thanks_cache_file,
+                                            snapshot=lambda: sorted(int(t) for t in self.thanks_cache))
         self._load_thanks_cache()
+        self.thanks_import_interval = config.thanks_import_interval
+        self.thanks_import_stats: Dict[str, Any] = {}
+        self._thanks_import_thread = None
+        self._closed = threading.Event()
 
         # Load customizable config with fallbacks to defaults
         custom = config.custom or {}
@@ -122,6 +178,7 @@ class MircrewSite(BaseSite):
         self.selectors = {**DEFAULT_SELECTORS, **custom.get("selectors", {})}
         self.search_params = {**DEFAULT_SEARCH_PARAMS, **custom.get("search_params", {})}
         self.capabilities_xml = custom.get("capabilities_xml", DEFAULT_CAPABILITIES_XML)
+        self.thanks_history_url = custom.get("thanks_history_url", DEFAULT_THANKS_HISTORY_URL)
 
     def _load_category_map(self, custom: dict) -> Dict[int, int]:
         """Load category map from custom config or defaults."""
@@ -139,10 +196,64 @@ class MircrewSite(BaseSite):
             "status": "ok",
             "logged_in": self.session.session_valid,
             "cf_valid": self.session.cf_valid,
+            "login_state": self.session.login_state.state,
+            "cf_state": self.session.cf_state.state,
             "cf_bypass_url": self.session.flaresolverr_url,
             "thanks_cached": len(self.thanks_cache),
+            "thanks_import": dict(self.thanks_import_stats),
+            "pacing": self.session.pacer.stats(),
+            "solvers": self.session.solver_pool.stats(),
+            "cf_solves": dict(self.session.solve_stats),
+            "breakers": {
+                "upstream": self.session.upstream_breaker.stats(),
+                "solver": self.session.solver_breaker.stats(),
+            },
+            "state": self.store.info(),
+            "parsing": self.parse_pool.stats(),
+        }
+
+    def perf_info(self) -> dict:
+        """Coda del solver CF: solve in corso, thread in attesa, richieste per endpoint."""
+        cf_state = self.session.cf_state
+        endpoints = self.session.solver_pool.stats()["endpoints"]
+        return {
+            "solver": {
+                "solving": cf_state.state == cf_state.REFRESHING,
+                "waiting": cf_state.waiting,
+                "inflight": sum(e["inflight"] for e in endpoints),
+                "endpoints": endpoints,
+                "breaker": self.session.solver_breaker.state,
+            },
+        }
+
+    def warm_up(self) -> dict:
+        """Cookie salvati, clearance CF e login pronti prima della prima ricerca."""
+        session = self.session
+        session.ensure_logged_in()
+        if not session.session_valid:
+            raise RuntimeError(f"not logged in (login {session.login_state.state}, CF {session.cf_state.state})")
+        return {"logged_in": True, "cf_valid": session.cf_valid}
+
+    def memory_info(self) -> dict:
+        """Chiavi in cache per tipo (search, search-stale, magnets, ...) e thanks in memoria."""
+        kinds: Dict[str, int] = {}
+        try:
+            for key in self.store.keys(f"{self.store_ns}:"):
+                kind = key[len(self.store_ns) + 1:].split(":", 1)[0]
+                kinds[kind] = kinds.get(kind, 0) + 1
+        except NotImplementedError:
+            kinds = None
+        return {
+            "cache_keys": kinds,
+            "thanks_ids": len(self.thanks_cache),
+            "state": self.store.info(),
         }
 
+    def close(self):
+        self._closed.set()
+        self.thanks_journal.close()
+        self.session.close()
+
     def parse_season_from_query(self, query: str) -> Optional[int]:
         return parser.extract_season_from_query(query)
 
@@ -156,6 +267,17 @@ class MircrewSite(BaseSite):
     def search(self, query: str, categories: Optional[List[int]],
                target_season: Optional[int], target_episode: Optional[int]) -> List[TorznabResult]:
         """Ricerca con normalizzazione, retry terms=any, fallback progressivo e ranking."""
+        cache_key = self._search_cache_key(query, categories, target_season, target_episode)
+        cached = self.store.get(cache_key)
+        perf.cache_lookup("search", cached is not None)
+        tracing.annotate(cache="hit" if cached is not None else "miss")
+        if cached is not None:
+            logger.info(f"Search cache hit: '{query}' ({len(cached)} results)")
+            return [TorznabResult(**r) for r in cached]
+
+        if self.session.upstream_breaker.is_open():
+            return self._search_unavailable(cache_key, query)
+
         scraper = self.session.ensure_logged_in()
 
         normalized = parser.normalize_search_query(query)
@@ -169,40 +291,77 @@ class MircrewSite(BaseSite):
             forum_ids = [fid for fid, tcat in self.category_map.items() if tcat in categories]
 
         # Stage 1: terms=all (tutte le parole devono matchare)
-        results = self._do_search(scraper, keywords, forum_ids, target_season, target_episode, terms="all")
+        tracing.annotate(search_stage="terms_all")
+        with timed("search_terms_all"):
+            results = self._do_search(scraper, keywords, forum_ids, target_season, target_episode, terms="all")
 
         # Stage 2: terms=any (almeno una parola deve matchare)
         if not results and len(keywords.split()) > 1:
             logger.info(f"Retry search with terms=any for: '{keywords}'")
-            results = self._do_search(scraper, keywords, forum_ids, target_season, target_episode, terms="any")
+            tracing.annotate(search_stage="terms_any")
+            with timed("search_terms_any"):
+                results = self._do_search(scraper, keywords, forum_ids, target_season, target_episode,
+                                          terms="any")
 
         # Stage 3: fallback progressivo con sottoinsiemi di keywords (limitato)
         if not results and len(keywords.split()) > 1:
-            words = keywords.split()
-            attempts = 0
+            tracing.annotate(search_stage="progressive")
+            results = self._progressive_fallback(scraper, keywords, forum_ids, target_season, target_episode)
+
+        # Ordina per rilevanza rispetto alla query originale
+        if results:
+            with timed("ranking"):
+                results.sort(
+                    key=lambda r: parser.compute_relevance_score(r.title, keywords, query),
+                    reverse=True,
+                )
+            if self.search_cache_ttl:
+                data = [asdict(r) for r in results]
+                self.store.set(cache_key, data, ttl=self.search_cache_ttl)
+                self.store.set(self._stale_key(cache_key), data, ttl=self.stale_cache_ttl)
+        elif self.session.upstream_breaker.is_open():
+            # Il circuito si è aperto durante questa ricerca
+            return self._search_unavailable(cache_key, query)
+
+        return results
+
+    def _progressive_fallback(self, scraper, keywords: str, forum_ids: Optional[List[int]],
+                              target_season: Optional[int], target_episode: Optional[int]) -> List[TorznabResult]:
+        """Riprova con sottoinsiemi sempre più corti delle keywords (limitato)."""
+        results = []
+        words = keywords.split()
+        attempts = 0
+        with timed("search_progressive_fallback"):
             for length in range(len(words) - 1, 0, -1):
                 for start in range(len(words) - length + 1):
                     if attempts >= self.MAX_FALLBACK_ATTEMPTS:
                         break
                     subset = ' '.join(words[start:start + length])
                     logger.info(f"Progressive fallback ({attempts + 1}/{self.MAX_FALLBACK_ATTEMPTS}): trying '{subset}'")
-                    time.sleep(1)  # anti-flood protection per phpBB
                     results = self._do_search(scraper, subset, forum_ids,
-                                               target_season, target_episode, terms="all")
+                                              target_season, target_episode, terms="all")
                     attempts += 1
                     if results:
                         break
                 if results or attempts >= self.MAX_FALLBACK_ATTEMPTS:
                     break
+        return results
 
-        # Ordina per rilevanza rispetto alla query originale
-        if results:
-            results.sort(
-                key=lambda r: parser.compute_relevance_score(r.title, keywords, query),
-                reverse=True,
-            )
+    def _stale_key(self, cache_key: str) -> str:
+        return cache_key.replace(":search:", ":search-stale:", 1)
 
-        return results
+    def _search_unavailable(self, cache_key: str, query: str) -> List[TorznabResult]:
+        """Upstream giù: risultati scaduti dalla cache se presenti, altrimenti errore Torznab."""
+        stale = self.store.get(self._stale_key(cache_key))
+        if stale:
+            logger.warning(f"Upstream unavailable, serving {len(stale)} stale results for '{query}'")
+            tracing.annotate(cache="stale")
+            return [TorznabResult(**r) for r in stale]
+        raise SiteUnavailableError("upstream circuit open")
+
+    def _search_cache_key(self, query, categories, target_season, target_episode) -> str:
+        params = [query, sorted(categories) if categories else None, target_season, target_episode]
+        return f"{self.store_ns}:search:{json.dumps(params)}"
 
     def _do_search(self, scraper, keywords: str, forum_ids: Optional[List[int]],
                    target_season: Optional[int], target_episode: Optional[int],
@@ -218,7 +377,8 @@ class MircrewSite(BaseSite):
                 params[f"fid[{fid}]"] = str(fid)
 
         try:
-            r = scraper.get(f"{base_url}/search.php", params=params, timeout=30)
+            with timed("search_request", keywords=keywords, terms=terms):
+                r = scraper.get(f"{base_url}/search.php", params=params, timeout=30)
             logger.info(f"Search '{keywords}' (terms={terms}): status={r.status_code}, "
                         f"season={target_season}, ep={target_episode}")
 
@@ -226,38 +386,30 @@ class MircrewSite(BaseSite):
                 logger.warning(f"Search returned non-200 status: {r.status_code}")
                 return []
 
-            soup = BeautifulSoup(r.text, "lxml")
+            debug = logger.isEnabledFor(logging.DEBUG)
+            page = self.parse_pool.run(extract.parse_search_page, r.text, self.selectors, debug)
 
             # --- Diagnostic debug logging ---
-            logger.debug(f"Search URL: {r.url}")
-            logger.debug(f"Response length: {len(r.text)} chars")
-            body = soup.find("body")
-            if body:
-                body_text = body.get_text(separator=" ", strip=True)[:500]
-                logger.debug(f"Body text preview: {body_text}")
-            row_selector = self.selectors["search_result_row"]
-            matched_rows = soup.select(row_selector)
-            logger.debug(f"Selector '{row_selector}' matched {len(matched_rows)} elements")
-            # Probe alternative selectors to help diagnose selector mismatches
-            for probe in ["a.topictitle", "ol.search-results li", "div.search.post"]:
-                count = len(soup.select(probe))
-                if count > 0:
-                    logger.debug(f"Probe selector '{probe}' matched {count} elements")
+            if debug:
+                logger.debug(f"Search URL: {r.url}")
+                logger.debug(f"Response length: {len(r.text)} chars")
+                logger.debug(f"Body text preview: {page['preview']}")
+                logger.debug(f"Selector '{self.selectors['search_result_row']}' matched "
+                             f"{len(page['rows'])} elements")
+                # Probe alternative selectors to help diagnose selector mismatches
+                for probe, count in page["probes"].items():
+                    if count > 0:
+                        logger.debug(f"Probe selector '{probe}' matched {count} elements")
             # --- End diagnostic logging ---
 
             results = []
             seen_threads = set()
             filtered_lang_count = 0
 
-            for row in matched_rows:
+            for row in page["rows"]:
                 try:
-                    link = row.select_one(self.selectors["topic_title_link"])
-                    if not link:
-                        continue
-
-                    thread_title = link.get_text(strip=True)
-                    href = link.get("href", "")
-                    url = parser.clean_url(urljoin(base_url, href), base_url)
+                    thread_title = row["title"]
+                    url = parser.clean_url(urljoin(base_url, row["href"]), base_url)
                     topic_id = parser.get_topic_id(url)
 
                     if not topic_id or topic_id in seen_threads:
@@ -271,20 +423,17 @@ class MircrewSite(BaseSite):
                             logger.debug(f"SKIP season mismatch: {thread_title[:40]}...")
                             continue
 
-                    cat_link = row.select_one(self.selectors["forum_link"])
                     forum_id = 25
-                    if cat_link:
-                        m = re.search(r'f=(\d+)', cat_link.get("href", ""))
-                        if m:
-                            forum_id = int(m.group(1))
+                    m = re.search(r'f=(\d+)', row["forum_href"])
+                    if m:
+                        forum_id = int(m.group(1))
                     if forum_id not in self.category_map:
                         logger.debug(f"Forum {forum_id} not in category_map, using default category")
 
-                    time_el = row.select_one(self.selectors["pub_date"])
                     pub_date = datetime.now()
-                    if time_el:
+                    if row["datetime"]:
                         try:
-                            pub_date = datetime.fromisoformat(time_el["datetime"].replace("Z", "+00:00"))
+                            pub_date = datetime.fromisoformat(row["datetime"].replace("Z", "+00:00"))
                         except Exception:
                             pass
 
@@ -294,46 +443,44 @@ class MircrewSite(BaseSite):
                     # Per contenuti già ringraziati: espandi magnets
                     if is_thanked:
                         logger.info(f"Expanding thanked {'TV' if is_tv else 'movie'}: {thread_title[:40]}...")
-                        soup_thread, html = self._fetch_thread_content(url)
-
-                        if soup_thread and html:
-                            magnets = parser.extract_magnets_from_soup(soup_thread, html,
-                                                                       self.selectors.get("post_content"))
-
-                            if is_tv and target_episode is not None:
-                                magnets = [m for m in magnets
-                                           if m.get("episode_info") and
-                                              m["episode_info"]["episode"] == target_episode]
-
-                            for mag in magnets:
-                                title = mag["name"] if mag["name"] else thread_title
-                                # Filtro lingua: controlla sia il nome magnet che il titolo thread
-                                if not parser.has_italian_audio(title) and not parser.has_italian_audio(thread_title):
-                                    logger.debug(f"SKIP non-Italian: {title[:40]}...")
-                                    filtered_lang_count += 1
-                                    continue
-                                languages = parser.extract_languages_from_title(title) or parser.extract_languages_from_title(thread_title)
-                                dl_params = {"topic_id": topic_id, "infohash": mag["infohash"]}
-
-                                results.append(TorznabResult(
-                                    title=title,
-                                    link=url,
-                                    guid=f"{topic_id}-{mag['infohash'][:8]}",
-                                    pub_date=pub_date.strftime("%a, %d %b %Y %H:%M:%S +0000"),
-                                    size=mag["size"],
-                                    category=self.category_map.get(forum_id, 5000 if is_tv else 2000),
-                                    seeders=10,
-                                    peers=1,
-                                    infohash=mag["infohash"],
-                                    episode_info=mag["episode_info"],
-                                    pack_info=mag.get("pack_info"),
-                                    languages=languages,
-                                    download_params=dl_params,
-                                ))
-
-                            if magnets:
-                                logger.info(f"  -> {len(magnets)} magnets")
+                        tracing.increment("thread_expansions")
+                        with span("thread_expand", topic_id=topic_id):
+                            magnets = self._get_thread_magnets(topic_id, url)
+
+                        if is_tv and target_episode is not None:
+                            magnets = [m for m in magnets
+                                       if m.get("episode_info") and
+                                          m["episode_info"]["episode"] == target_episode]
+
+                        for mag in magnets:
+                            title = mag["name"] if mag["name"] else thread_title
+                            # Filtro lingua: controlla sia il nome magnet che il titolo thread
+                            if not parser.has_italian_audio(title) and not parser.has_italian_audio(thread_title):
+                                logger.debug(f"SKIP non-Italian: {title[:40]}...")
+                                filtered_lang_count += 1
                                 continue
+                            languages = parser.extract_languages_from_title(title) or parser.extract_languages_from_title(thread_title)
+                            dl_params = {"topic_id": topic_id, "infohash": mag["infohash"]}
+
+                            results.append(TorznabResult(
+                                title=title,
+                                link=url,
+                                guid=f"{topic_id}-{mag['infohash'][:8]}",
+                                pub_date=pub_date.strftime("%a, %d %b %Y %H:%M:%S +0000"),
+                                size=mag["size"],
+                                category=self.category_map.get(forum_id, 5000 if is_tv else 2000),
+                                seeders=10,
+                                peers=1,
+                                infohash=mag["infohash"],
+                                episode_info=mag["episode_info"],
+                                pack_info=mag.get("pack_info"),
+                                languages=languages,
+                                download_params=dl_params,
+                            ))
+
+                        if magnets:
+                            logger.info(f"  -> {len(magnets)} magnets")
+                            continue
 
                     # Per TV non ringraziati: genera risultati sintetici
                     if is_tv and not is_thanked and not is_multi_season:
@@ -415,13 +562,26 @@ class MircrewSite(BaseSite):
         url = f"{self.config.base_url}/viewtopic.php?t={topic_id}"
         logger.info(f"=== DOWNLOAD: topic={topic_id}, infohash={infohash or 'N/A'}, S{season}E{episode} ===")
 
-        soup, html, thanks_clicked = self._fetch_thread_and_click_thanks(url)
+        # Thread già ringraziato e in cache: niente fetch né click
+        magnets = None
+        if topic_id in self.thanks_cache:
+            magnets = self.store.get(f"{self.store_ns}:magnets:{topic_id}")
+            perf.cache_lookup("thread", bool(magnets))
+            tracing.annotate(cache="hit" if magnets else "miss")
+            if magnets:
+                logger.info(f"Using {len(magnets)} cached magnets")
 
-        if not soup or not html:
-            return None
+        if not magnets:
+            if self.session.upstream_breaker.is_open():
+                raise SiteUnavailableError("upstream circuit open")
+            page, thanks_clicked = self._fetch_thread_and_click_thanks(url)
+
+            if not page:
+                return None
 
-        magnets = parser.extract_magnets_from_soup(soup, html,
-                                                    self.selectors.get("post_content"))
+            magnets = page["magnets"]
+            if magnets and topic_id in self.thanks_cache:
+                self._cache_magnets(topic_id, magnets)
         if not magnets:
             return None
 
@@ -456,13 +616,12 @@ class MircrewSite(BaseSite):
         """Debug endpoint per ispezionare un thread."""
         url = f"{self.config.base_url}/viewtopic.php?t={topic_id}"
         is_thanked = topic_id in self.thanks_cache
-        soup, html = self._fetch_thread_content(url)
+        page = self._fetch_thread_content(url)
 
-        if not soup or not html:
+        if not page:
             return {"error": "Failed to load thread"}
 
-        magnets = parser.extract_magnets_from_soup(soup, html,
-                                                    self.selectors.get("post_content"))
+        magnets = page["magnets"]
         return {
             "topic_id": topic_id,
             "url": url,
@@ -477,18 +636,41 @@ class MircrewSite(BaseSite):
 
     # === THREAD CONTENT ===
 
-    def _fetch_thread_content(self, topic_url: str):
-        """Carica contenuto thread SENZA cliccare Thanks."""
+    def _get_thread_magnets(self, topic_id: str, topic_url: str) -> List[Dict[str, Any]]:
+        """Magnets di un thread, dalla cache condivisa o scaricando la pagina."""
+        cached = self.store.get(f"{self.store_ns}:magnets:{topic_id}")
+        perf.cache_lookup("thread", cached is not None)
+        if cached is not None:
+            return cached
+
+        page = self._fetch_thread_content(topic_url)
+        if not page:
+            return []
+        magnets = page["magnets"]
+        if magnets:
+            self._cache_magnets(topic_id, magnets)
+        return magnets
+
+    def _cache_magnets(self, topic_id: str, magnets: List[Dict[str, Any]]):
+        if self.thread_cache_ttl:
+            self.store.set(f"{self.store_ns}:magnets:{topic_id}", magnets, ttl=self.thread_cache_ttl)
+
+    def _parse_thread(self, html: str) -> Dict[str, Any]:
+        return self.parse_pool.run(extract.parse_thread_page, html, self.selectors)
+
+    def _fetch_thread_content(self, topic_url: str) -> Optional[Dict[str, Any]]:
+        """Carica e analizza il thread SENZA cliccare Thanks."""
         scraper = self.session.ensure_logged_in()
         topic_url = parser.clean_url(topic_url, self.config.base_url)
         try:
-            r = scraper.get(topic_url, timeout=30)
+            with timed("thread_fetch", url=topic_url):
+                r = scraper.get(topic_url, timeout=30)
             if r.status_code != 200:
-                return None, None
-            return BeautifulSoup(r.text, "lxml"), r.text
+                return None
+            return self._parse_thread(r.text)
         except Exception as e:
             logger.error(f"fetch_thread_content error: {e}")
-            return None, None
+            return None
 
     def _fetch_thread_and_click_thanks(self, topic_url: str):
         """Carica thread E clicca Thanks se necessario."""
@@ -500,78 +682,151 @@ class MircrewSite(BaseSite):
         logger.info(f"=== FETCH+THANKS: {topic_url} ===")
 
         try:
-            r = scraper.get(topic_url, timeout=30)
+            with timed("thread_fetch", topic_id=topic_id):
+                r = scraper.get(topic_url, timeout=30)
             if r.status_code != 200:
-                return None, None, False
-
-            soup = BeautifulSoup(r.text, "lxml")
-
-            if topic_id and topic_id in self.thanks_cache:
-                logger.info("Already thanked (cache)")
-                return soup, r.text, False
-
-            first_post = soup.select_one(self.selectors["first_post"])
-            if not first_post:
-                return soup, r.text, False
+                return None, False
 
-            quote_link = first_post.select_one(self.selectors["quote_link"])
-            if not quote_link:
-                return soup, r.text, False
+            page = self._parse_thread(r.text)
 
-            first_post_id = parser.get_post_id(quote_link.get("href", ""))
-            if not first_post_id:
-                return soup, r.text, False
-
-            thanks_link = None
-            for a in soup.find_all("a", href=lambda x: x and "thanks=" in str(x)):
-                href = a.get("href", "")
-                if f"p={first_post_id}" in href or f"thanks={first_post_id}" in href:
-                    thanks_link = href
-                    break
+            # La cache dei thanks è solo un indizio (es. topic importati dalla
+            # lista del forum): se il pulsante c'è, il primo post va ringraziato
+            if not page["first_post_id"]:
+                return page, False
 
+            thanks_link = page["thanks_link"]
             if thanks_link:
                 logger.info(f"Clicking Thanks: {thanks_link}")
                 thanks_url = urljoin(base_url, thanks_link)
                 try:
-                    scraper.get(thanks_url, timeout=30)
-                    time.sleep(1)
-                    r = scraper.get(topic_url, timeout=30)
-                    soup = BeautifulSoup(r.text, "lxml")
+                    with timed("thanks_click", topic_id=topic_id):
+                        scraper.get(thanks_url, timeout=30)
+                    with timed("thread_fetch", topic_id=topic_id):
+                        r = scraper.get(topic_url, timeout=30)
+                    page = self._parse_thread(r.text)
                     if topic_id:
-                        self.thanks_cache.add(topic_id)
-                        self._save_thanks_cache()
-                    return soup, r.text, True
+                        self._remember_thanks(topic_id)
+                    return page, True
                 except Exception as e:
                     logger.error(f"Thanks click failed: {e}")
             else:
                 logger.info("No thanks button (already thanked)")
                 if topic_id:
-                    self.thanks_cache.add(topic_id)
-                    self._save_thanks_cache()
+                    self._remember_thanks(topic_id)
 
-            return soup, r.text, False
+            return page, False
 
         except Exception as e:
             logger.exception(f"fetch_thread_and_click_thanks error: {e}")
-            return None, None, False
+            return None, False
 
     # === THANKS CACHE ===
 
     def _load_thanks_cache(self):
         try:
-            if self.thanks_cache_file.exists():
-                with open(self.thanks_cache_file) as f:
-                    self.thanks_cache = set(json.load(f))
-                logger.info(f"Thanks cache loaded: {len(self.thanks_cache)} topics")
+            self.thanks_cache.update(self.thanks_journal.load())
+            logger.info(f"Thanks cache loaded: {len(self.thanks_cache)} topics")
         except Exception as e:
             logger.warning(f"Failed to load thanks cache: {e}")
 
-    def _save_thanks_cache(self):
+    def _remember_thanks(self, topic_id: str):
+        """Registra un thanks; la scrittura su disco avviene nel thread di flush."""
+        self.thanks_cache.add(topic_id)
+        self.thanks_journal.append(topic_id)
+
+    # === THANKS IMPORT ===
+
+    def _forum_user_id(self) -> Optional[str]:
+        """Id dell'utente loggato dal cookie phpBB <prefisso>_u (1 = anonimo)."""
+        for c in self.session.http.cookies:
+            if c.name.endswith("_u") and c.value.isdigit() and c.value != "1":
+                return c.value
+        return None
+
+    def import_thanks_history(self, max_pages: int = 200) -> Dict[str, Any]:
+        """Importa in blocco i topic già ringraziati dalla lista "thanks given" del forum.
+
+        Così anche i thanks dati a mano dal browser valgono come tali: quei
+        topic vengono espansi con i magnet reali senza sondare il thread.
+
+        Il primo import scorre tutta la lista (in cima ci sono di solito i
+        thanks dati dal proxy stesso, già noti); completato, lo si annota
+        nello store e gli import successivi si fermano alla prima pagina
+        senza topic nuovi.
+        """
+        started = time.monotonic()
+        complete_key = f"{self.store_ns}:thanks-import:complete"
+        incremental = bool(self.store.get(complete_key))
+        stats = {"pages": 0, "seen": 0, "added": 0, "replies_skipped": 0,
+                 "full": not incremental, "error": None}
         try:
-            with open(self.thanks_cache_file, "w") as f:
-                json.dump(list(self.thanks_cache), f)
+            scraper = self.session.ensure_logged_in()
+            user_id = self._forum_user_id()
+            if not user_id:
+                raise RuntimeError("forum user id not available (not logged in?)")
+
+            url = urljoin(self.config.base_url, self.thanks_history_url.format(user_id=user_id))
+            visited = set()
+            while url and url not in visited and stats["pages"] < max_pages and not self._closed.is_set():
+                visited.add(url)
+                r = scraper.get(url, timeout=30)
+                if r.status_code != 200:
+                    raise RuntimeError(f"HTTP {r.status_code} on {url}")
+                page = self.parse_pool.run(extract.parse_thanks_given_page, r.text)
+                stats["pages"] += 1
+                stats["seen"] += len(page["topic_ids"])
+                stats["replies_skipped"] += page["replies"]
+
+                new_ids = [t for t in page["topic_ids"] if t not in self.thanks_cache]
+                if new_ids:
+                    self.thanks_cache.update(new_ids)
+                    for topic_id in new_ids:
+                        self.thanks_journal.append(topic_id)
+                    stats["added"] += len(new_ids)
+                elif page["topic_ids"] and incremental:
+                    # La lista è dalla più recente: da qui in poi è già tutto noto
+                    break
+                # I link phpBB ("./app.php/...") sono relativi alla radice del forum
+                url = parser.clean_url(page["next"], self.config.base_url) if page["next"] else None
+            if not incremental and (not url or url in visited):
+                self.store.set(complete_key, time.time())
         except Exception as e:
-            logger.warning(f"Failed to save thanks cache: {e}")
+            stats["error"] = str(e)
+            logger.warning(f"Thanks import failed: {e}")
+
+        stats["duration"] = round(time.monotonic() - started, 1)
+        stats["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        self.thanks_import_stats = stats
+        logger.info(f"Thanks import: {stats['added']} new topics from {stats['pages']} pages "
+                    f"({stats['seen']} seen), total {len(self.thanks_cache)}")
+        return stats
+
+    def start_thanks_import(self):
+        """Avvia il thread che importa periodicamente la lista dei thanks dati."""
+        if self.thanks_import_interval <= 0 or self._thanks_import_thread:
+            return
+        self._thanks_import_thread = threading.Thread(
+            target=self._thanks_import_loop, name="thanks-import", daemon=True)
+        self._thanks_import_thread.start()
+
+    def _thanks_import_loop(self):
+        stamp_key = f"{self.store_ns}:thanks-import:last"
+        # Lascia completare avvio e primo login prima di interrogare il forum
+        if self._closed.wait(self.THANKS_IMPORT_START_DELAY):
+            return
+        while not self._closed.is_set():
+            try:
+                # Con più worker/repliche l'import lo fa uno solo per intervallo
+                with self.store.lock(f"{self.store_ns}:thanks-import", timeout=0, lease=600):
+                    last = self.store.get(stamp_key) or 0
+                    if time.time() - last >= self.thanks_import_interval:
+                        self.import_thanks_history()
+                        self.store.set(stamp_key, time.time())
+            except TimeoutError:
+                pass
+            except Exception as e:
+                logger.warning(f"Thanks import loop error: {e}")
+            self._closed.wait(min(self.thanks_import_interval, 3600))
 
 
 def create_site(config: Config) -> MircrewSite:
@@ -583,5 +838,17 @@ def create_site(config: Config) -> MircrewSite:
         cookies_file=config.data_dir / "cookies.json",
         flaresolverr_url=config.flaresolverr_url,
         flaresolverr_timeout=config.flaresolverr_timeout,
+        hedge_after=config.cf_bypass_hedge_after,
+        cookies_only=config.cf_bypass_cookies_only,
+        pool_size=config.http_pool_size,
+        http2=config.http2,
+        breaker_threshold=config.breaker_threshold,
+        breaker_reset=config.breaker_reset,
+        pace_rate=config.pace_rate,
+        pace_max_rate=config.pace_max_rate,
     )
-    return MircrewSite(session=session, config=config)
+    if config.background_refresh:
+        session.start_background_refresh()
+    site = MircrewSite(session=session, config=config)
+    site.start_thanks_import()
+    return site
@@ -0,0 +1,36 @@
+from .base import StateBackend
+from .memory import MemoryStore
+from .sqlite import SqliteStore
+from .redis import RedisStore
+from .shared import SharedSet
+from .idset import CompactIdSet
+
+# Store di default usato da sessioni e siti; main.py lo sostituisce in base
+# alla configurazione (STATE_BACKEND) e alla modalità di esecuzione
+_default_store = None
+
+
+def get_store() -> StateBackend:
+    """Ritorna lo store condiviso di default (in memoria se non configurato)."""
+    global _default_store
+    if _default_store is None:
+        _default_store = MemoryStore()
+    return _default_store
+
+
+def set_store(store: StateBackend):
+    """Imposta lo store condiviso di default."""
+    global _default_store
+    _default_store = store
+
+
+def create_store(config) -> StateBackend:
+    """Crea il backend di stato indicato da `config.state_backend`."""
+    backend = config.state_backend
+    if backend == "redis":
+        return RedisStore(config.state_url or "redis://localhost:6379/0")
+    if backend == "sqlite":
+        return SqliteStore(config.state_url or config.data_dir / "state.db")
+    if backend == "memory":
+        return MemoryStore()
+    raise ValueError(f"Unknown state backend: {backend}")
@@ -0,0 +1,76 @@
+"""Interfaccia comune dei backend di stato condiviso."""
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Iterable, Optional
+
+
+class StateBackend(ABC):
+    """Key-value con TTL, insiemi di stringhe e lock nominati.
+
+    I valori sono qualsiasi oggetto serializzabile in JSON. La portata dei
+    lock dipende dal backend: processo (memory), host (sqlite) o cluster
+    di repliche (redis).
+    """
+
+    # --- Key-value ---
+
+    @abstractmethod
+    def get(self, key: str, default: Any = None) -> Any:
+        """Ritorna il valore di `key`, o `default` se assente o scaduto."""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Imposta `key`; con `ttl` (secondi) il valore scade automaticamente."""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Rimuove `key` se presente."""
+
+    def keys(self, prefix: str = "") -> Iterable[str]:
+        """Chiavi non scadute che iniziano con `prefix` (diagnostica: può scorrere tutto lo store)."""
+        raise NotImplementedError(f"{type(self).__name__} cannot list keys")
+
+    # --- Insiemi ---
+
+    @abstractmethod
+    def sadd(self, name: str, *members: str):
+        """Aggiunge membri all'insieme `name`."""
+
+    @abstractmethod
+    def srem(self, name: str, *members: str):
+        """Rimuove membri dall'insieme `name`."""
+
+    @abstractmethod
+    def sismember(self, name: str, member: str) -> bool:
+        """True se `member` appartiene all'insieme `name`."""
+
+    @abstractmethod
+    def smembers(self, name: str) -> Iterable[str]:
+        """Tutti i membri dell'insieme `name`."""
+
+    @abstractmethod
+    def scard(self, name: str) -> int:
+        """Numero di membri dell'insieme `name`."""
+
+    # --- Lock ---
+
+    @abstractmethod
+    @contextmanager
+    def lock(self, name: str, timeout: float = 120.0, lease: float = 300.0):
+        """Lock nominato. Solleva TimeoutError se non acquisito entro `timeout`.
+
+        `lease` limita la durata del lock se il detentore muore senza rilasciarlo.
+        """
+
+    def id_set(self, name: str):
+        """Insieme di id interi `name`; di default un SharedSet sullo store."""
+        from .shared import SharedSet
+        return SharedSet(self, name)
+
+    def close(self):
+        """Rilascia connessioni e risorse del backend."""
+
+    def info(self) -> dict:
+        """Info di stato per health check."""
+        return {"backend": type(self).__name__}
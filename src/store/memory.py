@@ -0,0 +1,156 @@
+"""Stato condiviso in memoria di processo (default per il server singolo)."""
+
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterable, Optional
+
+from .base import StateBackend
+from .idset import CompactIdSet
+from .snapshot import LazyValue
+
+
+class MemoryStore(StateBackend):
+    """Key-value con TTL, insiemi e lock nominati, tutto in memoria.
+
+    Stessa interfaccia di SqliteStore: i lock sono validi solo dentro
+    il processo corrente.
+
+    Le voci con TTL (cache di ricerche e magnet) stanno in un dizionario
+    limitato a `max_entries`, da cui esce la più vecchia scritta; quelle
+    senza TTL (cookie, login, timestamp) sono stato di sessione e non
+    vengono mai sfrattate dalla cache.
+    """
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._data = {}   # key -> (value, None): stato senza scadenza
+        self._cache = OrderedDict()  # key -> (value, expires), dalla più vecchia scritta
+        self._sets = {}   # name -> set
+        self._locks = {}  # name -> threading.Lock
+        self._id_sets = {}  # name -> CompactIdSet
+        self._lock = threading.Lock()
+
+    # --- Key-value ---
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                return item[0]
+            item = self._cache.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires <= time.time():
+                del self._cache[key]
+                return default
+            if isinstance(value, LazyValue):  # da snapshot: decodificato al primo accesso
+                value = value.load()
+                self._cache[key] = (value, expires)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            if not ttl:
+                self._cache.pop(key, None)
+                self._data[key] = (value, None)
+                return
+            self._data.pop(key, None)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+            elif len(self._cache) >= self.max_entries:
+                self._evict()
+            self._cache[key] = (value, time.time() + ttl)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+            self._cache.pop(key, None)
+
+    def keys(self, prefix: str = "") -> Iterable[str]:
+        now = time.time()
+        with self._lock:
+            return ([k for k in self._data if k.startswith(prefix)]
+                    + [k for k, (_, exp) in self._cache.items() if k.startswith(prefix) and exp > now])
+
+    def cache_entries(self) -> list:
+        """Voci con scadenza ancora valide (chiave, valore, scadenza), per lo snapshot."""
+        now = time.time()
+        with self._lock:
+            return [(k, v, exp) for k, (v, exp) in self._cache.items() if exp > now]
+
+    def restore_entries(self, entries: Iterable) -> int:
+        """Carica voci (chiave, valore, scadenza) senza sovrascrivere quelle presenti."""
+        restored = 0
+        with self._lock:
+            for key, value, expires in entries:
+                if key in self._data or key in self._cache or len(self._cache) >= self.max_entries:
+                    continue
+                self._cache[key] = (value, expires)
+                restored += 1
+        return restored
+
+    def _evict(self):
+        """Libera un posto in cache: la voce più vecchia scritta, più quelle scadute in testa."""
+        self._cache.popitem(last=False)
+        now = time.time()
+        while self._cache:
+            key, (_, expires) = next(iter(self._cache.items()))
+            if expires > now:
+                break
+            del self._cache[key]
+
+    # --- Insiemi ---
+
+    def sadd(self, name: str, *members: str):
+        with self._lock:
+            self._sets.setdefault(name, set()).update(members)
+
+    def srem(self, name: str, *members: str):
+        with self._lock:
+            current = self._sets.get(name)
+            if current is not None:
+                current.difference_update(members)
+                if not current:
+                    del self._sets[name]
+
+    def sismember(self, name: str, member: str) -> bool:
+        with self._lock:
+            return member in self._sets.get(name, ())
+
+    def smembers(self, name: str) -> Iterable[str]:
+        with self._lock:
+            return set(self._sets.get(name, ()))
+
+    def scard(self, name: str) -> int:
+        with self._lock:
+            return len(self._sets.get(name, ()))
+
+    def id_set(self, name: str) -> CompactIdSet:
+        """In processo gli id stanno in un array ordinato invece che in un set di stringhe."""
+        with self._lock:
+            return self._id_sets.setdefault(name, CompactIdSet())
+
+    # --- Lock ---
+
+    @contextmanager
+    def lock(self, name: str, timeout: float = 120.0, lease: float = 300.0):
+        """Lock nominato. Solleva TimeoutError se non acquisito entro `timeout`."""
+        with self._lock:
+            lk = self._locks.setdefault(name, threading.Lock())
+        if not lk.acquire(timeout=timeout):
+            raise TimeoutError(f"Lock '{name}' not acquired within {timeout}s")
+        try:
+            yield
+        finally:
+            lk.release()
+
+    def close(self):
+        pass
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._data) + len(self._cache),
+                    "cache_entries": len(self._cache), "max_entries": self.max_entries}
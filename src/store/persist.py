@@ -0,0 +1,248 @@
+"""Persistenza su file fuori dal percorso delle richieste.
+
+- scritture atomiche (file temporaneo + rename): un crash a metà scrittura
+  lascia sempre la versione precedente intatta
+- DebouncedWriter: le modifiche segnano il file come "sporco" e un thread
+  di flush lo riscrive una volta sola dopo una breve quiete
+- AppendJournal: le aggiunte vanno in coda a un journal, compattato
+  periodicamente in uno snapshot JSON
+"""
+
+import json
+import os
+import time
+import atexit
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, List
+
+logger = logging.getLogger("store.persist")
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """Scrive `data` in `path` in modo atomico."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path: Path, data: Any):
+    """Scrive `data` come JSON in `path` in modo atomico."""
+    atomic_write_bytes(path, json.dumps(data).encode("utf-8"))
+
+
+class DebouncedWriter:
+    """Riscrive un file JSON al più una volta per raffica di modifiche.
+
+    `snapshot` viene chiamata al momento del flush, così più modifiche
+    ravvicinate producono una sola scrittura. Il flush avviene dopo `delay`
+    secondi senza modifiche, o comunque entro `max_delay` dalla prima.
+
+    `mark_dirty` tocca solo il flag sotto `_lock`; snapshot, scrittura e
+    fsync avvengono fuori, serializzati da `_write_lock`, così i thread
+    delle richieste non aspettano mai il disco.
+    """
+
+    def __init__(self, path: Path, snapshot: Callable[[], Any],
+                 delay: float = 2.0, max_delay: float = 10.0):
+        self.path = Path(path)
+        self.snapshot = snapshot
+        self.delay = delay
+        self.max_delay = max_delay
+        self.writes = 0
+        self._dirty_since = None
+        self._last_change = 0.0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        _flusher.register(self)
+
+    def mark_dirty(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._dirty_since is None:
+                self._dirty_since = now
+            self._last_change = now
+
+    def due(self, now: float) -> bool:
+        with self._lock:
+            return self._dirty_since is not None and (
+                now - self._last_change >= self.delay or now - self._dirty_since >= self.max_delay)
+
+    def flush(self):
+        """Scrive subito se ci sono modifiche pendenti."""
+        with self._write_lock:
+            with self._lock:
+                if self._dirty_since is None:
+                    return
+                self._dirty_since = None
+            try:
+                atomic_write_json(self.path, self.snapshot())
+                self.writes += 1
+            except Exception as e:
+                logger.warning(f"Failed to write {self.path.name}: {e}")
+                self.mark_dirty()
+
+    def close(self):
+        self.flush()
+        _flusher.unregister(self)
+
+
+class AppendJournal:
+    """Journal append-only di stringhe (una per riga) con snapshot compattato.
+
+    Le aggiunte restano in un buffer e vengono accodate al journal dal
+    thread di flush; dopo `compact_every` righe lo snapshot viene riscritto
+    in modo atomico con `snapshot()` e il journal svuotato. Il buffer
+    viene scambiato sotto `_lock` e scritto fuori: `append` non attende
+    mai scritture o fsync.
+    """
+
+    def __init__(self, path: Path, snapshot_path: Path, snapshot: Callable[[], List[str]],
+                 compact_every: int = 500):
+        self.path = Path(path)
+        self.snapshot_path = Path(snapshot_path)
+        self.snapshot = snapshot
+        self.compact_every = compact_every
+        self._buffer: List[str] = []
+        self._journal_lines = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        _flusher.register(self)
+
+    def load(self) -> List[str]:
+        """Contenuto dello snapshot seguito dalle righe del journal."""
+        items = []
+        if self.snapshot_path.exists():
+            try:
+                with open(self.snapshot_path) as f:
+                    items.extend(str(i) for i in json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to read {self.snapshot_path.name}: {e}")
+        if self.path.exists():
+            with open(self.path) as f:
+                lines = f.read().split("\n")
+            # L'ultima riga è completa solo se terminata da newline (crash a metà append)
+            journal = [line.strip() for line in lines[:-1] if line.strip()]
+            self._journal_lines = len(journal)
+            items.extend(journal)
+        return items
+
+    def append(self, item: str):
+        with self._lock:
+            self._buffer.append(str(item))
+
+    def due(self, now: float) -> bool:
+        with self._lock:
+            return bool(self._buffer)
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                pending, self._buffer = self._buffer, []
+            if pending:
+                try:
+                    with open(self.path, "a") as f:
+                        f.write("".join(f"{item}\n" for item in pending))
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._journal_lines += len(pending)
+                except OSError as e:
+                    logger.warning(f"Failed to append to {self.path.name}: {e}")
+                    with self._lock:
+                        self._buffer[:0] = pending
+                    return
+            if self._journal_lines >= self.compact_every:
+                self._compact()
+
+    def _compact(self):
+        try:
+            atomic_write_json(self.snapshot_path, self.snapshot())
+            # Lo snapshot contiene già tutto: il journal può ripartire vuoto
+            with open(self.path, "w"):
+                pass
+            self._journal_lines = 0
+            logger.info(f"Compacted {self.path.name} into {self.snapshot_path.name}")
+        except OSError as e:
+            logger.warning(f"Failed to compact {self.path.name}: {e}")
+
+    def close(self):
+        self.flush()
+        _flusher.unregister(self)
+
+
+# Nome del thread di flush (il loop dorme in time.sleep fra un giro e l'altro)
+FLUSH_THREAD_NAME = "persist-flush"
+
+
+class _Flusher:
+    """Thread unico che esegue i flush pendenti di writer e journal."""
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._targets = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def register(self, target):
+        with self._lock:
+            self._targets.append(target)
+            # Avvio lazy, e di nuovo nel figlio dopo un fork
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop, name=FLUSH_THREAD_NAME, daemon=True)
+                self._thread.start()
+
+    def unregister(self, target):
+        with self._lock:
+            if target in self._targets:
+                self._targets.remove(target)
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            with self._lock:
+                targets = list(self._targets)
+            for target in targets:
+                if target.due(now):
+                    target.flush()
+
+    def flush_all(self):
+        with self._lock:
+            targets = list(self._targets)
+        for target in targets:
+            target.flush()
+
+
+_flusher = _Flusher()
+
+
+def flush_all():
+    """Scrive subito tutte le modifiche pendenti (shutdown)."""
+    _flusher.flush_all()
+
+
+def register_flush(target):
+    """Aggiunge ai flush periodici e di shutdown un oggetto con `due(now)` e `flush()`."""
+    _flusher.register(target)
+
+
+def unregister_flush(target):
+    _flusher.unregister(target)
+
+
+atexit.register(flush_all)
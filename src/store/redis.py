@@ -0,0 +1,153 @@
+"""Stato condiviso su Redis, per più repliche dietro un load balancer."""
+
+import json
+import re
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from typing import Any, Iterable, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from .base import StateBackend
+
+try:
+    import redis
+except ImportError:  # richiesto solo con STATE_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger("store.redis")
+
+
+def public_url(url: str) -> str:
+    """URL senza credenziali (`redis://:password@host` → `redis://host`), per log e /health."""
+    parts = urlsplit(url)
+    netloc = parts.netloc.rsplit("@", 1)[-1]
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                       if k.lower() not in ("password", "username")])
+    return f"{parts.scheme}://{netloc}{parts.path}" + (f"?{query}" if query else "")
+
+
+class RedisStore(StateBackend):
+    """Backend su server Redis (o compatibile: Valkey, KeyDB, Dragonfly).
+
+    I lock sono `SET NX PX` con token del detentore e rilascio atomico via
+    WATCH/MULTI (niente Lua, funziona anche con server senza scripting),
+    quindi un solo processo in tutto il cluster risolve CF o fa il login.
+    Si può passare un `client` già costruito (es. fakeredis in test).
+    """
+
+    # Il ping di /health usa un client con timeout breve e il suo esito vale qualche secondo
+    HEALTH_TIMEOUT = 1.0
+    HEALTH_CACHE_SECONDS = 5.0
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "torznab:",
+                 client=None):
+        health_client = client
+        if client is None:
+            if redis is None:
+                raise RuntimeError("RedisStore requires redis (pip install redis)")
+            client = redis.Redis.from_url(url, decode_responses=True,
+                                          socket_timeout=10, health_check_interval=30)
+            health_client = redis.Redis.from_url(url, socket_timeout=self.HEALTH_TIMEOUT,
+                                                 socket_connect_timeout=self.HEALTH_TIMEOUT)
+        self.client = client
+        # Solo per diagnostica: /health non richiede autenticazione
+        self.url = public_url(url)
+        self.prefix = prefix
+        self._health_client = health_client
+        self._health = None
+        self._health_at = 0.0
+
+    def _k(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    # --- Key-value ---
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raw = self.client.get(self._k(key))
+        if raw is None:
+            return default
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        px = max(1, int(ttl * 1000)) if ttl else None
+        self.client.set(self._k(key), json.dumps(value), px=px)
+
+    def delete(self, key: str):
+        self.client.delete(self._k(key))
+
+    def keys(self, prefix: str = "") -> Iterable[str]:
+        pattern = re.sub(r"([*?\[\]\\])", r"\\\1", self._k(prefix)) + "*"
+        skip = len(self.prefix)
+        return [k[skip:] for k in self.client.scan_iter(match=pattern, count=500)]
+
+    # --- Insiemi ---
+
+    def sadd(self, name: str, *members: str):
+        if members:
+            self.client.sadd(self._k(name), *members)
+
+    def srem(self, name: str, *members: str):
+        if members:
+            self.client.srem(self._k(name), *members)
+
+    def sismember(self, name: str, member: str) -> bool:
+        return bool(self.client.sismember(self._k(name), member))
+
+    def smembers(self, name: str) -> Iterable[str]:
+        return set(self.client.smembers(self._k(name)))
+
+    def scard(self, name: str) -> int:
+        return self.client.scard(self._k(name))
+
+    # --- Lock ---
+
+    @contextmanager
+    def lock(self, name: str, timeout: float = 120.0, lease: float = 300.0):
+        """Lock distribuito. Solleva TimeoutError se non acquisito entro `timeout`."""
+        key = self._k(f"lock:{name}")
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while not self.client.set(key, token, nx=True, px=int(lease * 1000)):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Lock '{name}' not acquired within {timeout}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+        try:
+            yield
+        finally:
+            try:
+                self._release(key, token)
+            except Exception as e:
+                logger.warning(f"Lock '{name}' release failed (expires with lease): {e}")
+
+    def _release(self, key: str, token: str):
+        """Cancella il lock solo se è ancora nostro (il lease potrebbe essere scaduto)."""
+        with self.client.pipeline() as pipe:
+            pipe.watch(key)
+            if pipe.get(key) == token:
+                pipe.multi()
+                pipe.delete(key)
+                pipe.execute()
+            else:
+                pipe.unwatch()
+
+    def close(self):
+        self.client.close()
+        if self._health_client is not self.client:
+            self._health_client.close()
+
+    def info(self) -> dict:
+        now = time.monotonic()
+        if self._health is None or now - self._health_at >= self.HEALTH_CACHE_SECONDS:
+            started = time.perf_counter()
+            try:
+                self._health_client.ping()
+                self._health = {"reachable": True,
+                                "ping_ms": round((time.perf_counter() - started) * 1000, 1)}
+            except Exception as e:
+                self._health = {"reachable": False, "error": str(e)}
+            self._health_at = now
+        return {"backend": "redis", "url": self.url, **self._health}
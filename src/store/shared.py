@@ -0,0 +1,32 @@
+"""Vista tipo `set` su un insieme dello store condiviso."""
+
+from typing import Iterable, Iterator
+
+
+class SharedSet:
+    """Insieme di stringhe persistito nello store condiviso.
+
+    Supporta le operazioni usate sul vecchio `set` in memoria
+    (`in`, `add`, `update`, `len`, iterazione).
+    """
+
+    def __init__(self, store, name: str):
+        self.store = store
+        self.name = name
+
+    def __contains__(self, member) -> bool:
+        return self.store.sismember(self.name, str(member))
+
+    def add(self, member):
+        self.store.sadd(self.name, str(member))
+
+    def update(self, members: Iterable):
+        members = [str(m) for m in members]
+        if members:
+            self.store.sadd(self.name, *members)
+
+    def __len__(self) -> int:
+        return self.store.scard(self.name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.smembers(self.name))
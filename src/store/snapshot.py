@@ -0,0 +1,197 @@
+"""Snapshot binario delle cache in memoria, per ripartire a cache calde.
+
+Con il backend `memory` le cache (ricerche, ricerche scadute, magnet dei
+thread) vivono solo nel processo: a ogni riavvio o aggiornamento si
+ripartirebbe da zero. `CacheSnapshotter` le scrive periodicamente e allo
+shutdown in un file binario compatto in `data_dir`; all'avvio
+`load_snapshot` mappa il file in memoria (mmap) e legge solo l'indice:
+i valori vengono decodificati al primo accesso alla chiave.
+
+Si salvano solo le voci con scadenza (le cache); sessione e login restano
+a cookies.json e allo store. Formato (little endian):
+
+    header  magic "MCSN", versione u16, creato f64, tag (u16 + utf-8), voci u32
+    voce    lunghezza chiave u32, lunghezza valore u32, scadenza f64, codec u8,
+            chiave utf-8, valore (JSON, compresso zlib se codec 1)
+    footer  crc32 u32 di tutto il resto
+
+Un file con versione o tag diversi (es. cambia la forma dei risultati in
+cache) o con CRC errato viene ignorato.
+"""
+
+import json
+import logging
+import mmap
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Iterable, Tuple
+
+from .persist import atomic_write_bytes, register_flush, unregister_flush
+
+logger = logging.getLogger("store.snapshot")
+
+MAGIC = b"MCSN"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHd")
+_ENTRY = struct.Struct("<IIdB")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+
+CODEC_JSON, CODEC_ZLIB = 0, 1
+# Sotto questa dimensione comprimere non conviene
+COMPRESS_MIN = 512
+
+
+class LazyValue:
+    """Valore di uno snapshot non ancora decodificato (slice del file mappato)."""
+
+    __slots__ = ("buf", "offset", "length", "codec")
+
+    def __init__(self, buf, offset: int, length: int, codec: int):
+        self.buf = buf
+        self.offset = offset
+        self.length = length
+        self.codec = codec
+
+    def raw(self) -> Tuple[bytes, int]:
+        return bytes(self.buf[self.offset:self.offset + self.length]), self.codec
+
+    def load(self) -> Any:
+        data, codec = self.raw()
+        if codec == CODEC_ZLIB:
+            data = zlib.decompress(data)
+        return json.loads(data)
+
+
+def encode_value(value: Any) -> Tuple[bytes, int]:
+    if isinstance(value, LazyValue):
+        return value.raw()
+    data = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(data) >= COMPRESS_MIN:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            return compressed, CODEC_ZLIB
+    return data, CODEC_JSON
+
+
+def dump_snapshot(entries: Iterable[Tuple[str, Any, float]], tag: str = "") -> bytes:
+    """Serializza le voci (chiave, valore, scadenza epoch)."""
+    parts = []
+    count = 0
+    for key, value, expires in entries:
+        try:
+            data, codec = encode_value(value)
+        except (TypeError, ValueError):  # valore non serializzabile in JSON: resta fuori
+            continue
+        key_bytes = key.encode("utf-8")
+        parts += [_ENTRY.pack(len(key_bytes), len(data), expires, codec), key_bytes, data]
+        count += 1
+    tag_bytes = tag.encode("utf-8")
+    body = b"".join([_HEADER.pack(MAGIC, VERSION, time.time()), _U16.pack(len(tag_bytes)),
+                     tag_bytes, _U32.pack(count)] + parts)
+    return body + _U32.pack(zlib.crc32(body))
+
+
+def read_snapshot(path: Path, tag: str = ""):
+    """Indice di uno snapshot: (creato, [(chiave, LazyValue, scadenza)]), o None se non valido.
+
+    I valori restano nel file mappato in memoria fino al primo accesso.
+    """
+    path = Path(path)
+    try:
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:  # file assente o vuoto
+        logger.debug(f"No cache snapshot at {path}: {e}")
+        return None
+
+    try:
+        magic, version, created = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            logger.info(f"Ignoring cache snapshot {path.name}: format {version}, expected {VERSION}")
+            return None
+        (crc,) = _U32.unpack_from(buf, len(buf) - _U32.size)
+        if zlib.crc32(memoryview(buf)[:len(buf) - _U32.size]) != crc:
+            logger.warning(f"Ignoring corrupted cache snapshot {path.name}")
+            return None
+        pos = _HEADER.size
+        (tag_len,) = _U16.unpack_from(buf, pos)
+        pos += _U16.size
+        file_tag = buf[pos:pos + tag_len].decode("utf-8")
+        if file_tag != tag:
+            logger.info(f"Ignoring cache snapshot {path.name}: cache schema changed")
+            return None
+        pos += tag_len
+        (count,) = _U32.unpack_from(buf, pos)
+        pos += _U32.size
+        entries = []
+        for _ in range(count):
+            key_len, value_len, expires, codec = _ENTRY.unpack_from(buf, pos)
+            pos += _ENTRY.size
+            key = buf[pos:pos + key_len].decode("utf-8")
+            pos += key_len
+            entries.append((key, LazyValue(buf, pos, value_len, codec), expires))
+            pos += value_len
+        return created, entries
+    except (struct.error, UnicodeDecodeError) as e:
+        logger.warning(f"Ignoring unreadable cache snapshot {path.name}: {e}")
+        return None
+
+
+def load_snapshot(store, path: Path, tag: str = "") -> int:
+    """Carica nello store le voci non scadute dello snapshot. Ritorna quante."""
+    snapshot = read_snapshot(path, tag)
+    if snapshot is None:
+        return 0
+    created, entries = snapshot
+    now = time.time()
+    loaded = store.restore_entries((k, v, exp) for k, v, exp in entries if exp > now)
+    logger.info(f"Cache snapshot restored: {loaded}/{len(entries)} entries "
+                f"(saved {(now - created) / 60:.0f} min ago)")
+    return loaded
+
+
+class CacheSnapshotter:
+    """Scrive lo snapshot delle cache ogni `interval` secondi e allo shutdown (flush)."""
+
+    def __init__(self, store, path: Path, tag: str = "", interval: float = 600.0):
+        self.store = store
+        self.path = Path(path)
+        self.tag = tag
+        self.interval = interval
+        self.writes = 0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        register_flush(self)
+
+    def due(self, now: float) -> bool:
+        return now - self._last >= self.interval
+
+    def flush(self):
+        with self._lock:
+            self._last = time.monotonic()
+            try:
+                started = time.monotonic()
+                entries = self.store.cache_entries()
+                atomic_write_bytes(self.path, dump_snapshot(entries, self.tag))
+                self.writes += 1
+                logger.debug(f"Cache snapshot: {len(entries)} entries written in "
+                             f"{(time.monotonic() - started) * 1000:.0f} ms")
+            except Exception as e:
+                logger.warning(f"Failed to write cache snapshot {self.path.name}: {e}")
+
+    def close(self):
+        self.flush()
+        unregister_flush(self)
+
+
+def enable_cache_snapshot(store, data_dir: Path, tag: str = "",
+                          interval: float = 600.0) -> CacheSnapshotter:
+    """Ripristina lo snapshot in `data_dir` e ne avvia la scrittura periodica."""
+    path = Path(data_dir) / "cache.snap"
+    load_snapshot(store, path, tag)
+    return CacheSnapshotter(store, path, tag, interval)
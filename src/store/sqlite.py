@@ -0,0 +1,150 @@
+"""Stato condiviso fra processi su SQLite (WAL), per la modalità pre-fork."""
+
+import json
+import os
+import time
+import sqlite3
+import logging
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from .base import StateBackend
+
+logger = logging.getLogger("store.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL);
+CREATE TABLE IF NOT EXISTS members (name TEXT NOT NULL, member TEXT NOT NULL,
+                                    PRIMARY KEY (name, member)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+"""
+
+
+class SqliteStore(StateBackend):
+    """Key-value con TTL, insiemi e lock nominati su un file SQLite condiviso.
+
+    Ogni thread usa la propria connessione; il journal WAL permette letture
+    concorrenti da più processi mentre uno scrive. I lock sono lease con
+    scadenza, così un worker morto non blocca gli altri per sempre.
+    """
+
+    def __init__(self, path: Path, purge_interval: float = 300.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._last_purge = 0.0
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # Dopo un fork il processo figlio non deve riusare la connessione del padre
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # --- Key-value ---
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._conn().execute(
+            "SELECT value, expires FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires = time.time() + ttl if ttl else None
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value), expires))
+        self._maybe_purge()
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def keys(self, prefix: str = "") -> Iterable[str]:
+        # Confronto su intervallo invece di LIKE: nessun escape di % e _ nel prefisso
+        rows = self._conn().execute(
+            "SELECT key FROM kv WHERE key >= ? AND key < ? AND (expires IS NULL OR expires > ?)",
+            (prefix, prefix + "\U0010ffff", time.time())).fetchall()
+        return [r[0] for r in rows]
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        self._conn().execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (now,))
+
+    # --- Insiemi ---
+
+    def sadd(self, name: str, *members: str):
+        self._conn().executemany(
+            "INSERT OR IGNORE INTO members (name, member) VALUES (?, ?)",
+            [(name, m) for m in members])
+
+    def srem(self, name: str, *members: str):
+        self._conn().executemany(
+            "DELETE FROM members WHERE name = ? AND member = ?",
+            [(name, m) for m in members])
+
+    def sismember(self, name: str, member: str) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM members WHERE name = ? AND member = ?", (name, member)).fetchone() is not None
+
+    def smembers(self, name: str) -> Iterable[str]:
+        return {r[0] for r in self._conn().execute(
+            "SELECT member FROM members WHERE name = ?", (name,))}
+
+    def scard(self, name: str) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM members WHERE name = ?", (name,)).fetchone()[0]
+
+    # --- Lock ---
+
+    @contextmanager
+    def lock(self, name: str, timeout: float = 120.0, lease: float = 300.0):
+        """Lock nominato fra processi. Solleva TimeoutError se non acquisito entro `timeout`."""
+        owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        deadline = time.monotonic() + timeout
+        conn = self._conn()
+        delay = 0.05
+        while True:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM locks WHERE name = ? AND expires <= ?", (name, now))
+                acquired = conn.execute(
+                    "INSERT OR IGNORE INTO locks (name, owner, expires) VALUES (?, ?, ?)",
+                    (name, owner, now + lease)).rowcount == 1
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if acquired:
+                break
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Lock '{name}' not acquired within {timeout}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+        try:
+            yield
+        finally:
+            conn.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner))
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def info(self) -> dict:
+        return {"backend": "sqlite", "path": str(self.path)}
@@ -0,0 +1 @@
+"""Strumenti da riga di comando (eseguiti con `python -m tools.<nome>` da src/)."""
@@ -0,0 +1,205 @@
+"""Analisi offline dell'access log JSON (`DATA_DIR/access*.jsonl`).
+
+Uso (da src/, o nel container con PYTHONPATH=/app/src):
+
+    python -m tools.accesslog_report /app/data/access*.jsonl*
+    python -m tools.accesslog_report /app/data --since 24h --site mircrew --top 20
+
+Riporta percentili di latenza per sito/endpoint e per stadio, le query
+più lente e il costo upstream (richieste al forum, solve CF, byte) per
+query, diviso per stato della cache e per stadio di ricerca.
+"""
+
+import argparse
+import glob
+import json
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def expand_paths(paths: Iterable[str]) -> List[Path]:
+    """File da leggere: glob e directory (tutti gli access*.jsonl*, ruotati inclusi)."""
+    found = []
+    for p in paths:
+        path = Path(p)
+        if path.is_dir():
+            found.extend(sorted(path.glob("access*.jsonl*")))
+        else:
+            found.extend(Path(m) for m in sorted(glob.glob(p)) or [p])
+    return found
+
+
+def parse_since(value: str) -> float:
+    """`24h`, `30m`, `7d`, `90s` oppure una data ISO → timestamp."""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if value and value[-1] in units and value[:-1].isdigit():
+        return time.time() - int(value[:-1]) * units[value[-1]]
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def read_records(paths: List[Path], since: Optional[float] = None,
+                 site: Optional[str] = None) -> Iterator[dict]:
+    for path in paths:
+        try:
+            f = open(path, encoding="utf-8")
+        except OSError as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+            continue
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # riga troncata (es. crash durante la scrittura)
+                if site and record.get("site") != site:
+                    continue
+                if since is not None:
+                    try:
+                        if datetime.fromisoformat(record["ts"]).timestamp() < since:
+                            continue
+                    except (KeyError, ValueError):
+                        continue
+                yield record
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    values = sorted(values)
+    count = len(values)
+    data = {"count": count}
+    for p in PERCENTILES:
+        data[f"p{p}"] = round(values[min(count - 1, int(count * p / 100))], 1) if count else None
+    data["max"] = round(values[-1], 1) if count else None
+    return data
+
+
+def _average(records: List[dict], key: str) -> float:
+    return round(sum(r.get(key) or 0 for r in records) / len(records), 2) if records else 0.0
+
+
+def upstream_cost(records: List[dict]) -> dict:
+    return {
+        "queries": len(records),
+        "upstream_requests": _average(records, "upstream_requests"),
+        "cf_solves": _average(records, "cf_solves"),
+        "upstream_kb": round(_average(records, "upstream_bytes") / 1024, 1),
+        "latency_ms": percentiles([r["duration_ms"] for r in records if r.get("duration_ms") is not None]),
+    }
+
+
+def build_report(records: Iterable[dict], top: int = 10) -> dict:
+    by_endpoint = defaultdict(list)
+    by_stage = defaultdict(list)
+    searches = []
+    for r in records:
+        if r.get("duration_ms") is None:
+            continue
+        by_endpoint[(r.get("site"), r.get("endpoint"))].append(r)
+        for stage, ms in (r.get("stages") or {}).items():
+            by_stage[stage].append(ms)
+        if r.get("endpoint") == "api" and r.get("t") not in (None, "caps"):
+            searches.append(r)
+
+    by_cache = defaultdict(list)
+    by_search_stage = defaultdict(list)
+    for r in searches:
+        by_cache[r.get("cache") or "none"].append(r)
+        if r.get("search_stage"):
+            by_search_stage[r["search_stage"]].append(r)
+
+    cache_hits = len(by_cache.get("hit", [])) + len(by_cache.get("stale", []))
+    cache_total = sum(len(v) for k, v in by_cache.items() if k != "none")
+
+    slowest = sorted(searches, key=lambda r: r["duration_ms"], reverse=True)[:top]
+    return {
+        "requests": sum(len(v) for v in by_endpoint.values()),
+        "latency": {f"{s}/{e}": dict(percentiles([r["duration_ms"] for r in rs]),
+                                    errors=sum(1 for r in rs if (r.get("status") or 200) >= 400))
+                    for (s, e), rs in sorted(by_endpoint.items(), key=lambda i: str(i[0]))},
+        "stages": {stage: percentiles(values) for stage, values in
+                   sorted(by_stage.items(), key=lambda i: -sum(i[1]))},
+        "slowest": [{k: r.get(k) for k in ("ts", "request_id", "site", "t", "q", "season", "ep",
+                                            "duration_ms", "results", "cache", "search_stage",
+                                            "upstream_requests", "cf_solves")
+                     if r.get(k) is not None} for r in slowest],
+        "upstream_cost": {
+            "all": upstream_cost(searches),
+            "by_cache": {k: upstream_cost(v) for k, v in sorted(by_cache.items())},
+            "by_search_stage": {k: upstream_cost(v) for k, v in sorted(by_search_stage.items())},
+        },
+        "cache_hit_ratio": round(cache_hits / cache_total, 3) if cache_total else None,
+    }
+
+
+# --- Output testuale ---
+
+def _fmt(value) -> str:
+    return "-" if value is None else str(value)
+
+
+def _table(title: str, header: List[str], rows: List[List]) -> List[str]:
+    rows = [[_fmt(c) for c in row] for row in rows]
+    widths = [max(len(h), *(len(r[i]) for r in rows)) if rows else len(h) for i, h in enumerate(header)]
+    lines = ["", title, "  ".join(h.ljust(w) for h, w in zip(header, widths)).rstrip(),
+             "  ".join("-" * w for w in widths)]
+    lines += ["  ".join(c.ljust(w) for c, w in zip(row, widths)).rstrip() for row in rows]
+    if not rows:
+        lines.append("(no data)")
+    return lines
+
+
+def format_report(report: dict) -> str:
+    pcols = ["count"] + [f"p{p}" for p in PERCENTILES] + ["max"]
+    lines = [f"Requests: {report['requests']}   cache hit ratio: {_fmt(report['cache_hit_ratio'])}"]
+    lines += _table("Latency by site/endpoint (ms)", ["site/endpoint"] + pcols + ["errors"],
+                    [[k] + [v[c] for c in pcols] + [v["errors"]] for k, v in report["latency"].items()])
+    lines += _table("Latency by stage (ms, per request)", ["stage"] + pcols,
+                    [[k] + [v[c] for c in pcols] for k, v in report["stages"].items()])
+    lines += _table("Slowest queries", ["ms", "site", "t", "query", "results", "cache", "stage", "upstream", "id"],
+                    [[r.get("duration_ms"), r.get("site"), r.get("t"),
+                      " ".join(str(r[k]) for k in ("q", "season", "ep") if r.get(k) is not None),
+                      r.get("results"), r.get("cache"), r.get("search_stage"),
+                      r.get("upstream_requests"), r.get("request_id")] for r in report["slowest"]])
+
+    cost_header = ["group", "queries", "upstream/query", "cf_solves/query", "KB/query", "p50 ms", "p95 ms"]
+
+    def cost_row(name, c):
+        return [name, c["queries"], c["upstream_requests"], c["cf_solves"], c["upstream_kb"],
+                c["latency_ms"]["p50"], c["latency_ms"]["p95"]]
+
+    cost = report["upstream_cost"]
+    rows = [cost_row("all", cost["all"])]
+    rows += [cost_row(f"cache={k}", c) for k, c in cost["by_cache"].items()]
+    rows += [cost_row(f"stage={k}", c) for k, c in cost["by_search_stage"].items()]
+    lines += _table("Upstream cost per query", cost_header, rows)
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Latency and upstream-cost report from the JSON access log")
+    parser.add_argument("paths", nargs="+", help="access log files, globs or DATA_DIR")
+    parser.add_argument("--since", help="only records newer than this (e.g. 24h, 30m, 2024-05-01T00:00)")
+    parser.add_argument("--site", help="only this site")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest queries to list")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    since = parse_since(args.since) if args.since else None
+    report = build_report(read_records(expand_paths(args.paths), since, args.site), top=args.top)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print(format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Ispezione degli archivi di traffico upstream (`RECORD_UPSTREAM`).
+
+Uso (da src/, o nel container con PYTHONPATH=/app/src):
+
+    python -m tools.upstream_archive list /app/data/recordings/upstream-*.jsonl.gz
+    python -m tools.upstream_archive list ARCHIVE --match search.php
+    python -m tools.upstream_archive extract ARCHIVE ../bench/fixtures/captured --match viewtopic
+
+`list` mostra gli scambi registrati (metodo, status, dimensione, tempo,
+URL) e un riepilogo per percorso; `extract` salva le pagine HTML come
+file, da usare come fixture dei benchmark o dei test di regressione.
+"""
+
+import argparse
+import re
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterator, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from session.recording import read_archive
+from tools.accesslog_report import percentiles
+
+
+def exchanges(paths: List[str], match: Optional[str] = None) -> Iterator[dict]:
+    for path in paths:
+        for entry in read_archive(Path(path)):
+            if entry.get("type") != "exchange":
+                continue
+            if match and match not in entry["url"]:
+                continue
+            yield entry
+
+
+def body_size(entry: dict) -> int:
+    if "body_b64" in entry:
+        return len(entry["body_b64"]) * 3 // 4
+    return len((entry.get("body") or "").encode("utf-8"))
+
+
+def fixture_name(entry: dict) -> str:
+    """Nome file leggibile: sequenza, pagina e id del topic se presente."""
+    parts = urlsplit(entry["url"])
+    page = Path(parts.path).stem or "index"
+    query = parse_qs(parts.query)
+    ident = (query.get("t") or query.get("mode") or query.get("keywords") or [""])[0]
+    ident = re.sub(r"[^A-Za-z0-9]+", "_", ident)[:40].strip("_")
+    return f"{entry['seq']:05d}-{page}{'-' + ident if ident else ''}.html"
+
+
+def cmd_list(args) -> int:
+    by_path = defaultdict(list)
+    for e in exchanges(args.archives, args.match):
+        status = e.get("status", e.get("error"))
+        print(f"{e['seq']:>6} {e['t']:>9.2f}s {e['method']:<5} {status!s:<16} "
+              f"{body_size(e):>9} B {e['elapsed'] * 1000:>8.1f} ms  {e['url']}")
+        by_path[f"{e['method']} {urlsplit(e['url']).path}"].append(e["elapsed"] * 1000)
+    if by_path:
+        print(f"\n{'request':<40} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for name, values in sorted(by_path.items(), key=lambda kv: -len(kv[1])):
+            p = percentiles(values)
+            print(f"{name:<40} {p['count']:>6} {p['p50']:>9.1f} {p['p95']:>9.1f} {p['max']:>9.1f}")
+    return 0
+
+
+def cmd_extract(args) -> int:
+    out = Path(args.output)
+    out.mkdir(parents=True, exist_ok=True)
+    written = 0
+    for e in exchanges(args.archives, args.match):
+        if e.get("status") != 200 or "body" not in e:
+            continue
+        content_type = dict((k.lower(), v) for k, v in e.get("headers", [])).get("content-type", "")
+        if "html" not in content_type:
+            continue
+        (out / fixture_name(e)).write_text(e["body"], encoding="utf-8")
+        written += 1
+    print(f"{written} pages written to {out}", file=sys.stderr)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect recorded upstream traffic archives")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_list = sub.add_parser("list", help="list the recorded exchanges")
+    p_list.add_argument("archives", nargs="+", help="recording archives (.jsonl.gz)")
+    p_list.add_argument("--match", help="only URLs containing this string")
+    p_list.set_defaults(func=cmd_list)
+
+    p_extract = sub.add_parser("extract", help="write the recorded HTML pages as fixture files")
+    p_extract.add_argument("archives", nargs="+", help="recording archives (.jsonl.gz)")
+    p_extract.add_argument("output", help="output directory")
+    p_extract.add_argument("--match", help="only URLs containing this string")
+    p_extract.set_defaults(func=cmd_extract)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""Access log strutturato (JSON lines) delle richieste Torznab.
+
+Una riga per richiesta, costruita dalla traccia conclusa: sito, tipo di
+richiesta, query, risultati, stato cache, richieste upstream e tempi per
+stadio. La scrittura avviene in un thread dedicato (QueueListener) su un
+file a rotazione, quindi il thread della richiesta
+non tocca mai il disco. Il formato è letto da `tools/accesslog_report.py`.
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from store.persist import register_flush, unregister_flush
+
+from . import tracing
+
+logger = logging.getLogger("torznab.accesslog")
+
+# Parametri della richiesta riportati nel log (mai l'apikey)
+LOGGED_PARAMS = ("t", "q", "cat", "season", "ep", "topic_id")
+
+
+def trace_to_record(trace: tracing.Trace) -> Dict[str, Any]:
+    """Riga di access log per una traccia conclusa."""
+    attrs = dict(trace.attrs)
+    record = {
+        "ts": datetime.fromtimestamp(trace.started_at, timezone.utc).isoformat(timespec="milliseconds"),
+        "request_id": trace.request_id,
+        "site": trace.site,
+        "endpoint": trace.endpoint,
+        "status": trace.status,
+        "duration_ms": trace.duration_ms,
+    }
+    for key in LOGGED_PARAMS:
+        if trace.params.get(key):
+            record[key] = trace.params[key]
+    record.update({
+        "results": attrs.pop("results", None),
+        "cache": attrs.pop("cache", None),
+        "upstream_requests": attrs.pop("upstream_requests", 0),
+        "upstream_bytes": attrs.pop("upstream_bytes", 0),
+        "cf_solves": attrs.pop("cf_solves", 0),
+    })
+    record.update(attrs)
+    record["stages"] = trace.stage_totals()
+    return record
+
+
+class AccessLog:
+    """Scrive le tracce concluse come JSON lines su file a rotazione, in background."""
+
+    def __init__(self, path: Path, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            self.path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        self._file_handler = file_handler
+        # Coda limitata: se il disco non tiene il passo si perdono righe, non richieste
+        self._queue: queue.Queue = queue.Queue(maxsize=10000)
+        self._listener = logging.handlers.QueueListener(self._queue, file_handler)
+        self._listener.start()
+        self.dropped = 0
+        tracing.add_listener(self.write)
+        register_flush(self)
+        logger.info(f"Access log: {self.path}")
+
+    def write(self, trace: tracing.Trace):
+        line = json.dumps(trace_to_record(trace), ensure_ascii=False, default=str)
+        try:
+            self._queue.put_nowait(logging.makeLogRecord({"msg": line}))
+        except queue.Full:
+            self.dropped += 1
+
+    def due(self, now: float) -> bool:
+        return False
+
+    def flush(self, timeout: float = 2.0):
+        """Attende che il thread di scrittura svuoti la coda (shutdown)."""
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self._file_handler.flush()
+
+    def close(self):
+        tracing.remove_listener(self.write)
+        unregister_flush(self)
+        self._listener.stop()
+        self._file_handler.close()
+
+
+_access_log: Optional[AccessLog] = None
+
+
+def enable_access_log(data_dir: Path, max_mb: int = 10, backups: int = 5,
+                      per_process: bool = False) -> AccessLog:
+    """Attiva l'access log in `data_dir`; `per_process` usa un file per processo (prefork)."""
+    global _access_log
+    name = f"access.{os.getpid()}.jsonl" if per_process else "access.jsonl"
+    _access_log = AccessLog(Path(data_dir) / name, max_bytes=max_mb * 1024 * 1024, backup_count=backups)
+    return _access_log
+
+
+def hot_queries(data_dir: Path, site: str, kinds: Iterable[str], limit: int = 20,
+                max_age: float = 86400) -> List[Dict[str, str]]:
+    """Parametri Torznab delle ricerche più frequenti di `site` nell'access log recente.
+
+    Legge anche i file ruotati e quelli per worker; serve al warm-up per
+    riempire le cache con le query che i client ripeteranno per prime.
+    """
+    kinds = set(kinds)
+    cutoff = time.time() - max_age
+    counts: Counter = Counter()
+    for path in sorted(Path(data_dir).glob("access*.jsonl*")):
+        try:
+            if path.stat().st_mtime < cutoff:
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        if (record.get("site") != site or record.get("endpoint") != "api"
+                                or record.get("status") != 200 or record.get("t") not in kinds
+                                or datetime.fromisoformat(record["ts"]).timestamp() < cutoff):
+                            continue
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    counts[tuple((k, record[k]) for k in LOGGED_PARAMS if record.get(k))] += 1
+        except OSError as e:
+            logger.debug(f"Cannot read {path}: {e}")
+    return [dict(params) for params, _ in counts.most_common(limit)]
@@ -0,0 +1,103 @@
+"""Interfaccia asincrona dei siti e adapter per servirli dalle route Flask."""
+
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from .models import TorznabResult
+from .server import BaseSite
+
+
+class AsyncBaseSite(ABC):
+    """Interfaccia asincrona che un sito nativo async deve implementare."""
+
+    @abstractmethod
+    async def search(self, query: str, categories: Optional[List[int]],
+                     target_season: Optional[int], target_episode: Optional[int]) -> List[TorznabResult]:
+        """Ricerca contenuti. Ritorna lista di TorznabResult."""
+
+    @abstractmethod
+    async def download(self, topic_id: str, infohash: Optional[str],
+                       season: Optional[int], episode: Optional[int]) -> Optional[str]:
+        """Ritorna magnet URI o None."""
+
+    @abstractmethod
+    def get_capabilities_xml(self) -> str:
+        """Ritorna XML capabilities per questo sito."""
+
+    @abstractmethod
+    def health_info(self) -> dict:
+        """Ritorna info di stato per health check."""
+
+    async def close(self):
+        """Rilascia le risorse del sito quando viene rimosso."""
+
+    def memory_info(self) -> dict:
+        return {}
+
+    async def warm_up(self) -> dict:
+        """Prepara il sito prima del traffico; solleva se non è pronto."""
+        return {}
+
+    def parse_season_from_query(self, query: str) -> Optional[int]:
+        return None
+
+    def parse_episode_from_query(self, query: str) -> Optional[int]:
+        return None
+
+
+class _BackgroundLoop:
+    """Event loop in un thread dedicato, per chiamare coroutine da codice sync."""
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def run(self, coro):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever,
+                                 name="async-sites", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+
+_background_loop = _BackgroundLoop()
+
+
+class BlockingSiteAdapter(BaseSite):
+    """Espone un AsyncBaseSite come BaseSite sync (server Flask threaded)."""
+
+    def __init__(self, async_site: AsyncBaseSite):
+        self.async_site = async_site
+
+    def search(self, query, categories, target_season, target_episode):
+        return _background_loop.run(
+            self.async_site.search(query, categories, target_season, target_episode))
+
+    def download(self, topic_id, infohash, season, episode):
+        return _background_loop.run(
+            self.async_site.download(topic_id, infohash, season, episode))
+
+    def get_capabilities_xml(self) -> str:
+        return self.async_site.get_capabilities_xml()
+
+    def health_info(self) -> dict:
+        return self.async_site.health_info()
+
+    def memory_info(self) -> dict:
+        return self.async_site.memory_info()
+
+    def warm_up(self) -> dict:
+        return _background_loop.run(self.async_site.warm_up())
+
+    def close(self):
+        _background_loop.run(self.async_site.close())
+
+    def parse_season_from_query(self, query: str) -> Optional[int]:
+        return self.async_site.parse_season_from_query(query)
+
+    def parse_episode_from_query(self, query: str) -> Optional[int]:
+        return self.async_site.parse_episode_from_query(query)
+
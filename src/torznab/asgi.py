@@ -0,0 +1,227 @@
+"""Entry point ASGI: bridge verso l'app Flask, con gli stream SSE sull'event loop.
+
+Tutte le route (Torznab, /health, /ready, admin, /metrics, debug) sono
+quelle di Flask, eseguite in un thread pool tramite un bridge WSGI: stessi
+handler, tracing, metriche e gestione degli errori del server threaded.
+Sull'event loop restano solo gli stream SSE di log e performance, che
+così non occupano un thread per client.
+
+Le route dei siti (/{site}/api, /{site}/download) hanno un pool dedicato:
+una raffica di ricerche bloccate in un solve CF non lascia senza thread
+admin, /health e /metrics. I siti sono sync, quindi ogni ricerca occupa
+comunque un thread: finché non esiste una sessione async la modalità ASGI
+non dà più concorrenza del server threaded (che anzi non ha un tetto di
+thread), solo meno thread per le connessioni SSE.
+"""
+
+import io
+import json
+import asyncio
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from .server import TorznabServer
+from .perf import perf
+
+logger = logging.getLogger("torznab.asgi")
+
+# Route dei siti e tutto il resto in pool separati
+SITE_WORKERS = 32
+BRIDGE_WORKERS = 8
+
+
+class TorznabASGI:
+    """App ASGI che serve un TorznabServer: SSE native, il resto via bridge WSGI."""
+
+    def __init__(self, server: TorznabServer, log_handler=None,
+                 site_workers: int = SITE_WORKERS, bridge_workers: int = BRIDGE_WORKERS):
+        self.server = server
+        self.log_handler = log_handler
+        self.site_executor = ThreadPoolExecutor(max_workers=site_workers, thread_name_prefix="asgi-site")
+        self.bridge_executor = ThreadPoolExecutor(max_workers=bridge_workers,
+                                                  thread_name_prefix="asgi-bridge")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        path = scope["path"]
+        parts = path.strip("/").split("/")
+
+        if path == "/admin/api/logs" and self.log_handler is not None:
+            await self._logs_sse(receive, send)
+        elif path == "/admin/api/perf":
+            await self._perf_sse(receive, send)
+        elif len(parts) == 2 and parts[1] in ("api", "download") and parts[0] in self.server.sites:
+            await self._wsgi_bridge(scope, receive, send, self.site_executor)
+        else:
+            await self._wsgi_bridge(scope, receive, send, self.bridge_executor)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.site_executor.shutdown(wait=False)
+                self.bridge_executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # --- Stream SSE ---
+
+    async def _logs_sse(self, receive, send):
+        """Stream SSE dei log senza occupare un thread per ogni client."""
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        q = self.log_handler.subscribe()
+        try:
+            recent = self.log_handler.get_recent(100)
+            if recent:
+                await send({"type": "http.response.body",
+                            "body": f"data: {json.dumps(recent)}\n\n".encode(), "more_body": True})
+            idle = 0.0
+            while not disconnected.is_set():
+                batch = []
+                while not q.empty():
+                    batch.append(q.get_nowait())
+                if batch:
+                    idle = 0.0
+                    chunk = f"data: {json.dumps(batch)}\n\n"
+                elif idle >= 30:
+                    idle = 0.0
+                    chunk = ": keepalive\n\n"
+                else:
+                    await asyncio.sleep(0.5)
+                    idle += 0.5
+                    continue
+                await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+        except OSError:
+            pass
+        finally:
+            watcher.cancel()
+            self.log_handler.unsubscribe(q)
+
+    async def _perf_sse(self, receive, send, interval: float = 2.0):
+        """Stream SSE delle statistiche di performance (vedi admin /admin/api/perf)."""
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        try:
+            while not disconnected.is_set():
+                data = await asyncio.get_running_loop().run_in_executor(
+                    self.bridge_executor, perf.snapshot, self.server.sites)
+                await send({"type": "http.response.body",
+                            "body": f"data: {json.dumps(data)}\n\n".encode(), "more_body": True})
+                try:
+                    await asyncio.wait_for(disconnected.wait(), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+        except OSError:
+            pass
+        finally:
+            watcher.cancel()
+
+    # --- Bridge verso Flask ---
+
+    async def _wsgi_bridge(self, scope, receive, send, executor: ThreadPoolExecutor):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        environ = _build_environ(scope, body)
+        loop = asyncio.get_running_loop()
+        status, headers, content = await loop.run_in_executor(
+            executor, _run_wsgi, self.server.app, environ)
+
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]})
+        await send({"type": "http.response.body", "body": content})
+
+
+def _header(scope, name: bytes):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _build_environ(scope, body: bytes) -> dict:
+    host = _header(scope, b"host") or "localhost"
+    server = scope.get("server") or (host.split(":")[0], 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for key, value in scope.get("headers", []):
+        name = key.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            http_key = f"HTTP_{name}"
+            environ[http_key] = f"{environ[http_key]},{value}" if http_key in environ else value
+    return environ
+
+
+def _run_wsgi(app, environ):
+    captured = {}
+
+    def start_response(status, headers, exc_info=None):
+        captured["status"] = int(status.split(" ", 1)[0])
+        captured["headers"] = headers
+
+    result = app(environ, start_response)
+    try:
+        content = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return captured["status"], captured["headers"], content
+
+
+def create_asgi_app(server: TorznabServer, log_handler=None) -> TorznabASGI:
+    """Crea l'app ASGI per un TorznabServer già configurato."""
+    return TorznabASGI(server, log_handler)
@@ -0,0 +1,277 @@
+"""Metriche in formato Prometheus: latenze per stadio, byte, risultati, errori.
+
+Registro minimale senza dipendenze esterne (contatori e istogrammi con
+label). Il sito corrente è tenuto in un ContextVar impostato dal server
+all'inizio di ogni richiesta, così sessione, parser e sito possono
+registrare i propri stadi senza conoscere il nome con cui sono montati.
+
+In modalità prefork ogni worker pubblica periodicamente il proprio
+snapshot nello store condiviso e /metrics restituisce la somma di tutti.
+"""
+
+import os
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import tracing
+from .profiling import register_idle_thread
+
+logger = logging.getLogger("torznab.metrics")
+
+# Sito della richiesta in corso ("-" per job in background)
+current_site: ContextVar[str] = ContextVar("current_site", default="-")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels_text(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Contatore monotono con label."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> Dict[tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+    def render(self, values: Dict[tuple, float]) -> List[str]:
+        return [f"{self.name}{_labels_text(self.labelnames, key)} {_fmt(v)}"
+                for key, v in sorted(values.items())]
+
+
+class Histogram:
+    """Istogramma a bucket cumulativi con label."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # label -> [conteggi per bucket (+Inf in coda), somma]
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][i] += 1
+            entry[1] += value
+
+    def snapshot(self) -> Dict[tuple, list]:
+        with self._lock:
+            return {k: [list(counts), total] for k, (counts, total) in self._values.items()}
+
+    @staticmethod
+    def merge(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1]]
+
+    def render(self, values: Dict[tuple, list]) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _fmt(bound)
+                labels = _labels_text(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labelnames, key)} {_fmt(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels_text(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Insieme delle metriche esportate da /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help, labelnames, buckets))
+
+    def snapshot(self) -> dict:
+        """Valori correnti serializzabili in JSON (per la somma fra worker)."""
+        return {name: [[list(k), v] for k, v in m.snapshot().items()]
+                for name, m in self._metrics.items()}
+
+    def render(self, snapshots: Optional[List[dict]] = None) -> str:
+        """Testo in formato di esposizione Prometheus; somma gli snapshot dati."""
+        if snapshots is None:
+            snapshots = [self.snapshot()]
+        lines = []
+        for name, metric in self._metrics.items():
+            merged: Dict[tuple, object] = {}
+            for snap in snapshots:
+                for key, value in snap.get(name, []):
+                    key = tuple(key)
+                    merged[key] = metric.merge(merged[key], value) if key in merged else value
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(merged))
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "torznab_stage_duration_seconds",
+    "Duration of each stage of request handling (search request, fallback stages, "
+    "thread fetch, thanks click, CF solve, HTML parse, ranking, XML render)",
+    ("site", "stage"))
+REQUESTS = metrics.counter(
+    "torznab_requests_total", "Torznab requests by endpoint and HTTP status",
+    ("site", "endpoint", "status"))
+FETCHED_BYTES = metrics.counter(
+    "torznab_fetched_bytes_total", "Response bytes fetched from the upstream site", ("site",))
+SEARCH_RESULTS = metrics.histogram(
+    "torznab_search_results", "Number of results returned per search", ("site",), COUNT_BUCKETS)
+ERRORS = metrics.counter(
+    "torznab_errors_total", "Errors by type", ("site", "type"))
+
+
+@contextmanager
+def site_context(site_name: str):
+    """Attribuisce al sito `site_name` le metriche registrate nel blocco."""
+    token = current_site.set(site_name)
+    try:
+        yield
+    finally:
+        current_site.reset(token)
+
+
+@contextmanager
+def timed(stage: str, **attrs):
+    """Misura la durata del blocco come stadio `stage` del sito corrente.
+
+    Se è attiva una traccia il blocco diventa anche uno span (con `attrs`).
+    """
+    started = time.perf_counter()
+    try:
+        with tracing.span(stage, **attrs):
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, site=current_site.get(), stage=stage)
+
+
+def observe_stage(stage: str, seconds: float, **attrs):
+    """Come timed(), per durate misurate a mano (es. su più rami di return)."""
+    STAGE_SECONDS.observe(seconds, site=current_site.get(), stage=stage)
+    tracing.add_span(stage, seconds, **attrs)
+
+
+def count_error(error_type: str):
+    ERRORS.inc(site=current_site.get(), type=error_type)
+
+
+def count_bytes(amount: int):
+    FETCHED_BYTES.inc(amount, site=current_site.get())
+
+
+# --- Aggregazione fra worker prefork ---
+
+_KEY_PREFIX = "metrics:worker:"
+
+
+class MetricsPublisher:
+    """Pubblica lo snapshot di questo processo nello store condiviso."""
+
+    def __init__(self, store, interval: float = 5.0):
+        self.store = store
+        self.interval = interval
+        self.key = f"{_KEY_PREFIX}{os.getpid()}"
+        register_idle_thread("metrics-publish")
+        thread = threading.Thread(target=self._loop, name="metrics-publish", daemon=True)
+        thread.start()
+
+    def publish(self):
+        # Il TTL fa sparire da solo i worker morti
+        self.store.set(self.key, metrics.snapshot(), ttl=self.interval * 6)
+        self.store.sadd(f"{_KEY_PREFIX}pids", self.key)
+
+    def collect(self) -> List[dict]:
+        """Snapshot di tutti i worker vivi (questo incluso, aggiornato ora)."""
+        self.publish()
+        snapshots = []
+        expired = []
+        for key in self.store.smembers(f"{_KEY_PREFIX}pids"):
+            snap = self.store.get(key)
+            if snap is not None:
+                snapshots.append(snap)
+            else:
+                expired.append(key)
+        # Worker morti (o riavviati con un altro pid): fuori dall'insieme
+        if expired:
+            self.store.srem(f"{_KEY_PREFIX}pids", *expired)
+        return snapshots
+
+    def _loop(self):
+        while True:
+            try:
+                self.publish()
+            except Exception as e:
+                logger.debug(f"Metrics publish failed: {e}")
+            time.sleep(self.interval)
+
+
+_publisher: Optional[MetricsPublisher] = None
+
+
+def enable_shared_metrics(store, interval: float = 5.0):
+    """Prefork: somma in /metrics gli snapshot di tutti i worker."""
+    global _publisher
+    _publisher = MetricsPublisher(store, interval)
+
+
+def render_metrics() -> str:
+    if _publisher is not None:
+        try:
+            return metrics.render(_publisher.collect())
+        except Exception as e:
+            logger.warning(f"Failed to collect worker metrics: {e}")
+    return metrics.render()
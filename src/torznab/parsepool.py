@@ -0,0 +1,107 @@
+"""Parsing HTML fuori dal GIL: pool di processi con routing per dimensione.
+
+Il parsing di pagine grandi (BeautifulSoup/lxml) tiene il GIL per decine di
+millisecondi e blocca tutti gli altri thread del server. Le pagine sopra
+soglia vengono passate come testo a un processo del pool, che ritorna solo
+record compatti; quelle piccole restano inline, dove il costo di IPC
+supererebbe il guadagno.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable
+
+from .metrics import count_error, timed
+
+logger = logging.getLogger("torznab.parsepool")
+
+
+class ParsePool:
+    """Esegue funzioni di estrazione `fn(html, *args)` inline o nel pool.
+
+    `fn` deve essere una funzione a livello di modulo e ritornare dati
+    serializzabili. Con `workers=0` tutto resta inline.
+    """
+
+    def __init__(self, workers: int = 0, inline_max_bytes: int = 64 * 1024):
+        self.workers = workers
+        self.inline_max_bytes = inline_max_bytes
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.inline_count = 0
+        self.offloaded_count = 0
+        self.fallback_count = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # forkserver/spawn: niente fork di un processo con thread attivi
+                methods = multiprocessing.get_all_start_methods()
+                ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+                logger.info(f"Parse pool started with {self.workers} processes")
+            return self._executor
+
+    def run(self, fn: Callable, html: str, *args):
+        """Esegue `fn(html, *args)`, nel pool se la pagina supera la soglia."""
+        with timed("html_parse"):
+            return self._run(fn, html, *args)
+
+    def _run(self, fn: Callable, html: str, *args):
+        if self.workers <= 0 or len(html) < self.inline_max_bytes:
+            self._count("inline_count")
+            return fn(html, *args)
+
+        try:
+            result = self._get_executor().submit(fn, html, *args).result()
+            self._count("offloaded_count")
+            return result
+        except BrokenProcessPool as e:
+            logger.error(f"Parse pool broken ({e}), restarting and parsing inline")
+            with self._lock:
+                self._executor = None
+            self._count("fallback_count")
+            count_error("parse_pool_broken")
+            return fn(html, *args)
+
+    def _count(self, attr: str):
+        with self._stats_lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "inline_max_bytes": self.inline_max_bytes,
+                "inline": self.inline_count,
+                "offloaded": self.offloaded_count,
+                "fallbacks": self.fallback_count,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Pool condiviso fra i siti; main.py lo configura da PARSE_WORKERS
+_default_pool = None
+
+
+def get_parse_pool() -> ParsePool:
+    """Ritorna il pool di parsing condiviso (inline se non configurato)."""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = ParsePool()
+    return _default_pool
+
+
+def set_parse_pool(pool: ParsePool):
+    """Imposta il pool di parsing condiviso."""
+    global _default_pool
+    _default_pool = pool
@@ -0,0 +1,128 @@
+"""Statistiche di performance su finestra mobile per la dashboard admin.
+
+A differenza di /metrics (contatori cumulativi per Prometheus) qui si
+tengono i campioni degli ultimi minuti, per mostrare percentili e tassi
+correnti senza un sistema di monitoraggio esterno.
+"""
+
+import time
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Optional
+
+from .metrics import current_site
+
+
+class RollingWindow:
+    """Campioni (istante, valore) degli ultimi `window` secondi."""
+
+    MAX_SAMPLES = 5000
+
+    def __init__(self, window: float = 300.0):
+        self.window = window
+        self._samples: deque = deque(maxlen=self.MAX_SAMPLES)
+        self._lock = threading.Lock()
+
+    def add(self, value: float = 1.0):
+        with self._lock:
+            self._samples.append((time.monotonic(), value))
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            return [v for _, v in self._samples]
+
+    def summary(self, percentiles: bool = True) -> dict:
+        """Conteggio e tasso; con `percentiles` anche p50/p95/p99 dei valori (in ms)."""
+        values = sorted(self._recent())
+        count = len(values)
+        data = {"count": count, "rate_per_min": round(count * 60 / self.window, 2)}
+        if not percentiles:
+            return data
+        for p in (50, 95, 99):
+            data[f"p{p}"] = round(values[min(count - 1, int(count * p / 100))] * 1000, 1) if count else None
+        return data
+
+    def count(self) -> int:
+        return len(self._recent())
+
+
+class PerfTracker:
+    """Latenze, richieste in corso, richieste upstream e hit ratio delle cache per sito."""
+
+    def __init__(self, window: float = 300.0):
+        self.window = window
+        self._latency: Dict[tuple, RollingWindow] = {}
+        self._upstream: Dict[str, RollingWindow] = {}
+        self._cache: Dict[tuple, Dict[bool, RollingWindow]] = {}
+        self._inflight: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _window(self, table: dict, key) -> RollingWindow:
+        with self._lock:
+            w = table.get(key)
+            if w is None:
+                w = table[key] = RollingWindow(self.window)
+            return w
+
+    # --- Registrazione ---
+
+    def request_started(self, site: str):
+        with self._lock:
+            self._inflight[site] += 1
+
+    def request_finished(self, site: str, kind: Optional[str], seconds: float):
+        with self._lock:
+            self._inflight[site] -= 1
+        if kind:
+            self._window(self._latency, (site, kind)).add(seconds)
+
+    def upstream_request(self):
+        self._window(self._upstream, current_site.get()).add()
+
+    def cache_lookup(self, cache: str, hit: bool):
+        key = (current_site.get(), cache)
+        with self._lock:
+            pair = self._cache.get(key)
+            if pair is None:
+                pair = self._cache[key] = {True: RollingWindow(self.window), False: RollingWindow(self.window)}
+        pair[hit].add()
+
+    # --- Lettura ---
+
+    def site_summary(self, site: str) -> dict:
+        with self._lock:
+            inflight = self._inflight.get(site, 0)
+            latency = {kind: w for (s, kind), w in self._latency.items() if s == site}
+            caches = {cache: pair for (s, cache), pair in self._cache.items() if s == site}
+            upstream = self._upstream.get(site)
+
+        cache_stats = {}
+        for cache, pair in caches.items():
+            hits, misses = pair[True].count(), pair[False].count()
+            total = hits + misses
+            cache_stats[cache] = {"hits": hits, "misses": misses,
+                                  "ratio": round(hits / total, 3) if total else None}
+        return {
+            "inflight": inflight,
+            "latency": {kind: w.summary() for kind, w in latency.items()},
+            "upstream": upstream.summary(percentiles=False) if upstream else {"count": 0, "rate_per_min": 0.0},
+            "cache": cache_stats,
+        }
+
+    def snapshot(self, sites: dict) -> dict:
+        """Stato di tutti i siti attivi, con le info specifiche di ciascun sito."""
+        data = {"timestamp": time.time(), "window_seconds": self.window, "sites": {}}
+        for name, site in list(sites.items()):
+            summary = self.site_summary(name)
+            try:
+                summary.update(site.perf_info())
+            except Exception as e:
+                summary["error"] = str(e)
+            data["sites"][name] = summary
+        return data
+
+
+perf = PerfTracker()
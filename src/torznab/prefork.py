@@ -0,0 +1,104 @@
+"""Server pre-fork: un socket in ascolto condiviso da N processi worker.
+
+Il processo padre apre il socket e forka i worker; ogni worker costruisce
+la propria app (siti, sessioni, pool HTTP) dopo il fork e serve richieste
+con un server WSGI threaded sul socket ereditato. Lo stato che deve essere
+coerente fra worker (cookie, login, thanks, cache) passa dallo store
+condiviso. Il padre rilancia i worker che terminano e inoltra i segnali.
+"""
+
+import os
+import time
+import signal
+import socket
+import logging
+from typing import Callable, Dict
+
+from werkzeug.serving import make_server
+
+from store.persist import flush_all
+
+logger = logging.getLogger("torznab.prefork")
+
+
+class PreforkServer:
+    """Supervisore dei processi worker (solo POSIX)."""
+
+    RESPAWN_DELAY = 1.0
+
+    def __init__(self, host: str, port: int, workers: int, build_app: Callable):
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.build_app = build_app
+        self.children: Dict[int, int] = {}  # pid -> slot
+        self.stopping = False
+        self.sock = None
+
+    def serve_forever(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(128)
+        self.sock.set_inheritable(True)
+
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+
+        logger.info(f"Pre-fork server on {self.host}:{self.port} with {self.workers} workers")
+        for slot in range(self.workers):
+            self._spawn(slot)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = self.children.pop(pid, None)
+            if slot is None or self.stopping:
+                continue
+            logger.warning(f"Worker {pid} exited (status {status}), respawning")
+            time.sleep(self.RESPAWN_DELAY)
+            self._spawn(slot)
+
+        self.sock.close()
+        logger.info("Pre-fork server stopped")
+
+    def _spawn(self, slot: int):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = slot
+            return
+        # --- Processo worker ---
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, _exit_worker)
+            signal.signal(signal.SIGINT, _exit_worker)
+            app = self.build_app()
+            server = make_server(self.host, self.port, app, threaded=True, fd=self.sock.fileno())
+            logger.info(f"Worker {slot} ready (pid {os.getpid()})")
+            server.serve_forever()
+        except Exception as e:
+            logger.exception(f"Worker {slot} crashed: {e}")
+            code = 1
+        finally:
+            # os._exit salta atexit: scrivi qui cookie e journal pendenti
+            flush_all()
+            os._exit(code)
+
+    def _on_signal(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info(f"Received signal {signum}, stopping {len(self.children)} workers")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def _exit_worker(signum, frame):
+    raise SystemExit(0)
@@ -0,0 +1,341 @@
+"""Diagnostica in produzione: profiler a campionamento, snapshot di memoria, oggetti vivi.
+
+- `sample_stacks` campiona per un tempo limitato gli stack di tutti i
+  thread (`sys._current_frames`) e li aggrega nel formato "collapsed"
+  di flamegraph.pl / speedscope / inferno: `thread;f1;f2;f3 conteggio`.
+- `memory` gestisce tracemalloc: avvio, snapshot numerati (gli ultimi
+  `MAX_SNAPSHOTS`), allocazioni principali e differenze fra snapshot.
+- `live_objects` conta gli alberi BeautifulSoup ancora vivi, chi li
+  trattiene, i tipi più numerosi e gli oggetti in cache di ogni sito.
+
+Tutto è nel processo corrente: in modalità prefork ogni worker va
+interrogato separatamente.
+"""
+
+import gc
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:  # i siti possono non usare bs4
+    BeautifulSoup = None
+
+logger = logging.getLogger("torznab.profiling")
+
+_SRC_DIR = str(Path(__file__).resolve().parent.parent) + os.sep
+
+# Foglie di thread fermi in attesa (lock, condition, select, code): esclusi di default
+IDLE_LEAVES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"), ("queue.py", "get"), ("socket.py", "accept"),
+    ("connection.py", "wait"),
+}
+
+# Prefissi dei thread di background registrati con register_idle_thread
+_idle_threads: Set[str] = set()
+
+
+def register_idle_thread(name_prefix: str):
+    """Registra un thread di background il cui loop dorme in time.sleep.
+
+    time.sleep non ha un frame Python, quindi in foglia compare il loop
+    stesso: per i thread il cui nome inizia con `name_prefix` questi
+    campioni sono trattati come idle ed esclusi di default.
+    """
+    _idle_threads.add(name_prefix)
+
+
+# Limiti delle richieste di profiling
+MAX_PROFILE_SECONDS = 60.0
+MIN_INTERVAL = 0.001
+
+
+# --- Profiler a campionamento ---
+
+_labels: Dict[object, str] = {}
+_profile_lock = threading.Lock()
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_SRC_DIR):
+        return filename[len(_SRC_DIR):]
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+def _frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        name = getattr(code, "co_qualname", code.co_name)
+        label = f"{name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        _labels[code] = label
+    return label
+
+
+def _is_idle(frame, thread_name: str) -> bool:
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+        return True
+    if not any(thread_name.startswith(prefix) for prefix in _idle_threads):
+        return False
+    # Il loop registrato è in foglia solo se è fermo in una chiamata C (sleep)
+    caller = frame.f_back
+    return (caller is not None and caller.f_code.co_name == "run"
+            and os.path.basename(caller.f_code.co_filename) == "threading.py")
+
+
+def _thread_group(name: str) -> str:
+    # "ThreadPoolExecutor-0_3", "Thread-12 (process_request_thread)": un gruppo per famiglia
+    return re.sub(r"\d+", "#", name)
+
+
+class ProfilerBusy(RuntimeError):
+    """Un altro campionamento è già in corso."""
+
+
+def sample_stacks(seconds: float, interval: float = 0.01, include_idle: bool = False,
+                  thread_filter: Optional[str] = None) -> dict:
+    """Campiona gli stack di tutti i thread per `seconds` secondi ogni `interval`.
+
+    Ritorna i conteggi per stack collassato (radice = gruppo di thread) e
+    i conteggi per funzione foglia (tempo "self").
+    """
+    seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+    interval = max(MIN_INTERVAL, float(interval))
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running")
+    try:
+        me = threading.get_ident()
+        stacks: Counter = Counter()
+        leaves: Counter = Counter()
+        names: Dict[int, str] = {}
+        samples = 0
+        started = time.monotonic()
+        deadline = started + seconds
+        names_at = 0.0
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if now - names_at >= 1.0:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                names_at = now
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                name = names.get(ident, f"thread-{ident}")
+                if thread_filter and thread_filter not in name:
+                    continue
+                if not include_idle and _is_idle(frame, name):
+                    continue
+                labels = []
+                f = frame
+                while f is not None:
+                    labels.append(_frame_label(f.f_code))
+                    f = f.f_back
+                leaves[labels[0]] += 1
+                labels.append(_thread_group(name))
+                stacks[";".join(reversed(labels))] += 1
+            frame = f = None  # niente riferimenti ai frame fra un campione e l'altro
+            samples += 1
+            time.sleep(interval)
+        return {
+            "seconds": round(time.monotonic() - started, 3),
+            "interval": interval,
+            "samples": samples,
+            "stacks": stacks,
+            "leaves": leaves,
+        }
+    finally:
+        _profile_lock.release()
+
+
+def collapsed(stacks: Counter) -> str:
+    """Stack nel formato collapsed, dal più frequente."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+# --- tracemalloc ---
+
+class MemoryProfiler:
+    """Snapshot tracemalloc numerati, con top allocazioni e differenze."""
+
+    MAX_SNAPSHOTS = 5
+    GROUPS = ("lineno", "filename", "traceback")
+
+    def __init__(self):
+        self._snapshots: "OrderedDict[int, tracemalloc.Snapshot]" = OrderedDict()
+        self._taken_at: Dict[int, float] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def start(self, frames: int = 25) -> dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, min(int(frames), 100)))
+            logger.info(f"tracemalloc started ({tracemalloc.get_traceback_limit()} frames)")
+        return self.status()
+
+    def stop(self) -> dict:
+        with self._lock:
+            self._snapshots.clear()
+            self._taken_at.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc stopped")
+        return self.status()
+
+    def status(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        with self._lock:
+            snapshots = [{"id": i, "taken_at": self._taken_at[i]} for i in self._snapshots]
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else 0,
+            "traced_mb": round(current / 1048576, 2),
+            "peak_mb": round(peak / 1048576, 2),
+            "overhead_mb": round(tracemalloc.get_tracemalloc_memory() / 1048576, 2),
+            "snapshots": snapshots,
+        }
+
+    def take_snapshot(self) -> int:
+        """Nuovo snapshot (il più vecchio viene scartato oltre MAX_SNAPSHOTS)."""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = snapshot
+            self._taken_at[snapshot_id] = time.time()
+            while len(self._snapshots) > self.MAX_SNAPSHOTS:
+                old, _ = self._snapshots.popitem(last=False)
+                self._taken_at.pop(old, None)
+        return snapshot_id
+
+    def _get(self, snapshot_id: int) -> tracemalloc.Snapshot:
+        with self._lock:
+            snapshot = self._snapshots.get(snapshot_id)
+        if snapshot is None:
+            raise KeyError(f"snapshot {snapshot_id} not found")
+        return snapshot
+
+    @staticmethod
+    def _where(traceback: tracemalloc.Traceback, group: str):
+        frames = [f"{_short_path(f.filename)}:{f.lineno}" for f in traceback]
+        if group == "filename":
+            return _short_path(traceback[0].filename)
+        if group == "lineno":
+            return frames[0]
+        return frames  # traceback: dal frame più recente
+
+    def top(self, snapshot_id: int, group: str = "lineno", limit: int = 30) -> dict:
+        snapshot = self._get(snapshot_id)
+        stats = snapshot.statistics(group)
+        return {
+            "id": snapshot_id,
+            "group": group,
+            "total_mb": round(sum(s.size for s in stats) / 1048576, 2),
+            "top": [{"where": self._where(s.traceback, group), "size_kb": round(s.size / 1024, 1),
+                     "count": s.count} for s in stats[:limit]],
+        }
+
+    def diff(self, base_id: int, snapshot_id: int, group: str = "lineno", limit: int = 30) -> dict:
+        """Allocazioni cresciute (o calate) fra lo snapshot `base_id` e `snapshot_id`."""
+        stats = self._get(snapshot_id).compare_to(self._get(base_id), group)
+        return {
+            "base": base_id,
+            "id": snapshot_id,
+            "group": group,
+            "size_diff_mb": round(sum(s.size_diff for s in stats) / 1048576, 2),
+            "top": [{"where": self._where(s.traceback, group),
+                     "size_diff_kb": round(s.size_diff / 1024, 1), "count_diff": s.count_diff,
+                     "size_kb": round(s.size / 1024, 1), "count": s.count}
+                    for s in stats[:limit]],
+        }
+
+
+memory = MemoryProfiler()
+
+
+# --- Oggetti vivi ---
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _describe_holder(obj, ignore_ids) -> str:
+    """Chi trattiene un oggetto: frame, attributo di un'istanza o tipo del contenitore."""
+    if type(obj).__name__ == "frame":
+        return f"frame {_frame_label(obj.f_code)}"
+    if isinstance(obj, dict):
+        for owner in gc.get_referrers(obj):
+            if id(owner) not in ignore_ids and getattr(owner, "__dict__", None) is obj:
+                return f"{type(owner).__module__}.{type(owner).__qualname__}.__dict__"
+    return f"{type(obj).__module__}.{type(obj).__qualname__}"
+
+
+def _soup_holders(soups: List, limit: int = 50) -> Dict[str, int]:
+    holders: Counter = Counter()
+    me = sys._getframe()
+    ignore = {id(soups), id(me)}
+    for soup in soups[:limit]:
+        for ref in gc.get_referrers(soup):
+            if id(ref) in ignore:
+                continue
+            holder = _describe_holder(ref, ignore)
+            # I nodi dell'albero puntano alla radice: interessa chi la trattiene da fuori
+            if not holder.startswith("bs4."):
+                holders[holder] += 1
+    return dict(holders.most_common(20))
+
+
+def live_objects(sites: dict, collect: bool = True, top_types: int = 25) -> dict:
+    """Alberi BeautifulSoup vivi, tipi più numerosi e cache per sito."""
+    if collect:
+        gc.collect()
+    objects = gc.get_objects()
+    types = Counter(type(o).__qualname__ for o in objects)
+    soups = [o for o in objects if BeautifulSoup is not None and isinstance(o, BeautifulSoup)]
+    del objects
+    result = {
+        "rss_mb": _rss_mb(),
+        "gc": {"objects": sum(types.values()), "counts": gc.get_count(), "garbage": len(gc.garbage)},
+        "soups": {
+            "live": len(soups),
+            "tags": sum(len(s.find_all(True)) for s in soups[:200]),
+            "holders": _soup_holders(soups),
+        },
+        "types": dict(types.most_common(top_types)),
+        "sites": {},
+    }
+    del soups
+    for name, site in sites.items():
+        try:
+            result["sites"][name] = site.memory_info()
+        except Exception as e:
+            result["sites"][name] = {"error": str(e)}
+    return result
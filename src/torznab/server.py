@@ -1,15 +1,32 @@
 """Server Torznab generico multi-sito."""
 
+import time
 import logging
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from typing import Dict, List, Optional
 
 from flask import Flask, request, Response, jsonify
 
 from .models import TorznabResult
+from .metrics import REQUESTS, SEARCH_RESULTS, count_error, render_metrics, site_context, timed
+from . import tracing
+from .perf import perf
+from .warmup import WarmupManager
 
 logger = logging.getLogger("torznab")
 
+SEARCH_TYPES = ("search", "tvsearch", "movie", "music", "book")
+
+
+class SiteUnavailableError(Exception):
+    """Il sito non può rispondere ora (es. upstream giù, circuit breaker aperto)."""
+
+
+def unavailable_xml(error: Exception) -> str:
+    """Errore Torznab per un sito temporaneamente non disponibile."""
+    return f'<?xml version="1.0"?><error code="900" description="Site unavailable: {error}"/>'
+
 
 class BaseSite(ABC):
     """Interfaccia che ogni sito deve implementare."""
@@ -32,6 +49,25 @@ class BaseSite(ABC):
     def health_info(self) -> dict:
         """Ritorna info di stato per health check."""
 
+    def close(self):
+        """Rilascia le risorse del sito quando viene rimosso. Può essere sovrascritta."""
+
+    def perf_info(self) -> dict:
+        """Info aggiuntive per la dashboard performance (es. coda del solver). Può essere sovrascritta."""
+        return {}
+
+    def memory_info(self) -> dict:
+        """Oggetti in cache del sito per la diagnostica memoria. Può essere sovrascritta."""
+        return {}
+
+    def warm_up(self) -> dict:
+        """Prepara il sito prima del traffico (sessione, login); solleva se non è pronto.
+
+        Eseguita in background alla registrazione; il dict ritornato finisce
+        in /ready. Può essere sovrascritta.
+        """
+        return {}
+
     def parse_season_from_query(self, query: str) -> Optional[int]:
         """Estrae stagione dalla query. Può essere sovrascritta."""
         return None
@@ -41,6 +77,52 @@ class BaseSite(ABC):
         return None
 
 
+def _parse_int(value) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def parse_search_args(args, site: "BaseSite"):
+    """Estrae (query, categories, season, episode) dai parametri Torznab."""
+    query = args.get("q", "")
+    cat_str = args.get("cat", "")
+
+    target_season = _parse_int(args.get("season"))
+    target_episode = _parse_int(args.get("ep"))
+
+    # Fallback: parse from query
+    if target_season is None:
+        target_season = site.parse_season_from_query(query)
+    if target_episode is None:
+        target_episode = site.parse_episode_from_query(query)
+
+    # Parse categories
+    categories = None
+    if cat_str:
+        categories = [int(c) for c in cat_str.split(",") if c.isdigit()]
+
+    return query, categories, target_season, target_episode
+
+
+def render_search_xml(site_name: str, results: List[TorznabResult], host: str, host_url: str) -> str:
+    """Genera il feed RSS Torznab per i risultati di ricerca."""
+    download_base = f"http://{host}/{site_name}/download"
+    items = "".join(r.to_xml_item(download_base) for r in results)
+
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" xmlns:torznab="http://torznab.com/schemas/2015/feed">
+<channel>
+<title>{site_name}</title>
+<link>{host_url}</link>
+{items}
+</channel>
+</rss>'''
+
+
 class TorznabServer:
     """Server Torznab generico che gestisce più siti."""
 
@@ -48,10 +130,16 @@ class TorznabServer:
         self.app = Flask(__name__)
         self.api_key = api_key
         self.sites: Dict[str, BaseSite] = {}
+        # Warm-up in background dei siti registrati (configurato da main.py)
+        self.warmup = WarmupManager()
         self._register_global_routes()
 
     def register_site(self, name: str, site: BaseSite):
         """Registra un sito su /{name}/api e /{name}/download."""
+        from .aio import AsyncBaseSite, BlockingSiteAdapter
+        if isinstance(site, AsyncBaseSite):
+            # Plugin nativo async: le route Flask lo usano tramite adapter sync
+            site = BlockingSiteAdapter(site)
         self.sites[name] = site
 
         # Usa closure con default arg per catturare il valore corretto
@@ -82,13 +170,19 @@ class TorznabServer:
         )
 
         logger.info(f"Site '{name}' registered at /{name}/api")
+        self.warmup.start(name, site)
 
     def unregister_site(self, name: str):
         """Rimuove un sito e le sue routes."""
         if name not in self.sites:
             return
 
-        del self.sites[name]
+        site = self.sites.pop(name)
+        self.warmup.cancel(name)
+        try:
+            site.close()
+        except Exception as e:
+            logger.warning(f"Error closing site '{name}': {e}")
 
         # Rimuovi le rules dal URL map
         rules_to_remove = [
@@ -117,6 +211,37 @@ class TorznabServer:
                 "sites": list(self.sites.keys()),
             })
 
+        @self.app.route("/metrics")
+        def prometheus_metrics():
+            return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+        # Le tracce contengono query e parametri dei client: solo con API key
+        @self.app.route("/debug/traces")
+        def debug_traces():
+            err = self._check_api_key()
+            if err:
+                return err
+            return jsonify({
+                "slow_threshold_ms": tracing.ring.slow_ms,
+                "slow": [t.to_dict(spans=False) for t in tracing.ring.slow()],
+                "recent": [t.to_dict(spans=False) for t in tracing.ring.recent()],
+            })
+
+        @self.app.route("/debug/traces/<request_id>")
+        def debug_trace(request_id):
+            err = self._check_api_key()
+            if err:
+                return err
+            trace = tracing.ring.get(request_id)
+            if trace is None:
+                return jsonify({"error": "Trace not found"}), 404
+            return jsonify(trace.to_dict())
+
+        @self.app.route("/ready")
+        def ready():
+            body, status = self.readiness(request.args.get("site"))
+            return jsonify(body), status
+
         @self.app.route("/health")
         def health():
             sites_health = {}
@@ -128,6 +253,16 @@ class TorznabServer:
                 "sites": sites_health,
             })
 
+    def readiness(self, site_name: Optional[str] = None):
+        """Corpo e status di /ready: 200 se tutti i siti (o `site_name`) sono pronti, altrimenti 503."""
+        sites = self.warmup.status()
+        if site_name is not None:
+            if site_name not in sites:
+                return {"ready": False, "error": f"Unknown site: {site_name}"}, 404
+            sites = {site_name: sites[site_name]}
+        ready = all(s["ready"] for s in sites.values())
+        return {"ready": ready, "sites": sites}, 200 if ready else 503
+
     def _check_api_key(self):
         """Verifica API key. Ritorna Response di errore o None se OK."""
         if self.api_key and request.args.get("apikey") != self.api_key:
@@ -139,6 +274,33 @@ class TorznabServer:
 
     def _handle_api(self, site_name: str):
         """Dispatch caps/search per il sito specifico."""
+        kind = "search" if request.args.get("t") in SEARCH_TYPES else None
+        with site_context(site_name), self._trace(site_name, "api") as trace, self._inflight(site_name, kind):
+            response = self.app.make_response(self._api_response(site_name))
+            trace.status = response.status_code
+        REQUESTS.inc(site=site_name, endpoint="api", status=response.status_code)
+        response.headers["X-Request-ID"] = trace.request_id
+        return response
+
+    @staticmethod
+    @contextmanager
+    def _inflight(site_name: str, kind: Optional[str]):
+        """Conta la richiesta fra quelle in corso e ne registra la latenza."""
+        started = time.perf_counter()
+        perf.request_started(site_name)
+        try:
+            yield
+        finally:
+            perf.request_finished(site_name, kind, time.perf_counter() - started)
+
+    @staticmethod
+    def _trace(site_name: str, endpoint: str):
+        """Traccia della richiesta corrente (request id dal client se fornito)."""
+        params = {k: v for k, v in request.args.items() if k != "apikey"}
+        return tracing.trace_request(site_name, endpoint, params,
+                                     request_id=request.headers.get("X-Request-ID"))
+
+    def _api_response(self, site_name: str):
         err = self._check_api_key()
         if err:
             return err
@@ -149,7 +311,7 @@ class TorznabServer:
         if t == "caps":
             return Response(site.get_capabilities_xml(), mimetype="application/xml")
 
-        if t in ["search", "tvsearch", "movie", "music", "book"]:
+        if t in SEARCH_TYPES:
             return self._do_search(site, site_name)
 
         return Response(
@@ -159,80 +321,39 @@ class TorznabServer:
 
     def _do_search(self, site: BaseSite, site_name: str):
         """Gestisce ricerca Torznab."""
-        query = request.args.get("q", "")
-        cat_str = request.args.get("cat", "")
-
-        # Parse season/episode
-        target_season = None
-        target_episode = None
-
-        season_param = request.args.get("season")
-        ep_param = request.args.get("ep")
-
-        if season_param:
-            try:
-                target_season = int(season_param)
-            except (ValueError, TypeError):
-                pass
-        if ep_param:
-            try:
-                target_episode = int(ep_param)
-            except (ValueError, TypeError):
-                pass
-
-        # Fallback: parse from query
-        if target_season is None:
-            target_season = site.parse_season_from_query(query)
-        if target_episode is None:
-            target_episode = site.parse_episode_from_query(query)
-
-        # Parse categories
-        categories = None
-        if cat_str:
-            categories = [int(c) for c in cat_str.split(",") if c.isdigit()]
-
-        results = site.search(query, categories, target_season, target_episode)
-
-        # Genera XML
-        download_base = f"http://{request.host}/{site_name}/download"
-        items = ""
-        for r in results:
-            items += r.to_xml_item(download_base)
-
-        xml = f'''<?xml version="1.0" encoding="UTF-8"?>
-<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" xmlns:torznab="http://torznab.com/schemas/2015/feed">
-<channel>
-<title>{site_name}</title>
-<link>{request.host_url}</link>
-{items}
-</channel>
-</rss>'''
-
+        query, categories, target_season, target_episode = parse_search_args(request.args, site)
+
+        try:
+            with timed("search"):
+                results = site.search(query, categories, target_season, target_episode)
+        except SiteUnavailableError as e:
+            logger.warning(f"SEARCH [{site_name}] unavailable: {e}")
+            count_error("site_unavailable")
+            return Response(unavailable_xml(e), mimetype="application/xml", status=503)
+
+        SEARCH_RESULTS.observe(len(results), site=site_name)
+        tracing.annotate(results=len(results))
+        with timed("xml_render"):
+            xml = render_search_xml(site_name, results, request.host, request.host_url)
         return Response(xml, mimetype="application/rss+xml")
 
     def _handle_download(self, site_name: str):
         """Gestisce download per il sito specifico."""
+        with site_context(site_name), self._trace(site_name, "download") as trace, \
+                self._inflight(site_name, "download"):
+            response = self.app.make_response(self._download_response(site_name))
+            trace.status = response.status_code
+        REQUESTS.inc(site=site_name, endpoint="download", status=response.status_code)
+        response.headers["X-Request-ID"] = trace.request_id
+        return response
+
+    def _download_response(self, site_name: str):
         site = self.sites[site_name]
 
         topic_id = request.args.get("topic_id")
         infohash = request.args.get("infohash", "").upper() or None
-
-        season_param = request.args.get("season")
-        ep_param = request.args.get("ep")
-
-        target_season = None
-        target_episode = None
-
-        if season_param:
-            try:
-                target_season = int(season_param)
-            except (ValueError, TypeError):
-                pass
-        if ep_param:
-            try:
-                target_episode = int(ep_param)
-            except (ValueError, TypeError):
-                pass
+        target_season = _parse_int(request.args.get("season"))
+        target_episode = _parse_int(request.args.get("ep"))
 
         if not topic_id:
             return "Missing topic_id", 400
@@ -240,8 +361,15 @@ class TorznabServer:
         logger.info(f"DOWNLOAD [{site_name}]: topic={topic_id}, infohash={infohash or 'N/A'}, "
                     f"S{target_season}E{target_episode}")
 
-        magnet = site.download(topic_id, infohash, target_season, target_episode)
+        try:
+            with timed("download"):
+                magnet = site.download(topic_id, infohash, target_season, target_episode)
+        except SiteUnavailableError as e:
+            logger.warning(f"DOWNLOAD [{site_name}] unavailable: {e}")
+            count_error("site_unavailable")
+            return f"Site unavailable: {e}", 503
 
+        tracing.annotate(found=bool(magnet))
         if not magnet:
             return "Magnet not found", 404
 
@@ -251,7 +379,16 @@ class TorznabServer:
         """Debug endpoint per ispezionare un thread."""
         site = self.sites[site_name]
         if hasattr(site, "debug_thread"):
-            return jsonify(site.debug_thread(topic_id))
+            with site_context(site_name), self._trace(site_name, "thread") as trace:
+                try:
+                    data = site.debug_thread(topic_id)
+                except SiteUnavailableError as e:
+                    logger.warning(f"THREAD DEBUG [{site_name}] unavailable: {e}")
+                    count_error("site_unavailable")
+                    trace.status = 503
+                    return jsonify({"error": f"Site unavailable: {e}", "trace": trace.to_dict()}), 503
+            data["trace"] = trace.to_dict()
+            return jsonify(data)
         return jsonify({"error": "debug not supported"})
 
     def _handle_debug_search(self, site_name: str):
@@ -264,7 +401,15 @@ class TorznabServer:
         if cat_str:
             categories = [int(c) for c in cat_str.split(",") if c.isdigit()]
 
-        results = site.search(query, categories, None, None)
+        with site_context(site_name), self._trace(site_name, "debug-search") as trace:
+            try:
+                results = site.search(query, categories, None, None)
+            except SiteUnavailableError as e:
+                logger.warning(f"DEBUG SEARCH [{site_name}] unavailable: {e}")
+                count_error("site_unavailable")
+                trace.status = 503
+                return jsonify({"query": query, "error": f"Site unavailable: {e}",
+                                "trace": trace.to_dict()}), 503
 
         # Import parser for scoring (only MIRCrew sites have it)
         scored_results = []
@@ -285,4 +430,5 @@ class TorznabServer:
             "query": query,
             "result_count": len(results),
             "results": scored_results,
+            "trace": trace.to_dict(),
         })
@@ -0,0 +1,255 @@
+"""Tracing per richiesta: request id e span annidati in un ring in memoria.
+
+Ogni richiesta Torznab apre una traccia con un request id (preso
+dall'header X-Request-ID se presente). Gli stadi misurati con
+`metrics.timed()` diventano span figli dello span corrente, così ricerca,
+fallback, thread, solve Byparr e parsing di una richiesta restano
+correlati anche con più richieste concorrenti. Le tracce concluse
+finiscono in un ring limitato; quelle più lente di una soglia vengono
+conservate a parte e segnalate nei log.
+
+Il request id è aggiunto anche ai record di log (`%(request_tag)s`).
+"""
+
+import re
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("torznab.tracing")
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[int]] = ContextVar("current_span", default=None)
+
+
+class Trace:
+    """Traccia di una richiesta: metadati e lista piatta di span con parent."""
+
+    MAX_SPANS = 500
+
+    def __init__(self, request_id: str, site: str, endpoint: str, params: Dict[str, Any]):
+        self.request_id = request_id
+        self.site = site
+        self.endpoint = endpoint
+        self.params = params
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status = None
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+        # Attributi della richiesta (es. risultati, stato cache, richieste upstream)
+        self.attrs: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def offset_ms(self, t: float) -> float:
+        return round((t - self._t0) * 1000, 2)
+
+    def add_span(self, name: str, started: float, duration: float, parent: Optional[int],
+                 attrs: Dict[str, Any], error: Optional[str] = None) -> Optional[int]:
+        with self._lock:
+            if len(self.spans) >= self.MAX_SPANS:
+                self.dropped += 1
+                return None
+            span_id = len(self.spans)
+            self.spans.append({
+                "id": span_id,
+                "parent": parent,
+                "name": name,
+                "start_ms": self.offset_ms(started),
+                "duration_ms": round(duration * 1000, 2),
+                "attrs": attrs,
+                "error": error,
+            })
+            return span_id
+
+    def to_dict(self, spans: bool = True) -> Dict[str, Any]:
+        data = {
+            "request_id": self.request_id,
+            "site": self.site,
+            "endpoint": self.endpoint,
+            "params": self.params,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attrs": dict(self.attrs),
+            "span_count": len(self.spans),
+        }
+        if spans:
+            with self._lock:
+                data["spans"] = sorted(self.spans, key=lambda s: s["start_ms"])
+            data["dropped_spans"] = self.dropped
+        return data
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Millisecondi totali per nome di span (più chiamate dello stesso stadio si sommano)."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for s in self.spans:
+                totals[s["name"]] = round(totals.get(s["name"], 0.0) + s["duration_ms"], 2)
+        return totals
+
+
+class TraceRing:
+    """Ultime tracce concluse più, a parte, le ultime tracce lente."""
+
+    def __init__(self, size: int = 200, slow_size: int = 50, slow_ms: float = 5000):
+        self.slow_ms = slow_ms
+        self._recent: "OrderedDict[str, Trace]" = OrderedDict()
+        self._slow: deque = deque(maxlen=slow_size)
+        self.size = size
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        slow = self.slow_ms > 0 and trace.duration_ms >= self.slow_ms
+        with self._lock:
+            self._recent[trace.request_id] = trace
+            self._recent.move_to_end(trace.request_id)
+            while len(self._recent) > self.size:
+                self._recent.popitem(last=False)
+            if slow:
+                self._slow.append(trace)
+        if slow:
+            logger.warning(f"Slow request {trace.request_id} [{trace.site}/{trace.endpoint}] "
+                           f"{trace.duration_ms:.0f}ms, trace at /debug/traces/{trace.request_id}")
+
+    def get(self, request_id: str) -> Optional[Trace]:
+        with self._lock:
+            trace = self._recent.get(request_id)
+            if trace is None:
+                trace = next((t for t in self._slow if t.request_id == request_id), None)
+            return trace
+
+    def recent(self) -> List[Trace]:
+        with self._lock:
+            return list(reversed(self._recent.values()))
+
+    def slow(self) -> List[Trace]:
+        with self._lock:
+            return list(reversed(self._slow))
+
+
+ring = TraceRing()
+
+# Funzioni chiamate con ogni traccia conclusa (es. access log)
+_listeners: List[Callable[[Trace], None]] = []
+
+
+def add_listener(listener: Callable[[Trace], None]):
+    _listeners.append(listener)
+
+
+def remove_listener(listener: Callable[[Trace], None]):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def configure(size: int, slow_ms: float):
+    """Dimensione del ring e soglia (ms) oltre la quale una richiesta è lenta."""
+    global ring
+    ring = TraceRing(size=size, slow_size=max(1, size // 4), slow_ms=slow_ms)
+
+
+# Request id accettati dal client (finiscono nei log e negli URL di debug)
+_CLIENT_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+@contextmanager
+def trace_request(site: str, endpoint: str, params: Dict[str, Any], request_id: Optional[str] = None):
+    """Apre la traccia di una richiesta; alla chiusura la salva nel ring."""
+    if not request_id or not _CLIENT_ID_RE.match(request_id):
+        request_id = new_request_id()
+    trace = Trace(request_id, site, endpoint, params)
+    token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        trace.duration_ms = trace.offset_ms(time.perf_counter())
+        _current_span.reset(span_token)
+        _current_trace.reset(token)
+        ring.add(trace)
+        for listener in list(_listeners):
+            try:
+                listener(trace)
+            except Exception as e:
+                logger.debug(f"Trace listener failed: {e}")
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Span figlio dello span corrente; nessun costo fuori da una traccia."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    parent = _current_span.get()
+    # Id riservato in apertura, così gli span figli possono riferirlo
+    started = time.perf_counter()
+    span_id = trace.add_span(name, started, 0.0, parent, attrs)
+    token = _current_span.set(span_id)
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        if span_id is not None:
+            with trace._lock:
+                record = trace.spans[span_id]
+                record["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                record["error"] = error
+
+
+def annotate(**attrs):
+    """Imposta attributi sulla traccia corrente (ignorato fuori da una richiesta)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.attrs.update(attrs)
+
+
+def increment(key: str, amount: int = 1):
+    """Incrementa un contatore della traccia corrente."""
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.attrs[key] = trace.attrs.get(key, 0) + amount
+
+
+def add_span(name: str, duration: float, **attrs):
+    """Registra uno span già concluso (durata misurata a mano)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, time.perf_counter() - duration, duration, _current_span.get(), attrs)
+
+
+# --- Correlazione nei log ---
+
+_base_factory = logging.getLogRecordFactory()
+
+
+def _record_factory(*args, **kwargs):
+    record = _base_factory(*args, **kwargs)
+    trace = _current_trace.get()
+    record.request_tag = f"[{trace.request_id}] " if trace else ""
+    return record
+
+
+logging.setLogRecordFactory(_record_factory)
@@ -0,0 +1,161 @@
+"""Warm-up dei siti all'avvio e stato di readiness (`/ready`).
+
+Appena registrato, ogni sito viene preparato in un thread in background
+con `site.warm_up()` (cookie, clearance CF, login): così la prima
+richiesta di Prowlarr non paga solve e login e non va in timeout. In caso
+di errore il warm-up riprova con backoff esponenziale finché il sito non
+è pronto o viene rimosso. Pronta la sessione, si possono pre-caricare le
+ricerche più frequenti dell'access log recente.
+
+La readiness dipende solo dalla sessione: il pre-caricamento prosegue dopo
+senza bloccarla.
+"""
+
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from .accesslog import hot_queries
+from .metrics import site_context
+
+logger = logging.getLogger("torznab.warmup")
+
+
+class SiteWarmup:
+    """Stato del warm-up di un sito."""
+
+    PENDING, WARMING, READY, FAILED = "pending", "warming", "ready", "failed"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.status = self.PENDING
+        self.started_at = time.time()
+        self.ready_at: Optional[float] = None
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.details: dict = {}
+        self.preload = {"queries": 0, "done": 0, "failed": 0, "running": False}
+
+    @property
+    def ready(self) -> bool:
+        return self.status == self.READY
+
+    def to_dict(self) -> dict:
+        data = {
+            "ready": self.ready,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "warmup_seconds": round(self.ready_at - self.started_at, 2) if self.ready_at else None,
+            "preload": dict(self.preload),
+        }
+        data.update(self.details)
+        return data
+
+
+class WarmupManager:
+    """Avvia e traccia il warm-up dei siti registrati su un TorznabServer."""
+
+    RETRY_MIN = 5.0
+    RETRY_MAX = 300.0
+
+    def __init__(self, enabled: bool = False, preload: int = 0, data_dir: Optional[Path] = None):
+        self.enabled = enabled
+        self.preload = preload
+        self.data_dir = data_dir
+        self._states: Dict[str, SiteWarmup] = {}
+        self._stops: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: bool = True, preload: int = 0, data_dir: Optional[Path] = None):
+        self.enabled = enabled
+        self.preload = preload
+        self.data_dir = data_dir
+
+    def start(self, name: str, site):
+        """Prepara `site` in background; senza warm-up il sito è subito pronto."""
+        self.cancel(name)
+        state = SiteWarmup(name)
+        stop = threading.Event()
+        with self._lock:
+            self._states[name] = state
+            self._stops[name] = stop
+        if not self.enabled:
+            state.status = SiteWarmup.READY
+            state.ready_at = state.started_at
+            state.details = {"warmup": "disabled"}
+            return
+        threading.Thread(target=self._run, args=(name, site, state, stop),
+                         name=f"warmup-{name}", daemon=True).start()
+
+    def cancel(self, name: str):
+        with self._lock:
+            stop = self._stops.pop(name, None)
+            self._states.pop(name, None)
+        if stop is not None:
+            stop.set()
+
+    def status(self) -> Dict[str, dict]:
+        with self._lock:
+            states = dict(self._states)
+        return {name: state.to_dict() for name, state in states.items()}
+
+    def is_ready(self, name: str) -> bool:
+        state = self._states.get(name)
+        return state is not None and state.ready
+
+    def _run(self, name: str, site, state: SiteWarmup, stop: threading.Event):
+        delay = self.RETRY_MIN
+        while not stop.is_set():
+            state.attempts += 1
+            state.status = SiteWarmup.WARMING
+            started = time.monotonic()
+            try:
+                with site_context(name):
+                    details = site.warm_up() or {}
+            except Exception as e:
+                state.status = SiteWarmup.FAILED
+                state.error = str(e)
+                logger.warning(f"Warm-up of '{name}' failed (attempt {state.attempts}): {e}; "
+                               f"retrying in {delay:.0f}s")
+                if stop.wait(delay):
+                    return
+                delay = min(delay * 2, self.RETRY_MAX)
+                continue
+            state.details = details
+            state.error = None
+            state.ready_at = time.time()
+            state.status = SiteWarmup.READY
+            logger.info(f"Site '{name}' ready in {time.monotonic() - started:.1f}s "
+                        f"(attempt {state.attempts})")
+            break
+
+        if self.preload and self.data_dir and not stop.is_set():
+            self._preload(name, site, state, stop)
+
+    def _preload(self, name: str, site, state: SiteWarmup, stop: threading.Event):
+        """Esegue le ricerche più frequenti per riempire le cache del sito."""
+        from .server import SEARCH_TYPES, parse_search_args
+
+        queries = hot_queries(self.data_dir, name, SEARCH_TYPES, limit=self.preload)
+        if not queries:
+            return
+        state.preload.update(queries=len(queries), running=True)
+        started = time.monotonic()
+        try:
+            for params in queries:
+                if stop.is_set():
+                    return
+                try:
+                    with site_context(name):
+                        site.search(*parse_search_args(params, site))
+                    state.preload["done"] += 1
+                except Exception as e:
+                    state.preload["failed"] += 1
+                    logger.debug(f"Preload of {params} failed: {e}")
+        finally:
+            state.preload["running"] = False
+        logger.info(f"Preloaded {state.preload['done']}/{len(queries)} hot searches for '{name}' "
+                    f"in {time.monotonic() - started:.1f}s")